@@ -1,16 +1,21 @@
+__version__ = '0.1'
+
 import boole.elab.unif as unif
 import boole.core.tactics as tactics
 import boole.core.conv as conv
+from boole.core.lazy import LazyModule
 from boole.semantics.value import eval_expr
 from boole.elab.prelude import *
+from boole.elab import config as _config
 
 import sys
 
-if 'sage' in sys.argv:
-    config.in_sage()
+# the interfaces to external tools are imported on first use
+z3_interface = LazyModule('boole.interfaces.z3_interface')
+sage_interface = LazyModule('boole.interfaces.sage_interface')
+ladr_interface = LazyModule('boole.interfaces.ladr_interface')
+coq_interface = LazyModule('boole.interfaces.coq_interface')
+ineq_interface = LazyModule('boole.interfaces.ineq_interface')
 
-try:
-    import sage
-    config.in_sage
-except Exception:
-    pass
+if 'sage' in sys.argv or 'sage' in sys.modules:
+    _config.set_in_sage()
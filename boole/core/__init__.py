@@ -1 +1,4 @@
-__all__ = ['expr', 'typing', 'tactics', 'info', 'goals', 'context', 'vargen']
+__all__ = ['expr', 'typing', 'tactics', 'info', 'goals', 'context', 'vargen',
+           'budget', 'pmap', 'lazy', 'session', 'index', 'lattice', 'solved',
+           'profiler', 'cc',
+           'ac']
@@ -0,0 +1,306 @@
+#############################################################################
+#
+# ac.py
+#
+# description: canonical forms of expressions modulo the associativity
+# and commutativity of some operators. The arguments of nested applications
+# of an AC operator are flattened into a list, which is sorted by hash and
+# rebuilt as a right-nested application, so that two expressions which are
+# equal up to AC have structurally equal canonical forms. Their canonical
+# hashes, which are computed from the hashes of the flattened arguments,
+# are also equal, and are used to tell most different expressions apart
+# without comparing them. The hash and the canonical form of each node are
+# computed once, and stored in the node.
+#
+# The AC operators are the constants with the 'ac' info field, and the
+# operators of type classes with the 'ac_class' info field, of the form
+# op(X, f, ev, a, b), which are AC when f is an AC operator.
+#
+#
+# Authors:
+# Cody Roux
+#
+#
+##############################################################################
+
+from expr import root_app, ExprVisitor, struct_equals
+from expr import App, Bound, Pair, Fst, Snd, Sub, Box, Tele
+
+
+def is_ac(expr):
+    """Returns True if the expression is a constant with the
+    ac info field, i.e. an associative and commutative operator.
+
+    Arguments:
+    - `expr`: an expression
+    """
+    return expr.is_const() and bool(expr.info.ac)
+
+
+def ac_head(expr):
+    """Return a triple (key, lhs, rhs) if expr is the application
+    of an AC operator to lhs and rhs, where key identifies the
+    operator, or None otherwise.
+
+    Arguments:
+    - `expr`: an expression
+    """
+    if not expr.is_app():
+        return None
+    root, args = root_app(expr)
+    if not root.is_const():
+        return None
+    if len(args) == 2 and root.info.ac:
+        return (root.name, args[0], args[1])
+    if len(args) == 5 and root.info.ac_class and is_ac(args[1]):
+        return ((root.name, args[1].name, hash(args[0])), args[3], args[4])
+    return None
+
+
+class ACHash(ExprVisitor):
+    """Compute the canonical hash of an expression, and store
+    it in the _ac_hash attribute of each node.
+    """
+
+    def __init__(self):
+        ExprVisitor.__init__(self)
+
+    def visit(self, expr):
+        try:
+            return expr._ac_hash
+        except AttributeError:
+            pass
+        head = ac_head(expr)
+        if head is None:
+            h = expr.accept(self)
+        else:
+            key, lhs, rhs = head
+            args = []
+            self.flatten(key, lhs, args)
+            self.flatten(key, rhs, args)
+            args.sort()
+            h = hash(("AC", key, tuple(args)))
+        expr._ac_hash = h
+        return h
+
+    def flatten(self, key, expr, args):
+        """Add to args the hashes of the arguments of the
+        nested applications of the operator key in expr.
+        """
+        head = ac_head(expr)
+        if head is not None and head[0] == key:
+            self.flatten(key, head[1], args)
+            self.flatten(key, head[2], args)
+        else:
+            args.append(self.visit(expr))
+
+    def visit_const(self, expr):
+        return hash(expr)
+
+    def visit_db(self, expr):
+        return hash(expr)
+
+    def visit_type(self, expr):
+        return hash(expr)
+
+    def visit_kind(self, expr):
+        return hash(expr)
+
+    def visit_bool(self, expr):
+        return hash(expr)
+
+    def visit_bound(self, expr):
+        return hash(("Bound", expr.binder, self.visit(expr.dom),
+                     self.visit(expr.body)))
+
+    def visit_app(self, expr):
+        return hash(("App", self.visit(expr.fun), self.visit(expr.arg)))
+
+    def visit_pair(self, expr):
+        return hash(("Pair", self.visit(expr.type), self.visit(expr.fst),
+                     self.visit(expr.snd)))
+
+    def visit_fst(self, expr):
+        return hash(("Fst", self.visit(expr.expr)))
+
+    def visit_snd(self, expr):
+        return hash(("Snd", self.visit(expr.expr)))
+
+    def visit_ev(self, expr):
+        return hash(expr)
+
+    def visit_sub(self, expr):
+        return hash(("Sub", self.visit(expr.lhs), self.visit(expr.rhs)))
+
+    def visit_box(self, expr):
+        return hash(("Box", self.visit(expr.expr)))
+
+    def visit_tele(self, expr):
+        return hash(("Tuple", tuple(self.visit(t) for t in expr.types)))
+
+    def visit_mvar(self, expr):
+        #the value of a meta-variable may change
+        return hash(expr)
+
+
+_ac_hash = ACHash()
+
+
+def ac_hash(expr):
+    """Return the hash of an expression modulo the
+    associativity and commutativity of the AC operators
+
+    Arguments:
+    - `expr`: an expression
+    """
+    return _ac_hash.visit(expr)
+
+
+class ACCanon(ExprVisitor):
+    """Compute the canonical form of an expression, and store
+    it in the _ac_canon attribute of each node. The subterms which
+    are already canonical are shared with the expression.
+    """
+
+    def __init__(self):
+        ExprVisitor.__init__(self)
+
+    def visit(self, expr):
+        try:
+            return expr._ac_canon
+        except AttributeError:
+            pass
+        head = ac_head(expr)
+        if head is None:
+            canon = expr.accept(self)
+        else:
+            key, lhs, rhs = head
+            args = []
+            self.flatten(key, lhs, args)
+            self.flatten(key, rhs, args)
+            args.sort(key=ac_hash)
+            #the operator applied to the arguments but the last two
+            op = self.visit(expr.fun.fun)
+            canon = args[-1]
+            for arg in reversed(args[:-1]):
+                canon = App(expr.conv, App(expr.fun.conv, op, arg), canon)
+        expr._ac_canon = canon
+        return canon
+
+    def flatten(self, key, expr, args):
+        """Add to args the canonical forms of the arguments of the
+        nested applications of the operator key in expr.
+        """
+        head = ac_head(expr)
+        if head is not None and head[0] == key:
+            self.flatten(key, head[1], args)
+            self.flatten(key, head[2], args)
+        else:
+            args.append(self.visit(expr))
+
+    def visit_const(self, expr):
+        return expr
+
+    def visit_db(self, expr):
+        return expr
+
+    def visit_type(self, expr):
+        return expr
+
+    def visit_kind(self, expr):
+        return expr
+
+    def visit_bool(self, expr):
+        return expr
+
+    def visit_bound(self, expr):
+        dom = self.visit(expr.dom)
+        body = self.visit(expr.body)
+        if dom is expr.dom and body is expr.body:
+            return expr
+        return Bound(expr.binder, dom, body)
+
+    def visit_app(self, expr):
+        fun = self.visit(expr.fun)
+        arg = self.visit(expr.arg)
+        if fun is expr.fun and arg is expr.arg:
+            return expr
+        return App(expr.conv, fun, arg)
+
+    def visit_pair(self, expr):
+        fst = self.visit(expr.fst)
+        snd = self.visit(expr.snd)
+        type = self.visit(expr.type)
+        if fst is expr.fst and snd is expr.snd and type is expr.type:
+            return expr
+        return Pair(fst, snd, type)
+
+    def visit_fst(self, expr):
+        sub = self.visit(expr.expr)
+        if sub is expr.expr:
+            return expr
+        return Fst(sub)
+
+    def visit_snd(self, expr):
+        sub = self.visit(expr.expr)
+        if sub is expr.expr:
+            return expr
+        return Snd(sub)
+
+    def visit_ev(self, expr):
+        return expr
+
+    def visit_sub(self, expr):
+        lhs = self.visit(expr.lhs)
+        rhs = self.visit(expr.rhs)
+        if lhs is expr.lhs and rhs is expr.rhs:
+            return expr
+        return Sub(lhs, rhs)
+
+    def visit_box(self, expr):
+        sub = self.visit(expr.expr)
+        type = self.visit(expr.type)
+        if sub is expr.expr and type is expr.type:
+            return expr
+        return Box(expr.conv, sub, type)
+
+    def visit_tele(self, expr):
+        types = [self.visit(t) for t in expr.types]
+        if all(t is u for t, u in zip(types, expr.types)):
+            return expr
+        return Tele(list(expr.vars), types)
+
+    def visit_mvar(self, expr):
+        #the value of a meta-variable may change
+        return expr
+
+
+_ac_canon = ACCanon()
+
+
+def ac_canon(expr):
+    """Return the canonical form of an expression modulo the
+    associativity and commutativity of the AC operators: two
+    expressions are equal modulo AC if their canonical forms
+    are structurally equal.
+
+    Arguments:
+    - `expr`: an expression
+    """
+    return _ac_canon.visit(expr)
+
+
+def ac_equal(expr1, expr2):
+    """Returns True if the expressions are equal modulo
+    associativity and commutativity. The canonical hashes
+    are compared first, then the canonical forms.
+
+    Arguments:
+    - `expr1`: an expression
+    - `expr2`: an expression
+    """
+    if expr1 is expr2:
+        return True
+    if ac_hash(expr1) != ac_hash(expr2):
+        return False
+    return struct_equals(ac_canon(expr1), ac_canon(expr2))
@@ -0,0 +1,167 @@
+#############################################################################
+#
+# budget.py
+#
+# description: cooperative resource budgets (step fuel, wall-clock
+# deadline and memory ceiling) for normalization, tactics and solvers.
+#
+#
+# Authors:
+# Cody Roux
+#
+#
+##############################################################################
+
+import time
+import resource
+
+import session
+
+
+class BudgetExceeded(Exception):
+    """Raised when an active budget runs out
+    """
+
+    def __init__(self, mess, budget):
+        """
+
+        Arguments:
+        - `mess`: the reason the budget was exhausted
+        - `budget`: the exhausted budget
+        """
+        Exception.__init__(self, mess)
+        self.mess = mess
+        self.budget = budget
+
+
+def memory_usage():
+    """Return the resident memory of the current process
+    in megabytes, or the peak resident memory if the
+    current value cannot be determined.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * resource.getpagesize() / (1024.0 * 1024.0)
+    except (IOError, IndexError, ValueError):
+        #ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class Budget(object):
+    """A budget bounding the work done by kernel loops and tactics.
+    Once exhausted, a budget stays exhausted: every further check
+    fails with the same reason.
+    """
+
+    def __init__(self, fuel=None, timeout=None, memory=None, mem_every=256):
+        """
+
+        Arguments:
+        - `fuel`: the maximal number of steps, or None
+        - `timeout`: a number of seconds from now, or None
+        - `memory`: a ceiling on the resident memory in megabytes, or None
+        - `mem_every`: the number of steps between two memory checks
+        """
+        self.fuel = fuel
+        self.steps = 0
+        if timeout is None:
+            self.deadline = None
+        else:
+            self.deadline = time.time() + timeout
+        self.memory = memory
+        self.mem_every = mem_every
+        self.exhausted = None
+
+    def tick(self, steps=1):
+        """Consume fuel, and check the deadline and the memory
+        ceiling. Raise BudgetExceeded if the budget is exhausted.
+
+        Arguments:
+        - `steps`: the number of steps to consume
+        """
+        if self.exhausted is not None:
+            raise BudgetExceeded(self.exhausted, self)
+        self.steps += steps
+        if self.fuel is not None and self.steps > self.fuel:
+            self.fail("out of fuel after {0!s} steps".format(self.fuel))
+        if self.deadline is not None and time.time() > self.deadline:
+            self.fail("deadline exceeded after {0!s} steps"\
+                      .format(self.steps))
+        if self.memory is not None and self.steps % self.mem_every == 0:
+            mem = memory_usage()
+            if mem > self.memory:
+                self.fail("memory ceiling of {0!s}MB exceeded ({1:.1f}MB)"\
+                          .format(self.memory, mem))
+
+    def fail(self, mess):
+        """Mark the budget as exhausted and raise BudgetExceeded
+
+        Arguments:
+        - `mess`: the reason for the failure
+        """
+        self.exhausted = mess
+        raise BudgetExceeded(mess, self)
+
+    def remaining_time(self):
+        """Return the number of seconds left before the deadline,
+        or None if there is no deadline.
+        """
+        if self.deadline is None:
+            return None
+        else:
+            return max(self.deadline - time.time(), 0)
+
+    def is_exhausted(self):
+        """Returns True if the budget has run out
+        """
+        return self.exhausted is not None
+
+    def __str__(self):
+        return "Budget(fuel={0!s}, steps={1!s}, deadline={2!s}, memory={3!s})"\
+               .format(self.fuel, self.steps, self.deadline, self.memory)
+
+
+##############################################################################
+#
+# The stack of active budgets of the current session: every budget on
+# the stack is charged by a call to tick, so that an inner budget cannot
+# extend an outer one.
+#
+##############################################################################
+
+def push(budget):
+    """Make a budget active
+
+    Arguments:
+    - `budget`: an instance of Budget
+    """
+    session.current().budgets.append(budget)
+
+
+def pop():
+    """Deactivate the last activated budget
+    """
+    return session.current().budgets.pop()
+
+
+def current():
+    """Return the innermost active budget, or None
+    """
+    active = session.current().budgets
+    if active:
+        return active[-1]
+    else:
+        return None
+
+
+def tick(steps=1):
+    """Charge every active budget.
+
+    Arguments:
+    - `steps`: the number of steps to consume
+    """
+    active = session.current().budgets
+    if active:
+        for b in active:
+            b.tick(steps)
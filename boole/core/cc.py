@@ -0,0 +1,151 @@
+#############################################################################
+#
+# cc.py
+#
+# description: congruence closure, to decide ground equalities from a set
+# of ground equations. The terms are the nodes of an E-graph, whose classes
+# are kept in a union-find structure. Each class has a use-list of the
+# applications of which it is the function or the argument, and the
+# signature table sends the classes of the function and argument of an
+# application to that application, so that congruent applications are
+# merged as soon as their arguments are.
+#
+#
+# Authors:
+# Cody Roux
+#
+#
+##############################################################################
+
+from expr import is_eq, arg_i
+from ac import ac_hash, ac_equal
+
+
+class CongruenceClosure(object):
+    """The congruence closure of a set of equations between
+    expressions. Applications are compared by their function and
+    argument, and the other expressions modulo associativity and
+    commutativity. The nodes are found from their hash modulo AC,
+    and compared with ac_equal.
+    """
+
+    def __init__(self):
+        #the expressions, in the order of the node numbers
+        self.terms = []
+        #AC hash -> node numbers
+        self.nodes = {}
+        #the union-find forest
+        self.parent = []
+        #the use-lists of the class representatives
+        self.uses = []
+        #application node -> (function node, argument node)
+        self.apps = {}
+        #(function class, argument class) -> application node
+        self.sigs = {}
+        self.pending = []
+
+    def find(self, i):
+        """Return the representative of the class of node i
+
+        Arguments:
+        - `i`: a node number
+        """
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def node(self, expr):
+        """Return the node number of an expression, adding
+        it and its subterms to the graph if necessary.
+
+        Arguments:
+        - `expr`: an expression
+        """
+        h = ac_hash(expr)
+        bucket = self.nodes.get(h, ())
+        for i in bucket:
+            if ac_equal(self.terms[i], expr):
+                return i
+        if expr.is_app():
+            fun = self.node(expr.fun)
+            arg = self.node(expr.arg)
+        i = len(self.terms)
+        self.terms.append(expr)
+        self.nodes.setdefault(h, []).append(i)
+        self.parent.append(i)
+        self.uses.append([])
+        if expr.is_app():
+            self.apps[i] = (fun, arg)
+            sig = (self.find(fun), self.find(arg))
+            other = self.sigs.get(sig)
+            if other is None:
+                self.sigs[sig] = i
+            else:
+                self.pending.append((i, other))
+            self.uses[sig[0]].append(i)
+            self.uses[sig[1]].append(i)
+        return i
+
+    def merge(self, lhs, rhs):
+        """Add the equation lhs = rhs
+
+        Arguments:
+        - `lhs`: an expression
+        - `rhs`: an expression
+        """
+        self.pending.append((self.node(lhs), self.node(rhs)))
+        self.propagate()
+
+    def propagate(self):
+        """Merge the pending pairs of classes, and the classes
+        of the applications which become congruent.
+        """
+        while self.pending:
+            i, j = self.pending.pop()
+            ri = self.find(i)
+            rj = self.find(j)
+            if ri == rj:
+                continue
+            #the class with the shorter use-list is merged into the other
+            if len(self.uses[ri]) > len(self.uses[rj]):
+                ri, rj = rj, ri
+            self.parent[ri] = rj
+            for u in self.uses[ri]:
+                fun, arg = self.apps[u]
+                sig = (self.find(fun), self.find(arg))
+                other = self.sigs.get(sig)
+                if other is None:
+                    self.sigs[sig] = u
+                elif self.find(other) != self.find(u):
+                    self.pending.append((u, other))
+            self.uses[rj].extend(self.uses[ri])
+            self.uses[ri] = []
+
+    def equal(self, lhs, rhs):
+        """Returns True if lhs = rhs follows from the equations
+
+        Arguments:
+        - `lhs`: an expression
+        - `rhs`: an expression
+        """
+        i = self.node(lhs)
+        j = self.node(rhs)
+        self.propagate()
+        return self.find(i) == self.find(j)
+
+
+def equations(index):
+    """Return the pairs (lhs, rhs) of the hypotheses of the
+    form lhs == rhs in a HypIndex.
+
+    Arguments:
+    - `index`: an instance of HypIndex
+    """
+    eqs = []
+    for i in index.by_head.get('==', ()):
+        h = index.hyps[i]
+        if is_eq(h):
+            eqs.append((arg_i(h, 1), arg_i(h, 2)))
+    return eqs
@@ -6,6 +6,14 @@
 # description: the type containing the local context.
 # the local context contains a number of fields, each of which is a pair
 # (dict, set), and the set contains the co-domain of the dictionary.
+# Each context keeps a version counter, and a flattened view of the
+# fields of its ancestors which is rebuilt lazily after a write.
+# The fields are stored in persistent maps, so that a context can be
+# snapshotted, restored or branched in constant time.
+# A context may be shared by several sessions, e.g. as the parent of
+# their contexts: the views and the children of the contexts are
+# updated with a lock held. Writing to the fields of the same context
+# from several threads is not supported.
 #
 #
 # Authors:
@@ -15,7 +23,14 @@
 #
 ##############################################################################
 
-from collections import MutableMapping, Counter, OrderedDict
+from collections import MutableMapping
+from itertools import count
+from weakref import WeakSet
+import threading
+
+import pmap
+from index import HypIndex
+from lattice import SubLattice
 
 
 class ContextErr(Exception):
@@ -64,37 +79,126 @@ class SetElt(object):
 class CtxtField(MutableMapping):
     """The type of a context field. It maintains
     both a dictionary from names to objects and
-    a set of objects for fast membership testing
+    a set of objects for fast membership testing.
+
+    Both are persistent maps: the dictionary sends a name
+    to a pair (seq, object), where seq records the insertion order,
+    and the set sends an element to its multiplicity.
     """
     
-    def __init__(self):
+    def __init__(self, owner=None, name=None):
         """
         
         Arguments:
-        - `name`:
+        - `owner`: the context containing the field, which is
+        notified of every write
+        - `name`: the name of the field in owner
         """
-        self.dict = OrderedDict()
-        self.set = Counter()
+        self.dict = pmap.empty
+        self.set = pmap.empty
+        self.seq = 0
+        self.owner = owner
+        self.name = name
+        #the list of pairs (key, value) in insertion order, and the
+        #position of each key in it. They are kept up to date by the
+        #writes, and rebuilt after a deletion or a restore.
+        self._order = None
+        self._pos = None
 
     def __getitem__(self, key):
-        return self.dict[key]
+        return self.dict[key][1]
 
     def __setitem__(self, key, value):
-        if key in self.dict:
+        self._changed(self._set(key, value))
+
+    def update(self, pairs):
+        """Add the pairs (key, value) of a list, in order,
+        notifying the owner once.
+        
+        Arguments:
+        - `pairs`: a list of pairs
+        """
+        removal = False
+        for key, value in pairs:
+            removal = self._set(key, value) or removal
+        self._changed(removal)
+
+    def _set(self, key, value):
+        """Set the value of key without notifying the owner,
+        and return True if a value was replaced.
+        """
+        old = self.dict.get(key)
+        if old is not None:
             #check that the existing value is in the set
-            cur_val = SetElt(self.dict[key])
-            assert(self.set[cur_val])
-            self.set.subtract([cur_val])
-        self.dict[key] = value
-        self.set.update([SetElt(value)])
+            cur_val = SetElt(old[1])
+            assert(self.set.get(cur_val))
+            self._remove(cur_val)
+            seq = old[0]
+            removal = True
+        else:
+            removal = False
+            seq = self.seq
+            self.seq += 1
+        self.dict = self.dict.assoc(key, (seq, value))
+        val = SetElt(value)
+        self.set = self.set.assoc(val, self.set.get(val, 0) + 1)
+        if self._order is not None:
+            if removal:
+                self._order[self._pos[key]] = (key, value)
+            else:
+                self._pos[key] = len(self._order)
+                self._order.append((key, value))
+        return removal
 
     def __delitem__(self, key):
-        val = SetElt(self.dict[key])
-        del self.dict[key]
-        self.set.subtract([val])
+        val = SetElt(self.dict[key][1])
+        self.dict = self.dict.dissoc(key)
+        self._remove(val)
+        self._order = None
+        self._changed(True)
+
+    def _remove(self, val):
+        count = self.set[val]
+        if count == 1:
+            self.set = self.set.dissoc(val)
+        else:
+            self.set = self.set.assoc(val, count - 1)
+
+    def _changed(self, removal=False):
+        if self.owner is not None:
+            self.owner.touch(self.name, removal)
+
+    def _ordered(self):
+        """Return the list of pairs (key, value) in insertion
+        order, which must not be modified.
+        """
+        if self._order is None:
+            entries = sorted((seq, k, v) for k, (seq, v) \
+                             in self.dict.iteritems())
+            self._order = [(k, v) for _, k, v in entries]
+            self._pos = dict((k, i) for i, (k, _) \
+                             in enumerate(self._order))
+        return self._order
+
+    def items(self):
+        """Return the list of pairs (key, value) in
+        insertion order.
+        """
+        return list(self._ordered())
+
+    def iteritems(self):
+        #the pairs added while iterating are not visited
+        order = self._ordered()
+        for i in xrange(len(order)):
+            yield order[i]
 
     def __iter__(self):
-        return iter(self.dict)
+        for k, _ in self.iteritems():
+            yield k
+
+    def itervalues(self):
+        for _, v in self.iteritems():
+            yield v
 
     def __len__(self):
         return len(self.dict)
@@ -105,7 +209,43 @@ class CtxtField(MutableMapping):
         Arguments:
         - `value`:
         """
-        return self.set[SetElt(value)]
+        return self.set.get(SetElt(value), 0)
+
+    def elements(self):
+        """Return an iterator over the objects of the set
+        """
+        return iter(self.set)
+
+    def snapshot(self):
+        """Return the current state of the field. This takes
+        constant time, as the maps are shared.
+        """
+        return (self.dict, self.set, self.seq)
+
+    def restore(self, snap):
+        """Restore a state returned by snapshot
+        
+        Arguments:
+        - `snap`: a triple returned by snapshot
+        """
+        if self.dict is snap[0] and self.set is snap[1]:
+            return
+        self.dict, self.set, self.seq = snap
+        self._order = None
+        self._changed(True)
+
+
+#the fields whose changes do not affect the provability of goals
+_unlogical = set(['goals'])
+
+_uids = count()
+
+#held while the views of the contexts, or their children, are modified
+_lock = threading.RLock()
+
+
+fields = ['decls', 'hyps', 'defs', 'sub', 'rew_rules', 'classes',
+          'class_def', 'class_instances', 'goals', 'parent']
 
 
 class Context(object):
@@ -136,18 +276,148 @@ class Context(object):
         - `goals`: a dictionary of unsolved goal lists.
         - `parent`: a dictionary sending names to contexts
         containing the current one.
+
+        The version is incremented by every write to the context or
+        to one of its ancestors, and the epoch by every removal or
+        replacement of a value, so that facts which hold in the context
+        at a given epoch continue to hold until the epoch changes.
+        The uid identifies the context in the current process.
         """
         self.name = name
-        self.decls = CtxtField()
-        self.hyps = CtxtField()
-        self.defs = CtxtField()
-        self.sub = CtxtField()
-        self.rew_rules = CtxtField()
-        self.classes = CtxtField()
-        self.class_def = CtxtField()
-        self.class_instances = CtxtField()
-        self.goals = CtxtField()
-        self.parent = CtxtField()
+        self.decls = CtxtField(self, 'decls')
+        self.hyps = CtxtField(self, 'hyps')
+        self.defs = CtxtField(self, 'defs')
+        self.sub = CtxtField(self, 'sub')
+        self.rew_rules = CtxtField(self, 'rew_rules')
+        self.classes = CtxtField(self, 'classes')
+        self.class_def = CtxtField(self, 'class_def')
+        self.class_instances = CtxtField(self, 'class_instances')
+        self.goals = CtxtField(self, 'goals')
+        self.parent = CtxtField(self, 'parent')
+        self.version = 0
+        self.epoch = 0
+        self.uid = next(_uids)
+        #field name -> flattened view of the field in the parents
+        self._inherited = {}
+        #field name -> values of the field in self and the parents
+        self._values = {}
+        #field name -> index of the values of the field
+        self._indexes = {}
+        #the triple (version, lattice, elements) for the subtype lattice
+        self._lattice = None
+        #the pair (version, hash) for content_hash
+        self._content = None
+        self._children = WeakSet()
+
+    def touch(self, field, removal=False):
+        """Record a write to a field: increment the version, and
+        invalidate the flattened views of self and its descendants.
+        
+        Arguments:
+        - `field`: a field name
+        - `removal`: True if a value was removed or replaced
+        """
+        with _lock:
+            self.version += 1
+            if removal and not field in _unlogical:
+                self.epoch += 1
+            self._values.pop(field, None)
+            self._indexes.pop(field, None)
+            if field == 'parent':
+                self._inherited.clear()
+                self._values.clear()
+                self._indexes.clear()
+                for p in self.parent.itervalues():
+                    p._children.add(self)
+            for c in list(self._children):
+                c.touch_inherited(field, removal)
+
+    def touch_inherited(self, field, removal=False):
+        """Record a write to a field in one of the ancestors.
+        
+        Arguments:
+        - `field`: a field name
+        - `removal`: True if a value was removed or replaced
+        """
+        with _lock:
+            self.version += 1
+            if removal and not field in _unlogical:
+                self.epoch += 1
+            if field == 'parent':
+                self._inherited.clear()
+                self._values.clear()
+                self._indexes.clear()
+            else:
+                self._inherited.pop(field, None)
+                self._values.pop(field, None)
+                self._indexes.pop(field, None)
+            for c in list(self._children):
+                c.touch_inherited(field, removal)
+
+    def inherited(self, field):
+        """Return the triple (values, dict, set) flattening the field
+        over all the parent contexts, in the order of the recursive
+        search. It is built lazily, and kept until an ancestor
+        is modified.
+        
+        Arguments:
+        - `field`: a field name
+        """
+        try:
+            return self._inherited[field]
+        except KeyError:
+            pass
+        with _lock:
+            values = []
+            keys = {}
+            elts = set()
+            for p in self.parent.itervalues():
+                own = p.__dict__[field]
+                p_values, p_keys, p_elts = p.inherited(field)
+                values.extend(own.itervalues())
+                values.extend(p_values)
+                for k, v in own.iteritems():
+                    keys.setdefault(k, v)
+                for k, v in p_keys.iteritems():
+                    keys.setdefault(k, v)
+                elts.update(own.elements())
+                elts.update(p_elts)
+            flat = (tuple(values), keys, elts)
+            self._inherited[field] = flat
+        return flat
+
+    def snapshot(self):
+        """Return the current state of the context, which can be
+        given to restore to undo every later modification. This
+        takes constant time.
+        """
+        return dict((f, self.__dict__[f].snapshot()) for f in fields)
+
+    def restore(self, snap):
+        """Restore a state returned by snapshot. Only the fields
+        which changed since are written, so the views of the
+        other fields are kept.
+        
+        Arguments:
+        - `snap`: a dictionary returned by snapshot
+        """
+        for f in fields:
+            self.__dict__[f].restore(snap[f])
+
+    def branch(self, name=None):
+        """Return a copy of the context, with the same parents,
+        which can be modified independently. The fields of the
+        copy share their entries with self, so this takes constant
+        time.
+        
+        Arguments:
+        - `name`: the name of the copy, by default the name of self
+        """
+        if name is None:
+            name = self.name
+        ctxt = Context(name)
+        ctxt.restore(self.snapshot())
+        return ctxt
 
     def add_const(self, expr):
         """Add a constant to the declarations
@@ -157,6 +427,15 @@ class Context(object):
         """
         self.decls[expr.name] = expr
 
+    def add_consts(self, exprs):
+        """Add a list of constants to the declarations,
+        as a single write to the context
+        
+        Arguments:
+        - `exprs`: a list of constants
+        """
+        self.decls.update([(c.name, c) for c in exprs])
+
     def pop(self, field):
         """Pop an element from a given field in the dictionary
         
@@ -202,10 +481,7 @@ class Context(object):
         if self.__dict__[field].mem(expr):
             return True
         else:
-            for p in self.parent.itervalues():
-                if p.mem_rec(expr, field):
-                    return True
-            return False
+            return SetElt(expr) in self.inherited(field)[2]
 
     def get_rec(self, key, field):
         """Recursively try to find a value associated to
@@ -219,12 +495,10 @@ class Context(object):
         try:
             return self.__dict__[field][key]
         except KeyError:
-            for p in self.parent.itervalues():
-                try:
-                    return p.get_rec(key, field)
-                except KeyError:
-                    pass
-            raise KeyError(key)
+            try:
+                return self.inherited(field)[1][key]
+            except KeyError:
+                raise KeyError(key)
 
     def to_list(self, field):
         """Return the list of elements of
@@ -242,10 +516,74 @@ class Context(object):
         Arguments:
         - `field`:
         """
-        field_vals = self.to_list(field)
-        for p in self.parent.itervalues():
-            field_vals += p.to_list_rec(field)
-        return field_vals
+        return list(self.values_rec(field))
+
+    def values_rec(self, field):
+        """As to_list_rec, but return a tuple which is shared
+        between calls until the field is modified.
+        
+        Arguments:
+        - `field`:
+        """
+        try:
+            return self._values[field]
+        except KeyError:
+            pass
+        with _lock:
+            vals = tuple(self.__dict__[field].itervalues()) + \
+                   self.inherited(field)[0]
+            self._values[field] = vals
+        return vals
+
+    def index_rec(self, field):
+        """Return a HypIndex of the values of the field in self and
+        all parent contexts, which is kept until the field is modified.
+        
+        Arguments:
+        - `field`:
+        """
+        try:
+            return self._indexes[field]
+        except KeyError:
+            pass
+        with _lock:
+            idx = HypIndex(self.values_rec(field))
+            self._indexes[field] = idx
+        return idx
+
+    def content_hash(self):
+        """Return a hash of the values of the fields of self and all
+        parent contexts which affect the provability of goals. It is
+        kept until the context is modified.
+        """
+        if self._content is not None and self._content[0] == self.version:
+            return self._content[1]
+        h = hash(tuple((f, tuple(hash(v) for v in self.values_rec(f))) \
+                       for f in fields \
+                       if f != 'parent' and not f in _unlogical))
+        self._content = (self.version, h)
+        return h
+
+    def sub_lattice(self):
+        """Return the SubLattice of the subtype declarations in self
+        and all parent contexts. When declarations are added, the
+        lattice is updated rather than rebuilt.
+        """
+        cached = self._lattice
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        with _lock:
+            subs = self.values_rec('sub')
+            elts = set(SetElt(s) for s in subs)
+            if self._lattice is not None and self._lattice[2] <= elts:
+                _, lattice, old_elts = self._lattice
+                for s in subs:
+                    if SetElt(s) not in old_elts:
+                        lattice.add(s)
+            else:
+                lattice = SubLattice(subs)
+            self._lattice = (self.version, lattice, elts)
+        return lattice
 
     def show(self, dicts=None):
         """Show various definitions in the context.
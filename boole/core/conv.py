@@ -13,6 +13,7 @@
 
 from expr import *
 import info
+import budget
 
 
 def head_beta(expr):
@@ -135,7 +136,8 @@ def par_beta(expr):
 
 def beta_norm(expr):
     """Repeat beta reduction until
-    the term is unchanged. May loop!
+    the term is unchanged. May loop! Each round
+    is charged to the active budgets, if any.
     
     Arguments:
     - `expr`:
@@ -143,6 +145,7 @@ def beta_norm(expr):
     unred = expr
     red = par_beta(expr)
     while not red.equals(unred):
+        budget.tick()
         unred = red
         red = par_beta(unred)
     return red
@@ -188,6 +191,7 @@ def unfold_all(exp, context):
     all_names = [n for n in context.defs]
     red = unfold(all_names, exp, context)
     while not red.equals(unred):
+        budget.tick()
         unred = red
         red = unfold(all_names, unred, context)
     return red
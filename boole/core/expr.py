@@ -19,6 +19,7 @@
 from expr_base import *
 
 import vargen
+import session
 
 ##############################################################################
 #
@@ -538,6 +539,14 @@ class Ev(Expr):
         self.goals = None
         self._hash = hash("Ev")
 
+    def __getstate__(self):
+        """The goals are not pickled, as they refer to
+        a context.
+        """
+        state = self.__dict__.copy()
+        state['goals'] = None
+        return state
+
     def accept(self, visitor, *args, **kwargs):
         """The accept method allows the definition of
         recursive functions over objects of type expr.
@@ -573,7 +582,10 @@ class Ev(Expr):
         if self.goals is None:
             print "No proof!"
             print
-        prf = map(lambda x: str(x[1]), self.goals.history)
+        prf = [str(tac) for _, tac in self.goals.history \
+               if tac is not None]
+        if self.goals.steps > len(prf):
+            prf.insert(0, '...')
         print ", ".join(prf)
         print
         
@@ -883,6 +895,10 @@ class Tele(Expr):
         Arguments:
         - `i`: an integer
         """
+        self.__dict__.pop('_index', None)
+        self.__dict__.pop('_ac_hash', None)
+        self.__dict__.pop('_ac_canon', None)
+        self.__dict__.pop('_mvars', None)
         if i is None:
             return (self.vars.pop(), self.types.pop())
         else:
@@ -897,7 +913,7 @@ def open_tele(tele, vars, checked=False):
     Arguments:
     - `tele`: a telescope
     """
-    opened_ty = tele.types
+    opened_ty = list(tele.types)
     consts = []
     for i in range(0, tele.len):
         opened_ty[i] = subst_expr(consts, opened_ty[i], is_open=True)
@@ -936,7 +952,11 @@ def open_tele_fresh(tele, checked=False):
 
 
 class Mvar(Expr):
-    """Unification variables for implicit arguments
+    """Unification variables for implicit arguments.
+
+    Meta-variables assigned to other meta-variables form chains,
+    which are the parent links of a union-find structure: find
+    returns the root of the chain, and compresses it on a trail.
     """
     
     def __init__(self, name, type):
@@ -971,6 +991,39 @@ class Mvar(Expr):
         self.info = val.info
         self._value = val
 
+    def find(self, trail=None):
+        """Return the last meta-variable of the chain of
+        meta-variables assigned to each other starting at self,
+        which is either unassigned or assigned to another expression.
+        
+        Arguments:
+        - `trail`: None, or a trail with a method link(mvar, root):
+        the meta-variables of the chain are then assigned to the
+        result directly, and the trail records it so that undoing
+        the assignments also undoes the compression.
+        """
+        chain = []
+        m = self
+        while m._value is not None and m._value.is_mvar():
+            chain.append(m)
+            m = m._value
+        if trail is not None:
+            for c in chain:
+                if not (c._value is m):
+                    trail.link(c, m)
+        return m
+
+    def reset(self, val, inf):
+        """Restore the value and the information of the
+        meta-variable, as recorded before an assignment
+        
+        Arguments:
+        - `val`: an expression or None
+        - `inf`: an info field
+        """
+        self.info = inf
+        self._value = val
+
     def to_string(self):
         return "?{0!s}".format(self.name)
 
@@ -998,6 +1051,140 @@ class Mvar(Expr):
         self._value = None
 
 
+##############################################################################
+#
+# A class of Mvar stacks to manage backtracking
+#
+##############################################################################
+
+class MvarStk(object):
+    """A trail of the assignments of meta-variables, with
+    numbered checkpoints.
+    Each entry of the trail records a meta-variable together with its
+    value and information before the assignment, so that the assignments
+    made since a checkpoint can be undone in reverse order, restoring
+    the previous state. The marks pushed by new and popped by free
+    or commit are nested checkpoints.
+    """
+    
+    def __init__(self):
+        #triples (mvar, previous value, previous info)
+        self.trail = []
+        self.marks = []
+
+    def __str__(self):
+        bounds = [0] + self.marks + [len(self.trail)]
+        return "\n".join(
+            [", ".join([str(mv) for mv, _, _ in self.trail[i:j]])
+             for i, j in zip(bounds, bounds[1:])])
+
+    def __len__(self):
+        return len(self.trail)
+
+    def checkpoint(self):
+        """Return a checkpoint, to which the assignments
+        can be undone
+        """
+        return len(self.trail)
+
+    def undo(self, checkpoint):
+        """Restore the state of the meta-variables assigned since
+        the checkpoint, in reverse order, and drop the marks
+        after it.
+        
+        Arguments:
+        - `checkpoint`: a value returned by checkpoint
+        """
+        trail = self.trail
+        while len(trail) > checkpoint:
+            mv, val, inf = trail.pop()
+            mv.reset(val, inf)
+        marks = self.marks
+        while marks and marks[-1] > checkpoint:
+            marks.pop()
+
+    def assign(self, mv, val):
+        """Give a value to a meta-variable, and record
+        the assignment on the trail
+        
+        Arguments:
+        - `mv`: a Mvar
+        - `val`: an expression
+        """
+        self.trail.append((mv, mv._value, mv.info))
+        mv.set_val(val)
+
+    def link(self, mv, root):
+        """Assign a meta-variable of a chain to the root of
+        the chain, keeping its information, and record it on
+        the trail: this is the path compression of Mvar.find.
+        
+        Arguments:
+        - `mv`: a Mvar
+        - `root`: the Mvar returned by find
+        """
+        self.trail.append((mv, mv._value, mv.info))
+        mv._value = root
+
+    def push(self, mv):
+        """Record the assignment of a meta-variable
+        which had no value: undoing it clears the meta-variable.
+        
+        Arguments:
+        - `mv`: a Mvar
+        """
+        self.trail.append((mv, None, info.DefaultInfo()))
+
+    def assignments(self, checkpoint):
+        """Return the list of the triples (mvar, value, info) of
+        the meta-variables assigned since the checkpoint, which
+        can be given to replay after undoing them.
+        
+        Arguments:
+        - `checkpoint`: a value returned by checkpoint
+        """
+        return [(mv, mv._value, mv.info)
+                for mv, _, _ in self.trail[checkpoint:]]
+
+    def replay(self, assignments):
+        """Assign the meta-variables again, recording the
+        assignments on the trail
+        
+        Arguments:
+        - `assignments`: a list returned by assignments
+        """
+        for mv, val, inf in assignments:
+            self.trail.append((mv, mv._value, mv.info))
+            mv.reset(val, inf)
+
+    def new(self):
+        """Push a mark at the current checkpoint
+        """
+        self.marks.append(len(self.trail))
+
+    def free(self):
+        """Undo the assignments made since the last mark,
+        then remove it.
+        """
+        self.undo(self.marks.pop())
+
+    def commit(self):
+        """Remove the last mark, keeping the assignments made
+        since: they are undone with those of the previous mark.
+        """
+        self.marks.pop()
+
+    def clear(self):
+        """Forget the whole trail, keeping the assignments.
+        """
+        self.trail = []
+        self.marks = []
+
+
+# the meta-variable stack of the current session
+mvar_stack = session.Current('mvar_stack', MvarStk)
+
+
 ##############################################################################
 #
 # The type of Pending substitution and abstraction operations.
@@ -1482,6 +1669,18 @@ def root_app(expr):
     return (root, args)
 
 
+def root(expr):
+    """Returns the head r of expr = r(*args), without
+    collecting the arguments
+    
+    Arguments:
+    - `expr`: an expression
+    """
+    while expr.is_app():
+        expr = expr.fun
+    return expr
+
+
 def root_pi(expr):
     """Returns the pair (r, [an,..,a0])
     such that expr = Pi(a0, Pi(.. Pi(an, r)..)
@@ -1686,10 +1885,319 @@ def free_vars(expr):
     return [e.name for e in l]
 
 
+#the (shared) empty dictionary of meta-variables
+_no_mvars = {}
+
+
+class MvarSet(ExprVisitor):
+    """Returns the dictionary name -> meta-variable of the
+    meta-variables occurring in an expression, whether or not
+    they have a value. The dictionary of each node is computed
+    once, and stored in the node: it must not be modified.
+    """
+    
+    def __init__(self):
+        ExprVisitor.__init__(self)
+
+    def visit(self, expr):
+        try:
+            return expr._mvars
+        except AttributeError:
+            pass
+        mvars = expr.accept(self)
+        expr._mvars = mvars
+        return mvars
+
+    def union(self, *exprs):
+        """Return the union of the dictionaries of the
+        expressions, sharing it with one of them when the
+        others are empty.
+        """
+        res = _no_mvars
+        for ex in exprs:
+            mvars = self.visit(ex)
+            if not mvars:
+                continue
+            if not res:
+                res = mvars
+            elif not (res is mvars):
+                res = dict(res)
+                res.update(mvars)
+        return res
+
+    def visit_const(self, expr):
+        return self.visit(expr.type)
+
+    def visit_db(self, expr):
+        return _no_mvars
+
+    def visit_type(self, expr):
+        return _no_mvars
+
+    def visit_kind(self, expr):
+        return _no_mvars
+
+    def visit_bool(self, expr):
+        return _no_mvars
+
+    def visit_bound(self, expr):
+        return self.union(expr.dom, expr.body)
+
+    def visit_app(self, expr):
+        return self.union(expr.conv, expr.fun, expr.arg)
+
+    def visit_pair(self, expr):
+        return self.union(expr.fst, expr.snd, expr.type)
+
+    def visit_fst(self, expr):
+        return self.visit(expr.expr)
+
+    def visit_snd(self, expr):
+        return self.visit(expr.expr)
+
+    def visit_ev(self, expr):
+        return self.visit(expr.tele)
+
+    def visit_sub(self, expr):
+        return self.union(expr.lhs, expr.rhs)
+
+    def visit_box(self, expr):
+        return self.union(expr.conv, expr.expr, expr.type)
+
+    def visit_mvar(self, expr):
+        return {expr.name: expr}
+
+    def visit_tele(self, expr):
+        return self.union(*expr.types)
+
+
+_mvar_set = MvarSet()
+
+
+def mvars(expr):
+    """Returns the dictionary name -> meta-variable of the
+    meta-variables occurring in an expression, without
+    looking at their values.
+    
+    Arguments:
+    - `expr`: an expression
+    """
+    return _mvar_set.visit(expr)
+
+
+def has_mvar(expr):
+    """Returns True if the expression contains a meta-variable
+    
+    Arguments:
+    - `expr`: an expression
+    """
+    return bool(_mvar_set.visit(expr))
+
+
+def occurs(mvar, expr):
+    """Returns True if the meta-variable occurs in the
+    expression, or in the value of one of the meta-variables
+    occurring in it.
+    
+    Arguments:
+    - `mvar`: a meta-variable
+    - `expr`: an expression
+    """
+    mvs = _mvar_set.visit(expr)
+    if mvar.name in mvs:
+        return True
+    for m in mvs.itervalues():
+        if m.has_value() and occurs(mvar, m._value):
+            return True
+    return False
+
+
+def has_assigned(expr):
+    """Returns True if one of the meta-variables occurring in
+    the expression has a value. This only looks at the
+    meta-variables cached on the expression, not at its subterms.
+    
+    Arguments:
+    - `expr`: an expression
+    """
+    for m in _mvar_set.visit(expr).itervalues():
+        if m._value is not None:
+            return True
+    return False
+
+
+def is_ground(expr):
+    """Returns True if the expression contains no meta-variable
+    without a value, looking at the values of the others.
+    
+    Arguments:
+    - `expr`: an expression
+    """
+    for m in _mvar_set.visit(expr).itervalues():
+        if not (m.has_value() and is_ground(m._value)):
+            return False
+    return True
+
+
+class StructEq(ExprVisitor):
+    """Compare two expressions structurally: unlike equals,
+    which only compares hashes, the subterms are compared
+    recursively, and the hashes are only used to rule out
+    different expressions quickly. Constants are compared by
+    name and type, and meta-variables by identity.
+    """
+    
+    def __init__(self):
+        ExprVisitor.__init__(self)
+
+    def visit(self, expr, other):
+        if expr is other:
+            return True
+        if hash(expr) != hash(other):
+            return False
+        return expr.accept(self, other)
+
+    def visit_const(self, expr, other):
+        return other.is_const() and expr.name == other.name and \
+               self.visit(expr.type, other.type)
+
+    def visit_db(self, expr, other):
+        return other.is_db() and expr.index == other.index
+
+    def visit_type(self, expr, other):
+        return other.is_type()
+
+    def visit_kind(self, expr, other):
+        return other.is_kind()
+
+    def visit_bool(self, expr, other):
+        return other.is_bool()
+
+    def visit_bound(self, expr, other):
+        return other.is_bound() and \
+               expr.binder.name == other.binder.name and \
+               self.visit(expr.dom, other.dom) and \
+               self.visit(expr.body, other.body)
+
+    def visit_app(self, expr, other):
+        return other.is_app() and self.visit(expr.fun, other.fun) and \
+               self.visit(expr.arg, other.arg)
+
+    def visit_pair(self, expr, other):
+        return other.is_pair() and self.visit(expr.fst, other.fst) and \
+               self.visit(expr.snd, other.snd) and \
+               self.visit(expr.type, other.type)
+
+    def visit_fst(self, expr, other):
+        return other.is_fst() and self.visit(expr.expr, other.expr)
+
+    def visit_snd(self, expr, other):
+        return other.is_snd() and self.visit(expr.expr, other.expr)
+
+    def visit_ev(self, expr, other):
+        return other.is_ev()
+
+    def visit_sub(self, expr, other):
+        return other.is_sub() and self.visit(expr.lhs, other.lhs) and \
+               self.visit(expr.rhs, other.rhs)
+
+    def visit_box(self, expr, other):
+        return other.is_box() and self.visit(expr.expr, other.expr)
+
+    def visit_tele(self, expr, other):
+        if not (isinstance(other, Tele) and expr.len == other.len):
+            return False
+        for t1, t2 in zip(expr.types, other.types):
+            if not self.visit(t1, t2):
+                return False
+        return True
+
+    def visit_mvar(self, expr, other):
+        return False
+
+
+_struct_eq = StructEq()
+
+
+def struct_equals(expr1, expr2):
+    """Returns True if the expressions are structurally equal,
+    without relying on the absence of hash collisions.
+    
+    Arguments:
+    - `expr1`: an expression
+    - `expr2`: an expression
+    """
+    return _struct_eq.visit(expr1, expr2)
+
+
+class ExprSize(ExprVisitor):
+    """Returns the number of nodes of an
+    expression, not counting the types of constants.
+    """
+    
+    def __init__(self):
+        ExprVisitor.__init__(self)
+
+    def visit_const(self, expr):
+        return 1
+
+    def visit_db(self, expr):
+        return 1
+
+    def visit_type(self, expr):
+        return 1
+
+    def visit_kind(self, expr):
+        return 1
+
+    def visit_bool(self, expr):
+        return 1
+
+    def visit_bound(self, expr):
+        return 1 + self.visit(expr.dom) + self.visit(expr.body)
+
+    def visit_app(self, expr):
+        return 1 + self.visit(expr.fun) + self.visit(expr.arg)
+
+    def visit_pair(self, expr):
+        return 1 + self.visit(expr.fst) + self.visit(expr.snd)
+
+    def visit_fst(self, expr):
+        return 1 + self.visit(expr.expr)
+
+    def visit_snd(self, expr):
+        return 1 + self.visit(expr.expr)
+
+    def visit_ev(self, expr):
+        return 1
+
+    def visit_sub(self, expr):
+        return 1 + self.visit(expr.lhs) + self.visit(expr.rhs)
+
+    def visit_box(self, expr):
+        return 1 + self.visit(expr.expr)
+
+    def visit_mvar(self, expr):
+        return 1
+
+    def visit_tele(self, expr):
+        return sum(self.visit(ty) for ty in expr.types)
+
+
+def size(expr):
+    """Returns the number of nodes of an expression
+    
+    Arguments:
+    - `expr`: an expression
+    """
+    return ExprSize().visit(expr)
+
+
 ##############################################################################
 #
-# Global fresh variable generator for expressions
+# Fresh variable generator for expressions: the generator of the
+# current session.
 #
 ##############################################################################
 
-fresh_name = vargen.VarGen()
+fresh_name = session.Current('fresh_name')
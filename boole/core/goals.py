@@ -11,6 +11,12 @@
 #
 ##############################################################################
 
+from collections import deque
+
+import budget
+from ac import ac_hash, ac_equal
+from expr import struct_equals
+
 
 ##############################################################################
 #
@@ -57,6 +63,153 @@ class Goal(object):
         return self.tele.types[i]
     
 
+##############################################################################
+#
+# The history of a list of goals is bounded, and each entry only stores
+# the goals which were replaced by a tactic: the goals it left unchanged
+# at the end of the list are shared with the following state. The goals
+# added by append are also recorded, with no tactic.
+#
+##############################################################################
+
+#the default number of states kept for undo, or None for no bound
+history_limit = 100
+
+#the default value of the history argument of Goals, which stands
+#for history_limit
+_default_history = object()
+
+
+def set_history_limit(limit):
+    """Set the number of states kept for undo by the
+    Goals objects created later. 0 disables undo, and
+    None keeps every state.
+    
+    Arguments:
+    - `limit`: an integer or None
+    """
+    global history_limit
+    history_limit = limit
+
+
+def goals_diff(old, new):
+    """Return a pair (head, start) such that old is
+    head + new[start:]
+    
+    Arguments:
+    - `old`: a list of goals
+    - `new`: a list of goals
+    """
+    k = 0
+    n = min(len(old), len(new))
+    while k < n and old[-1 - k] is new[-1 - k]:
+        k += 1
+    return (old[:len(old) - k], len(new) - k)
+
+
+##############################################################################
+#
+# Goal lists may be kept free of duplicates: a goal is dropped if another
+# goal has the same proposition, up to associativity and commutativity,
+# and a subset of its hypotheses, as proving the other goal proves it.
+#
+##############################################################################
+
+#the default for the dedup flag of Goals objects
+dedup_goals = False
+
+
+def set_dedup(setting=True):
+    """Set the default for the dedup flag of the
+    Goals objects created later.
+    """
+    global dedup_goals
+    dedup_goals = setting
+
+
+def goal_hyps(goal):
+    """Return the set of the pairs (name, type hash) of the
+    hypotheses of a goal
+    
+    Arguments:
+    - `goal`: a goal
+    """
+    tele = goal.tele
+    return frozenset(zip(tele.vars, [hash(t) for t in tele.types]))
+
+
+def hyps_included(goal1, goal2):
+    """Returns True if every hypothesis of goal1 is a hypothesis
+    of goal2, with the same name and a structurally equal type.
+    
+    Arguments:
+    - `goal1`: a goal
+    - `goal2`: a goal
+    """
+    types = {}
+    for v, t in zip(goal2.tele.vars, goal2.tele.types):
+        types.setdefault(v, []).append(t)
+    for v, t in zip(goal1.tele.vars, goal1.tele.types):
+        if not any(struct_equals(t, u) for u in types.get(v, ())):
+            return False
+    return True
+
+
+class GoalSet(object):
+    """A set of goals, indexed by the canonical hash of
+    their proposition, which detects the duplicate and subsumed
+    goals. The hashes of the propositions and hypotheses only
+    select the candidates, which are then compared structurally.
+    """
+    
+    def __init__(self):
+        #AC hash -> list of pairs (hypotheses, goal)
+        self.props = {}
+
+    def add(self, goal):
+        """Add a goal to the set. Returns None if it is subsumed
+        by a goal of the set, and otherwise the list of goals
+        of the set which it subsumes, which are removed.
+        
+        Arguments:
+        - `goal`: a goal
+        """
+        hyps = goal_hyps(goal)
+        entries = self.props.setdefault(ac_hash(goal.prop), [])
+        same = [(h, g) for h, g in entries if ac_equal(g.prop, goal.prop)]
+        for h, g in same:
+            if h <= hyps and hyps_included(g, goal):
+                return None
+        removed = [g for h, g in same \
+                   if hyps < h and hyps_included(goal, g)]
+        if removed:
+            entries[:] = [(h, g) for h, g in entries \
+                          if not any(g is r for r in removed)]
+        entries.append((hyps, goal))
+        return removed
+
+
+def reduce_goals(goals):
+    """Return the list of the goals which are not subsumed by
+    another one, in order, and the GoalSet containing them. Of two
+    identical goals, the first is kept.
+    
+    Arguments:
+    - `goals`: a list of goals
+    """
+    goal_set = GoalSet()
+    kept = []
+    removed = set()
+    for g in goals:
+        subsumed = goal_set.add(g)
+        if subsumed is not None:
+            kept.append(g)
+            removed.update(id(r) for r in subsumed)
+    if removed:
+        kept = [g for g in kept if not id(g) in removed]
+    return (kept, goal_set)
+
+
 ##############################################################################
 #
 # Goals are a list of atomic Goal objects, which can call solvers on
@@ -71,10 +224,20 @@ class Goals(object):
     goals. The empty obligation is considered solved.
     """
     
-    def __init__(self, name, context, goals=None):
+    def __init__(self, name, context, goals=None, budget=None, cache=None,
+                 history=_default_history, dedup=None):
         """a Goals object has a name, a context
         and a list of goals.
-        history is the list of pairs of previous goals and tactics.
+        history is the list of pairs of differences to the previous
+        goals, as returned by goals_diff, and tactics. It keeps the
+        history last states, every state if it is None, and by
+        default history_limit states.
+        budget is None, or a Budget charged by the tactics
+        called from solve_with.
+        cache is None, or a SolvedCache recording the goals closed
+        by the tactics called from solve_with.
+        if dedup is True, the duplicate and subsumed goals are removed
+        from the list. By default, it is dedup_goals.
         """
         self.name = name
         if goals is None:
@@ -82,15 +245,52 @@ class Goals(object):
         else:
             self.goals = goals
         self.context = context
-        #TODO: use LIFO Queues?
-        self.history = []
+        if history is _default_history:
+            history = history_limit
+        self.history = deque(maxlen=history)
+        #the number of tactics applied
+        self.steps = 0
+        self.budget = budget
+        self.cache = cache
+        if dedup is None:
+            dedup = dedup_goals
+        self.dedup = dedup
+        if dedup:
+            self.goals, self._goal_set = reduce_goals(self.goals)
+
+    def _reduce(self):
+        if self.dedup:
+            self.goals, self._goal_set = reduce_goals(self.goals)
+
+    def deduplicate(self):
+        """Remove the duplicate and subsumed goals, and keep
+        the list free of them from now on.
+        """
+        self.dedup = True
+        self._reduce()
 
     def append(self, goal):
-        """Add a goal to the proof obligations
+        """Add a goal to the proof obligations. This is recorded
+        in the history, with no tactic, so that undo removes it.
         
         Arguments:
         - `constr`:
         """
+        old_goals = self.goals
+        if self.dedup:
+            subsumed = self._goal_set.add(goal)
+            if subsumed is None:
+                return
+            if subsumed:
+                self.goals = [g for g in self.goals \
+                              if not any(g is r for r in subsumed)]
+        if self.history.maxlen != 0:
+            if self.goals is old_goals:
+                #the goals before the new one are unchanged
+                diff = (None, len(old_goals))
+            else:
+                diff = goals_diff(old_goals, self.goals + [goal])
+            self.history.append((diff, None))
         self.goals.append(goal)
 
     def __str__(self):
@@ -117,13 +317,42 @@ class Goals(object):
 
     def solve_with(self, tactic):
         """Remove the obligations which can
-        be proven with the method.
+        be proven with the method. The state is only recorded
+        in the history if the tactic succeeds.
         
         Arguments:
         - `tactic`: an instance of Tactic
         """
-        self.history.append((self.goals, tactic))
-        self.goals = tactic.solve(self.goals, self.context)
+        old_goals = self.goals
+        if self.cache is not None and \
+               self.cache.solves(tactic, old_goals, self.context):
+            new_goals = []
+        else:
+            new_goals = self._solve(tactic)
+            if self.cache is not None and len(new_goals) == 0:
+                self.cache.add(tactic, old_goals, self.context)
+        self.goals = new_goals
+        self._reduce()
+        self.steps += 1
+        if self.history.maxlen != 0:
+            self.history.append((goals_diff(old_goals, self.goals), tactic))
+
+    def _solve(self, tactic):
+        """Apply the tactic to the goals under the budget, and return
+        the new goals. A budget exhausted outside of the tactics,
+        e.g. by beta_norm or a solver, raises BudgetFailure.
+        """
+        if self.budget is not None:
+            budget.push(self.budget)
+        try:
+            return tactic.solve(self.goals, self.context)
+        except budget.BudgetExceeded as excep:
+            #tactics imports this module
+            from tactics import BudgetFailure
+            raise BudgetFailure(excep.mess, tactic, self.goals)
+        finally:
+            if self.budget is not None:
+                budget.pop()
 
     def interact(self, tactic):
         """Apply the tactic and print the goal
@@ -135,13 +364,21 @@ class Goals(object):
         print self
 
     def undo(self):
-        """Revert to the previous goal state.
+        """Revert to the previous goal state, before the last
+        tactic or the last call to append.
         """
         if not self.history:
             raise ValueError('No undo state!')
         else:
-            g, _ = self.history.pop()
-            self.goals = g
+            (head, start), tactic = self.history.pop()
+            if head is None:
+                #a goal was appended to the goals[:start]
+                self.goals = self.goals[:start]
+            else:
+                self.goals = head + self.goals[start:]
+            self._reduce()
+            if tactic is not None:
+                self.steps -= 1
 
 def empty_goals(name, context):
     """The empty proof obligation.
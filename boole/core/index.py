@@ -0,0 +1,186 @@
+#############################################################################
+#
+# index.py
+#
+# description: an index of hypotheses, keyed by the head symbol of their
+# conclusion, for the lookup of exact matches and of the hypotheses which
+# may apply to a goal. The candidates can be further filtered by the head
+# symbols of the arguments of the conclusion.
+#
+#
+# Authors:
+# Cody Roux
+#
+#
+##############################################################################
+
+from expr import root_app, is_impl, arg_i
+
+
+def head_key(expr):
+    """Return the name of the head constant of the conclusion
+    of expr, which is of the form
+    forall(x1,...,forall(xn, p1 >= (p2 >= ... (pm >= r(t1,...,tk))))),
+    or None if r is not a constant. Unlike root_clause, the
+    binders are not opened.
+
+    Arguments:
+    - `expr`: an expression
+    """
+    root = expr
+    while root.is_forall():
+        root = root.body
+    while is_impl(root):
+        root = arg_i(root, 1)
+    root, _ = root_app(root)
+    if root.is_const():
+        return root.name
+    else:
+        return None
+
+
+def arg_heads(expr):
+    """Return the list of the head constants of the arguments
+    of the conclusion of expr, as in head_key, with None for the
+    arguments whose head is not a constant.
+
+    Arguments:
+    - `expr`: an expression
+    """
+    root = expr
+    while root.is_forall():
+        root = root.body
+    while is_impl(root):
+        root = arg_i(root, 1)
+    _, args = root_app(root)
+    heads = []
+    for a in args:
+        a, _ = root_app(a)
+        heads.append(a if a.is_const() else None)
+    return heads
+
+
+def clash(heads1, heads2, distinct):
+    """Returns True if two arguments in the same position have
+    distinct head constants.
+
+    Arguments:
+    - `heads1`: a list of constants or None, as given by arg_heads
+    - `heads2`: a list of constants or None, as given by arg_heads
+    - `distinct`: a function which returns True if two constants
+    can not be made equal
+    """
+    for c1, c2 in zip(heads1, heads2):
+        if c1 is None or c2 is None or c1.name == c2.name:
+            continue
+        if distinct(c1, c2):
+            return True
+    return False
+
+
+class HypIndex(object):
+    """An index on a list of hypotheses. Hypotheses are
+    stored by hash for exact lookup, and by the head symbol of
+    their conclusion for the retrieval of candidates.
+    """
+
+    def __init__(self, hyps=None):
+        """
+
+        Arguments:
+        - `hyps`: a list of expressions
+        """
+        self.hyps = []
+        self.by_hash = {}
+        self.by_head = {}
+        #the positions of the hypotheses with no head symbol
+        self.any_head = []
+        #position -> the argument heads of the conclusion
+        self.by_pos_heads = {}
+        self.has_false = False
+        if hyps is not None:
+            for h in hyps:
+                self.add(h)
+
+    def add(self, hyp):
+        """Add a hypothesis to the index
+
+        Arguments:
+        - `hyp`: an expression
+        """
+        pos = len(self.hyps)
+        self.hyps.append(hyp)
+        self.by_hash.setdefault(hash(hyp), []).append(hyp)
+        key = head_key(hyp)
+        if key is None:
+            self.any_head.append(pos)
+        else:
+            self.by_head.setdefault(key, []).append(pos)
+        if hyp.is_const() and hyp.name == 'false':
+            self.has_false = True
+
+    def mem(self, prop):
+        """Returns True if prop is one of the hypotheses
+
+        Arguments:
+        - `prop`: an expression
+        """
+        for h in self.by_hash.get(hash(prop), ()):
+            if h.equals(prop):
+                return True
+        return False
+
+    def candidates(self, prop, distinct=None):
+        """Return the hypotheses whose conclusion may match prop,
+        in the order they were added. If distinct is given, the
+        hypotheses whose conclusion has an argument with a head
+        constant distinct from that of the same argument of prop
+        are left out.
+
+        Arguments:
+        - `prop`: an expression
+        - `distinct`: a function which returns True if two constants
+        can not be made equal
+        """
+        key = head_key(prop)
+        if key is None:
+            return list(self.hyps)
+        pos = self.by_head.get(key, [])
+        if self.any_head:
+            pos = sorted(pos + self.any_head)
+        if distinct is not None:
+            heads = arg_heads(prop)
+            pos = [i for i in pos \
+                   if not clash(self.heads(i), heads, distinct)]
+        return [self.hyps[i] for i in pos]
+
+    def heads(self, i):
+        """Return the argument heads of the conclusion of the
+        i-th hypothesis, computing them on the first call.
+
+        Arguments:
+        - `i`: a position in the index
+        """
+        try:
+            return self.by_pos_heads[i]
+        except KeyError:
+            heads = arg_heads(self.hyps[i])
+            self.by_pos_heads[i] = heads
+            return heads
+
+    def __len__(self):
+        return len(self.hyps)
+
+
+def tele_index(tele):
+    """Return the index of the types of a telescope. It is built
+    on the first call, and kept until the telescope is modified.
+
+    Arguments:
+    - `tele`: a telescope
+    """
+    try:
+        return tele._index
+    except AttributeError:
+        tele._index = HypIndex(tele.types)
+        return tele._index
@@ -11,6 +11,8 @@
 #
 ##############################################################################
 
+import threading
+
 
 class ExprInfo(object):
     """Container for the information dictionary
@@ -72,6 +74,28 @@ class ExprInfo(object):
     def __str__(self):
         return self.name
 
+    def __reduce__(self):
+        """Pickle the fields which differ from those of the registered
+        info of the same name, replacing the values shared with
+        a registered info by a reference to that info, as these are
+        often functions which cannot be pickled.
+        """
+        base = _registry.get(self.name)
+        fields = {}
+        for k, val in self.info.iteritems():
+            if base is not None and base.info.get(k) is val:
+                continue
+            ref = _shared_value(k, val)
+            if ref is None:
+                fields[k] = val
+            else:
+                fields[k] = ref
+        if base is None:
+            missing = []
+        else:
+            missing = [k for k in base.info if k not in self.info]
+        return (_load_info, (self.name, fields, missing))
+
     def update(self, info):
         """Add the new fields in info to self
         
@@ -108,9 +132,80 @@ class DefaultInfo(ExprInfo):
     
     def __init__(self):
         ExprInfo.__init__(self, 'default', {})
-        self.info['__str__'] = lambda x: x.to_string()
+        self.info['__str__'] = default_str
         self.info['checked'] = False
 
+
+###############################################################################
+#
+# A registry of the information classes used by with_info, which is
+# used to pickle information: the fields which are taken from a registered
+# information class are stored by name.
+# The registry is shared by all the sessions, as the information
+# classes are module level objects: it is only written with the lock held,
+# and read from a copy of its items.
+#
+###############################################################################
+
+_registry = {}
+
+_registry_lock = threading.Lock()
+
+
+def register(info):
+    """Register an info instance, under its name
+    
+    Arguments:
+    - `info`: an instance of ExprInfo
+    """
+    with _registry_lock:
+        _registry[info.name] = info
+    return info
+
+
+class _InfoRef(object):
+    """A reference to a field of a registered info
+    """
+
+    def __init__(self, name, key):
+        self.name = name
+        self.key = key
+
+    def get(self):
+        return _registry[self.name].info[self.key]
+
+
+def _shared_value(key, val):
+    """Return an _InfoRef to a registered info whose field
+    key is val, or None if there is none.
+    """
+    with _registry_lock:
+        regs = _registry.items()
+    for name, reg in regs:
+        if reg.info.get(key) is val and val is not None:
+            return _InfoRef(name, key)
+    return None
+
+
+def _load_info(name, fields, missing):
+    """Rebuild a pickled ExprInfo
+    """
+    if name in _registry:
+        info = dict(_registry[name].info)
+        for k in missing:
+            del info[k]
+    else:
+        info = {}
+    for k, val in fields.iteritems():
+        if isinstance(val, _InfoRef):
+            info[k] = val.get()
+        else:
+            info[k] = val
+    return ExprInfo(name, info)
+
+
+register(DefaultInfo())
+
 ###############################################################################
 #
 # Decorators for adding information to terms.
@@ -128,6 +223,7 @@ def with_info(info):
     be changed.
 
     """
+    register(info)
     def appl(f):
         def call_f(*args, **kwargs):
             e = f(*args, **kwargs)
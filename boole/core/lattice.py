@@ -0,0 +1,136 @@
+#############################################################################
+#
+# lattice.py
+#
+# description: the subtype lattice of a context: the graph of the subtype
+# declarations A <= B, together with its reflexive transitive closure,
+# stored as one bitset (a python integer) per type.
+#
+#
+# Authors:
+# Cody Roux
+#
+#
+##############################################################################
+
+
+class SubLattice(object):
+    """The reflexive transitive closure of a set of
+    subtype declarations. Types are compared with equals.
+    """
+
+    def __init__(self, subs=None):
+        """
+
+        Arguments:
+        - `subs`: a list of expressions of the form A <= B
+        """
+        #the types, in the order of the node numbers
+        self.types = []
+        #hash -> list of node numbers
+        self.nodes = {}
+        #up[i] has bit j set iff types[i] <= types[j]
+        self.up = []
+        if subs is not None:
+            for s in subs:
+                self.add(s)
+
+    def node(self, typ):
+        """Return the node number of a type, or None
+
+        Arguments:
+        - `typ`: an expression
+        """
+        for i in self.nodes.get(hash(typ), ()):
+            if self.types[i].equals(typ):
+                return i
+        return None
+
+    def _add_node(self, typ):
+        i = self.node(typ)
+        if i is None:
+            i = len(self.types)
+            self.types.append(typ)
+            self.nodes.setdefault(hash(typ), []).append(i)
+            self.up.append(1 << i)
+        return i
+
+    def add(self, sub):
+        """Add a declaration A <= B, and update the reachability
+        of every type below A.
+
+        Arguments:
+        - `sub`: an expression of the form A <= B
+        """
+        a = self._add_node(sub.lhs)
+        b = self._add_node(sub.rhs)
+        if self.up[a] >> b & 1:
+            return
+        up_b = self.up[b]
+        bit_a = 1 << a
+        for i in xrange(len(self.up)):
+            if self.up[i] & bit_a:
+                self.up[i] |= up_b
+
+    def leq(self, typ1, typ2):
+        """Returns True if typ1 <= typ2 follows from the
+        declarations.
+
+        Arguments:
+        - `typ1`: an expression
+        - `typ2`: an expression
+        """
+        if typ1.equals(typ2):
+            return True
+        i = self.node(typ1)
+        if i is None:
+            return False
+        j = self.node(typ2)
+        if j is None:
+            return False
+        return bool(self.up[i] >> j & 1)
+
+    def max_type(self, types):
+        """Return the first type of the list which is above every
+        other type, or None.
+
+        Arguments:
+        - `types`: a list of expressions
+        """
+        nodes = [self.node(t) for t in types]
+        if None in nodes:
+            for t in types:
+                if all(self.leq(u, t) for u in types):
+                    return t
+            return None
+        above = -1
+        for i in nodes:
+            above &= self.up[i]
+        for t, i in zip(types, nodes):
+            if above >> i & 1:
+                return t
+        return None
+
+    def min_type(self, types):
+        """Return the first type of the list which is below every
+        other type, or None.
+
+        Arguments:
+        - `types`: a list of expressions
+        """
+        nodes = [self.node(t) for t in types]
+        if None in nodes:
+            for t in types:
+                if all(self.leq(t, u) for u in types):
+                    return t
+            return None
+        below = 0
+        for i in nodes:
+            below |= 1 << i
+        for t, i in zip(types, nodes):
+            if self.up[i] & below == below:
+                return t
+        return None
+
+    def __len__(self):
+        return len(self.types)
@@ -0,0 +1,57 @@
+#############################################################################
+#
+# lazy.py
+#
+# description: modules which are only imported on first use. This is used
+# for the solver interfaces and their dependencies, which are slow to
+# import and not needed by most programs.
+#
+#
+# Authors:
+# Cody Roux
+#
+#
+##############################################################################
+
+import importlib
+from types import ModuleType
+
+
+class LazyModule(ModuleType):
+    """A stand-in for a module, which imports it the first
+    time one of its attributes is accessed.
+    """
+
+    def __init__(self, name):
+        """
+
+        Arguments:
+        - `name`: the absolute name of the module
+        """
+        ModuleType.__init__(self, name)
+        self._module = None
+
+    def load(self):
+        """Import the module if it is not yet imported,
+        and return it.
+        """
+        if self._module is None:
+            self._module = importlib.import_module(self.__name__)
+        return self._module
+
+    def is_loaded(self):
+        """Returns True if the module has been imported
+        """
+        return self._module is not None
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+    def __dir__(self):
+        return dir(self.load())
+
+    def __repr__(self):
+        if self._module is None:
+            return "<lazy module '{0!s}'>".format(self.__name__)
+        else:
+            return repr(self._module)
@@ -0,0 +1,267 @@
+#############################################################################
+#
+# pmap.py
+#
+# description: persistent (immutable) hash maps, implemented as
+# hash array mapped tries. Updates return a new map which shares
+# all the unchanged nodes with the old one, so that a copy of a map
+# is free.
+#
+#
+# Authors:
+# Cody Roux
+#
+#
+#
+##############################################################################
+
+_bits = 5
+_width = 1 << _bits
+_mask = _width - 1
+_max_shift = 30
+
+
+def _bitcount(n):
+    return bin(n).count('1')
+
+
+def _hash(key):
+    return hash(key) & 0xffffffff
+
+
+class _Collision(object):
+    """A node containing several keys with the same hash
+    """
+
+    __slots__ = ['hash', 'items']
+
+    def __init__(self, h, items):
+        """
+
+        Arguments:
+        - `h`: the common hash of the keys
+        - `items`: a tuple of pairs (key, value)
+        """
+        self.hash = h
+        self.items = items
+
+    def get(self, h, key, default):
+        for k, v in self.items:
+            if k == key:
+                return v
+        return default
+
+    def assoc(self, shift, h, key, value):
+        """Return a pair (node, added) where added is True
+        if the key was not present.
+        """
+        if h != self.hash:
+            node = _Node(1 << ((self.hash >> shift) & _mask), (self,))
+            return node.assoc(shift, h, key, value)
+        for i, (k, v) in enumerate(self.items):
+            if k == key:
+                if v is value:
+                    return self, False
+                items = self.items[:i] + ((key, value),) + self.items[i+1:]
+                return _Collision(h, items), False
+        return _Collision(h, self.items + ((key, value),)), True
+
+    def dissoc(self, h, key):
+        for i, (k, _) in enumerate(self.items):
+            if k == key:
+                items = self.items[:i] + self.items[i+1:]
+                if len(items) == 0:
+                    return None
+                return _Collision(h, items)
+        raise KeyError(key)
+
+    def iteritems(self):
+        return iter(self.items)
+
+
+class _Node(object):
+    """A bitmap-indexed node. Each entry is either a triple
+    (hash, key, value) or a subnode.
+    """
+
+    __slots__ = ['bitmap', 'entries']
+
+    def __init__(self, bitmap, entries):
+        """
+
+        Arguments:
+        - `bitmap`: an integer whose bits are the occupied slots
+        - `entries`: a tuple of entries, one per occupied slot
+        """
+        self.bitmap = bitmap
+        self.entries = entries
+
+    def get(self, shift, h, key, default):
+        node = self
+        while True:
+            bit = 1 << ((h >> shift) & _mask)
+            if not node.bitmap & bit:
+                return default
+            entry = node.entries[_bitcount(node.bitmap & (bit - 1))]
+            if isinstance(entry, tuple):
+                if entry[0] == h and entry[1] == key:
+                    return entry[2]
+                return default
+            elif isinstance(entry, _Collision):
+                return entry.get(h, key, default)
+            node = entry
+            shift += _bits
+
+    def assoc(self, shift, h, key, value):
+        """Return a pair (node, added) where added is True
+        if the key was not present.
+        """
+        bit = 1 << ((h >> shift) & _mask)
+        idx = _bitcount(self.bitmap & (bit - 1))
+        if not self.bitmap & bit:
+            entries = self.entries[:idx] + ((h, key, value),) + \
+                      self.entries[idx:]
+            return _Node(self.bitmap | bit, entries), True
+        entry = self.entries[idx]
+        if isinstance(entry, tuple):
+            e_h, e_key, e_value = entry
+            if e_h == h and e_key == key:
+                if e_value is value:
+                    return self, False
+                new = (h, key, value)
+                added = False
+            else:
+                new = _make_node(shift + _bits, entry, (h, key, value))
+                added = True
+        else:
+            new, added = entry.assoc(shift + _bits, h, key, value)
+            if new is entry:
+                return self, False
+        entries = self.entries[:idx] + (new,) + self.entries[idx+1:]
+        return _Node(self.bitmap, entries), added
+
+    def dissoc(self, shift, h, key):
+        bit = 1 << ((h >> shift) & _mask)
+        if not self.bitmap & bit:
+            raise KeyError(key)
+        idx = _bitcount(self.bitmap & (bit - 1))
+        entry = self.entries[idx]
+        if isinstance(entry, tuple):
+            if not (entry[0] == h and entry[1] == key):
+                raise KeyError(key)
+            new = None
+        elif isinstance(entry, _Collision):
+            new = entry.dissoc(h, key)
+        else:
+            new = entry.dissoc(shift + _bits, h, key)
+        if new is None:
+            if self.bitmap == bit:
+                return None
+            entries = self.entries[:idx] + self.entries[idx+1:]
+            return _Node(self.bitmap & ~bit, entries)
+        entries = self.entries[:idx] + (new,) + self.entries[idx+1:]
+        return _Node(self.bitmap, entries)
+
+    def iteritems(self):
+        for entry in self.entries:
+            if isinstance(entry, tuple):
+                yield entry[1], entry[2]
+            else:
+                for item in entry.iteritems():
+                    yield item
+
+
+def _make_node(shift, entry1, entry2):
+    """Make a node containing two entries with distinct keys
+    """
+    h1, h2 = entry1[0], entry2[0]
+    if h1 == h2 or shift > _max_shift:
+        return _Collision(h1, ((entry1[1], entry1[2]), (entry2[1], entry2[2])))
+    b1 = (h1 >> shift) & _mask
+    b2 = (h2 >> shift) & _mask
+    if b1 == b2:
+        return _Node(1 << b1, (_make_node(shift + _bits, entry1, entry2),))
+    elif b1 < b2:
+        return _Node((1 << b1) | (1 << b2), (entry1, entry2))
+    else:
+        return _Node((1 << b1) | (1 << b2), (entry2, entry1))
+
+
+_missing = object()
+
+
+class PMap(object):
+    """A persistent map. The methods assoc and dissoc return
+    a new map, and leave the current one unchanged.
+    """
+
+    __slots__ = ['root', 'size']
+
+    def __init__(self, root=None, size=0):
+        """
+
+        Arguments:
+        - `root`: the root node of the trie, or None
+        - `size`: the number of keys
+        """
+        self.root = root
+        self.size = size
+
+    def get(self, key, default=None):
+        if self.root is None:
+            return default
+        return self.root.get(0, _hash(key), key, default)
+
+    def __getitem__(self, key):
+        val = self.get(key, _missing)
+        if val is _missing:
+            raise KeyError(key)
+        return val
+
+    def __contains__(self, key):
+        return self.get(key, _missing) is not _missing
+
+    def assoc(self, key, value):
+        """Return a map sending key to value
+
+        Arguments:
+        - `key`: a hashable object
+        - `value`: an object
+        """
+        h = _hash(key)
+        if self.root is None:
+            return PMap(_Node(1 << (h & _mask), ((h, key, value),)), 1)
+        root, added = self.root.assoc(0, h, key, value)
+        if root is self.root:
+            return self
+        return PMap(root, self.size + 1 if added else self.size)
+
+    def dissoc(self, key):
+        """Return a map without key. Raise KeyError if
+        the key is not present.
+
+        Arguments:
+        - `key`: a hashable object
+        """
+        if self.root is None:
+            raise KeyError(key)
+        return PMap(self.root.dissoc(0, _hash(key), key), self.size - 1)
+
+    def __len__(self):
+        return self.size
+
+    def iteritems(self):
+        if self.root is None:
+            return iter(())
+        return self.root.iteritems()
+
+    def __iter__(self):
+        for k, _ in self.iteritems():
+            yield k
+
+    def itervalues(self):
+        for _, v in self.iteritems():
+            yield v
+
+
+empty = PMap()
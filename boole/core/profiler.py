@@ -0,0 +1,228 @@
+#############################################################################
+#
+# profiler.py
+#
+# description: a profiler for tactics. While a profiler is active in the
+# current session, every call to the solve or run method of a tactic is
+# recorded
+# in a tree of nodes, one per tactic and calling node, with the number of
+# calls and failures, the cumulative and self time and the number of goals
+# taken and returned. The tree can be printed, or written in the folded
+# format read by flamegraph.pl.
+#
+#
+# Authors:
+# Cody Roux
+#
+#
+##############################################################################
+
+from functools import wraps
+from timeit import default_timer
+
+import session
+
+
+class ProfileNode(object):
+    """The statistics of a tactic, called from the tactic of
+    the parent node.
+    """
+
+    def __init__(self, name, parent=None):
+        """
+
+        Arguments:
+        - `name`: the name of the tactic
+        - `parent`: the node of the calling tactic
+        """
+        self.name = name
+        self.parent = parent
+        self.calls = 0
+        self.failures = 0
+        self.time = 0.0
+        self.child_time = 0.0
+        self.goals_in = 0
+        self.goals_out = 0
+        #name -> node, in the order of the first call
+        self.children = {}
+        self.order = []
+
+    def child(self, name):
+        """Return the node of a tactic called from this one
+
+        Arguments:
+        - `name`: the name of the tactic
+        """
+        try:
+            return self.children[name]
+        except KeyError:
+            node = ProfileNode(name, self)
+            self.children[name] = node
+            self.order.append(node)
+            return node
+
+    def self_time(self):
+        """The time spent in the tactic itself, outside of the
+        tactics it called
+        """
+        return self.time - self.child_time
+
+    def walk(self, depth=0):
+        """Iterate over the pairs (depth, node) of the subtree,
+        in depth-first order
+        """
+        yield (depth, self)
+        for c in self.order:
+            for d, n in c.walk(depth + 1):
+                yield (d, n)
+
+
+class Profiler(object):
+    """Records the calls to tactics while active. Use as
+    with Profiler() as prof: ...
+    """
+
+    def __init__(self):
+        self.root = ProfileNode('<root>')
+        self.node = self.root
+        self.tactics = []
+        self._saved = None
+
+    def call(self, tactic, solve, goals, context):
+        """Call solve(tactic, goals, context), and record it in
+        the node of the tactic
+
+        Arguments:
+        - `tactic`: a tactic
+        - `solve`: the unprofiled solve or run method of the tactic,
+        which returns a list of goals, or a Success or a Failure
+        - `goals`: a list of goals
+        - `context`: a context
+        """
+        #a solve method calling the one of its base class
+        if self.tactics and self.tactics[-1] is tactic:
+            return solve(tactic, goals, context)
+        parent = self.node
+        node = parent.child(tactic.name)
+        node.calls += 1
+        node.goals_in += len(goals)
+        self.node = node
+        self.tactics.append(tactic)
+        start = default_timer()
+        try:
+            res = solve(tactic, goals, context)
+        except Exception:
+            node.failures += 1
+            raise
+        finally:
+            elapsed = default_timer() - start
+            node.time += elapsed
+            parent.child_time += elapsed
+            self.node = parent
+            self.tactics.pop()
+        if isinstance(res, list):
+            node.goals_out += len(res)
+        elif res:
+            node.goals_out += len(res.goals)
+        else:
+            node.failures += 1
+        return res
+
+    def start(self):
+        """Make the profiler active in the current session
+        """
+        sess = session.current()
+        self._saved = sess.get('profiler', lambda: None)
+        sess.profiler = self
+
+    def stop(self):
+        """Restore the profiler which was active before start
+        """
+        session.current().profiler = self._saved
+        self._saved = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def report(self):
+        """Return the tree of tactic calls as a string
+        """
+        lines = ["{0:>8} {1:>6} {2:>10} {3:>10} {4:>7} {5:>7}  {6}"\
+                 .format('calls', 'fails', 'time', 'self', 'in', 'out',
+                         'tactic')]
+        for depth, n in self.root.walk():
+            if n is self.root:
+                continue
+            lines.append("{0:>8} {1:>6} {2:>10.4f} {3:>10.4f} {4:>7} {5:>7}"
+                         "  {6}{7!s}"\
+                         .format(n.calls, n.failures, n.time, n.self_time(),
+                                 n.goals_in, n.goals_out,
+                                 '  ' * (depth - 1), n.name))
+        return "\n".join(lines)
+
+    def folded(self):
+        """Return the list of lines of the folded format: the names
+        of the tactics of a path in the tree, separated by `;`, and the
+        self time of the last one in microseconds.
+        """
+        lines = []
+        stack = []
+        for depth, n in self.root.walk():
+            if n is self.root:
+                continue
+            del stack[depth - 1:]
+            #';' separates the frames, and ' ' the count
+            stack.append(n.name.replace(';', ',').replace(' ', ''))
+            micros = int(round(n.self_time() * 1e6))
+            if micros > 0:
+                lines.append("{0!s} {1!s}".format(';'.join(stack), micros))
+        return lines
+
+    def write_flamegraph(self, path):
+        """Write the tree of tactic calls in the folded format
+
+        Arguments:
+        - `path`: the path of the file
+        """
+        with open(path, 'w') as f:
+            for l in self.folded():
+                f.write(l + "\n")
+
+
+def current():
+    """Return the profiler active in the current session, or None
+    """
+    return session.current().__dict__.get('profiler')
+
+
+def profiled(solve):
+    """Wrap the solve or run method of a tactic, so that its calls
+    are recorded by the active profiler.
+
+    Arguments:
+    - `solve`: a function taking a tactic, goals and a context
+    """
+    @wraps(solve)
+    def profiled_solve(self, goals, context):
+        prof = session.current().__dict__.get('profiler')
+        if prof is None:
+            return solve(self, goals, context)
+        else:
+            return prof.call(self, solve, goals, context)
+    return profiled_solve
+
+
+class ProfiledTactic(type):
+    """The metaclass of tactics: the solve and run methods of each
+    tactic class are wrapped by profiled.
+    """
+
+    def __new__(mcs, name, bases, dct):
+        for meth in ['solve', 'run']:
+            if meth in dct:
+                dct[meth] = profiled(dct[meth])
+        return type.__new__(mcs, name, bases, dct)
@@ -0,0 +1,137 @@
+#############################################################################
+#
+# session.py
+#
+# description: sessions, which hold the state of an elaboration: the
+# current context, the fresh name generators, the meta-variable stack
+# of the unifier and the active budgets. Each thread has its own current
+# session, which is the default session unless another one is activated,
+# so that independent sessions can elaborate concurrently.
+#
+#
+# Authors:
+# Cody Roux
+#
+#
+##############################################################################
+
+import threading
+
+import vargen
+
+
+class Session(object):
+    """The state of an elaboration. Modules may store additional
+    state in a session with the get method.
+    """
+
+    def __init__(self, name, ctxt=None, parent=None):
+        """
+
+        Arguments:
+        - `name`: a string identifying the session
+        - `ctxt`: the current context of the session
+        - `parent`: None, or a session whose name generators are
+        forked, so that the names created in the session are fresh
+        with respect to the parent.
+        """
+        self.name = name
+        self.ctxt = ctxt
+        self.parent = parent
+        if parent is None:
+            self.fresh_name = vargen.VarGen()
+            self.meta_var_gen = vargen.VarGen()
+        else:
+            self.fresh_name = parent.fresh_name.fork()
+            self.meta_var_gen = parent.meta_var_gen.fork()
+        self.budgets = []
+
+    def get(self, attr, factory):
+        """Return the value of the attribute attr, initializing
+        it with factory() if it is not set.
+
+        Arguments:
+        - `attr`: a string
+        - `factory`: a function with no arguments
+        """
+        try:
+            return self.__dict__[attr]
+        except KeyError:
+            val = factory()
+            self.__dict__[attr] = val
+            return val
+
+    def __enter__(self):
+        push(self)
+        return self
+
+    def __exit__(self, *args):
+        pop()
+
+    def __str__(self):
+        return self.name
+
+
+default = Session('default_session')
+
+_local = threading.local()
+
+
+def current():
+    """Return the current session of the calling thread
+    """
+    try:
+        return _local.stack[-1]
+    except (AttributeError, IndexError):
+        return default
+
+
+def push(session):
+    """Make a session current in the calling thread
+
+    Arguments:
+    - `session`: an instance of Session
+    """
+    try:
+        _local.stack.append(session)
+    except AttributeError:
+        _local.stack = [session]
+
+
+def pop():
+    """Restore the session which was current before
+    the last call to push
+    """
+    return _local.stack.pop()
+
+
+class Current(object):
+    """Stands for an attribute of the current session: the
+    attributes of an instance are those of the value in the
+    current session.
+    """
+
+    def __init__(self, attr, factory=None):
+        """
+
+        Arguments:
+        - `attr`: the name of the attribute in the session
+        - `factory`: a function used to initialize the attribute,
+        or None if it is always set.
+        """
+        self.attr = attr
+        self.factory = factory
+
+    def value(self):
+        """Return the value in the current session
+        """
+        if self.factory is None:
+            return getattr(current(), self.attr)
+        else:
+            return current().get(self.attr, self.factory)
+
+    def __getattr__(self, name):
+        return getattr(self.value(), name)
+
+    def __str__(self):
+        return str(self.value())
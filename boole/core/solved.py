@@ -0,0 +1,213 @@
+#############################################################################
+#
+# solved.py
+#
+# description: a cache of the goals closed by tactics. A goal closed by a
+# tactic in a context stays provable as the context grows, so goals are
+# recorded under the uid and epoch of the context, and reused until a
+# value is removed from it. The cache may also be stored on disk, in
+# which case the goals are recorded under a hash of the contents of the
+# context, so that they are found again when the same sequence of
+# contexts is built by a later run. The goals themselves are stored,
+# and compared structurally to the goal looked up, as the keys only
+# contain hashes.
+#
+#
+# Authors:
+# Cody Roux
+#
+#
+##############################################################################
+
+import os
+import cPickle
+
+import session
+from expr import has_mvar, struct_equals
+
+
+def goal_key(goal):
+    """The hash of a goal, which does not depend on the names of
+    its hypotheses.
+
+    Arguments:
+    - `goal`: a goal
+    """
+    return (hash(goal.tele), hash(goal.prop))
+
+
+def same_goal(goal1, goal2):
+    """Returns True if the goals have structurally equal hypotheses
+    and propositions, regardless of the names of the hypotheses.
+
+    Arguments:
+    - `goal1`, `goal2`: goals
+    """
+    return struct_equals(goal1.prop, goal2.prop) and \
+           struct_equals(goal1.tele, goal2.tele)
+
+
+def _lookup(table, key, goal):
+    """Returns True if a goal equal to goal is stored in
+    the table under key
+
+    Arguments:
+    - `table`: a dictionary from keys to lists of goals
+    - `key`: a key
+    - `goal`: a goal
+    """
+    for g in table.get(key, ()):
+        if same_goal(g, goal):
+            return True
+    return False
+
+
+def _insert(table, key, goal):
+    """Store the goal in the table under key, if it is not
+    there. Returns True if it was added.
+
+    Arguments:
+    - `table`: a dictionary from keys to lists of goals
+    - `key`: a key
+    - `goal`: a goal
+    """
+    if _lookup(table, key, goal):
+        return False
+    table.setdefault(key, []).append(goal)
+    return True
+
+
+def cachable(goal):
+    """Returns True if the goal contains no meta-variables:
+    closing a goal with meta-variables may give them values,
+    so it can not be skipped.
+
+    Arguments:
+    - `goal`: a goal
+    """
+    return not (has_mvar(goal.tele) or has_mvar(goal.prop))
+
+
+class SolvedCache(object):
+    """A set of the goals closed by a tactic in a context.
+    """
+
+    def __init__(self, path=None):
+        """
+
+        Arguments:
+        - `path`: None, or a file from which the cache is loaded,
+        and to which it is written by save.
+        """
+        self.path = path
+        #(uid, epoch, tactic name, goal key) -> goals
+        self.local = {}
+        #(content hash, tactic name, goal key) -> goals
+        self.stored = {}
+        self.hits = 0
+        self.dirty = False
+        if path is not None:
+            try:
+                with open(path, 'rb') as f:
+                    key, stored = cPickle.load(f)
+                if key == ('goals', hash('Bool')):
+                    self.stored = stored
+            except Exception:
+                pass
+
+    def is_solved(self, tactic, goal, context):
+        """Returns True if the tactic is known to close the goal
+        in the context
+
+        Arguments:
+        - `tactic`: a tactic
+        - `goal`: a goal
+        - `context`: a context
+        """
+        key = goal_key(goal)
+        if _lookup(self.local,
+                   (context.uid, context.epoch, tactic.name, key), goal):
+            return True
+        if self.path is not None:
+            return _lookup(self.stored,
+                           (context.content_hash(), tactic.name, key), goal)
+        return False
+
+    def solves(self, tactic, goals, context):
+        """Returns True if the tactic is known to close every
+        goal of the list, and the list is not empty.
+
+        Arguments:
+        - `tactic`: a tactic
+        - `goals`: a list of goals
+        - `context`: a context
+        """
+        if len(goals) == 0:
+            return False
+        for g in goals:
+            if not (cachable(g) and self.is_solved(tactic, g, context)):
+                return False
+        self.hits += 1
+        return True
+
+    def add(self, tactic, goals, context):
+        """Record that the tactic closed the goals of the list
+
+        Arguments:
+        - `tactic`: a tactic
+        - `goals`: a list of goals
+        - `context`: a context
+        """
+        for g in goals:
+            if not cachable(g):
+                continue
+            key = goal_key(g)
+            _insert(self.local,
+                    (context.uid, context.epoch, tactic.name, key), g)
+            if self.path is not None:
+                if _insert(self.stored,
+                           (context.content_hash(), tactic.name, key), g):
+                    self.dirty = True
+
+    def clear(self):
+        """Remove every goal from the cache
+        """
+        self.local.clear()
+        self.stored.clear()
+        self.dirty = True
+
+    def save(self):
+        """Write the goals to the cache file, if there is one
+        and the cache changed.
+        """
+        if self.path is None or not self.dirty:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            tmp = "{0!s}.{1!s}.tmp".format(self.path, os.getpid())
+            with open(tmp, 'wb') as f:
+                #expression hashes are only stable without hash
+                #randomization
+                cPickle.dump((('goals', hash('Bool')), self.stored), f,
+                             cPickle.HIGHEST_PROTOCOL)
+            os.rename(tmp, self.path)
+            self.dirty = False
+        except (IOError, OSError):
+            pass
+
+
+def current():
+    """Return the cache of the current session
+    """
+    return session.current().get('solved', SolvedCache)
+
+
+def set_current(cache):
+    """Set the cache of the current session
+
+    Arguments:
+    - `cache`: an instance of SolvedCache
+    """
+    session.current().solved = cache
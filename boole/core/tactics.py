@@ -12,9 +12,21 @@
 ##############################################################################
 
 
+import heapq
+import cPickle
+import multiprocessing
+
+import ac
+import cc
 import conv
 import expr
-from expr import fresh_name
+import budget
+import session
+import profiler
+from expr import fresh_name, has_mvar
+from index import tele_index
+from lattice import SubLattice
+from solved import goal_key
 from goals import *
 
 ##############################################################################
@@ -49,31 +61,161 @@ def eq_goal(tele, lhs, rhs):
     return sub_goal(tele, lhs, rhs) + sub_goal(tele, rhs, lhs)
 
 
+class Lazy(object):
+    """A string which is only built when it is used: failures
+    are often caught and discarded, e.g. during backtracking, so
+    their messages and the names of the tactics are built lazily.
+    """
+    
+    def __init__(self, fmt, *args):
+        """
+        
+        Arguments:
+        - `fmt`: a format string, or a function returning a string
+        - `*args`: the arguments of fmt
+        """
+        self.fmt = fmt
+        self.args = args
+
+    def __str__(self):
+        if isinstance(self.fmt, basestring):
+            return self.fmt.format(*self.args)
+        else:
+            return str(self.fmt(*self.args))
+
+
 class TacticFailure(Exception):
     """Raised when a tactic fails
     """
     
-    def __init__(self, mess, tactic, goals):
+    def __init__(self, mess, tactic, goals, *args):
         """
         
         Arguments:
-        - `mess`: the error message
+        - `mess`: the error message, or a format string for args
         - `tactic`: the tactic which generated the error
         - `goal`: the goal on which the tactic failed
+        - `*args`: the arguments of the message, which is only
+        formatted when it is shown
         """
-        full_mess = "In tactic {0!s}:\n{1!s}".format(tactic.name, mess)
-        Exception.__init__(self, full_mess)
-        self.mess = mess
+        if args:
+            mess = Lazy(mess, *args)
+        Exception.__init__(self, mess)
+        self._mess = mess
         self.tactic = tactic
         self.goals = goals
 
+    @property
+    def mess(self):
+        if isinstance(self._mess, Lazy):
+            self._mess = str(self._mess)
+        return self._mess
+
+    def __str__(self):
+        return "In tactic {0!s}:\n{1!s}".format(self.tactic.name, self.mess)
+
+
+class BudgetFailure(TacticFailure):
+    """Raised when a tactic runs out of budget. Unlike other
+    failures, it is never caught by the tactic combinators.
+    """
+    pass
+
+
+def check_budget(tactic, goals):
+    """Charge one step to the active budgets, and raise
+    BudgetFailure if one of them is exhausted.
+    
+    Arguments:
+    - `tactic`: the tactic being run
+    - `goals`: the goals it is applied to
+    """
+    try:
+        budget.tick()
+    except budget.BudgetExceeded as excep:
+        raise BudgetFailure(excep.mess, tactic, goals)
+
+
+class Success(object):
+    """The result of a tactic which succeeded
+    """
+    
+    def __init__(self, goals):
+        """
+        
+        Arguments:
+        - `goals`: the new goals
+        """
+        self.goals = goals
+
+    def __nonzero__(self):
+        return True
+
+    def get(self):
+        """Return the new goals
+        """
+        return self.goals
+
+
+class Failure(object):
+    """The result of a tactic which failed
+    """
+    
+    def __init__(self, failure):
+        """
+        
+        Arguments:
+        - `failure`: the TacticFailure raised by the tactic
+        """
+        self.failure = failure
+
+    def __nonzero__(self):
+        return False
+
+    def message(self):
+        """Build the error message
+        """
+        return str(self.failure)
+
+    def throw(self):
+        """Raise the failure
+        """
+        raise self.failure
+
+    def get(self):
+        """Raise the failure, as there are no new goals
+        """
+        raise self.failure
+
 
 class Tactic(object):
-    """The class of goal transformers
+    """The class of goal transformers. The calls to the solve
+    and run methods of every tactic are recorded by the active profiler.
+
+    The tactics built from other tactics define run, which passes on
+    the Success or Failure of the tactics it calls, and their solve
+    method only raises the failure of the result. The other tactics
+    define solve, which raises a TacticFailure, and the default run
+    turns it into a Failure.
+
+    The name may be given as a Lazy, in which case it is only built
+    when it is first used.
     """
+
+    __metaclass__ = profiler.ProfiledTactic
     
     def __init__(self, name):
-        self.name = name
+        self._name = name
+
+    @property
+    def name(self):
+        if isinstance(self._name, Lazy):
+            self._name = str(self._name)
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        self._name = name
         
     def solve(self, goals, context):
         """Takes a list of goals and returns a list of goals
@@ -82,8 +224,24 @@ class Tactic(object):
         - `goals`: a list of instances of the Goal class
         - `context`: a global context
         """
-        raise TacticFailure("Undefined tactic {0!s}"\
-                            .format(self.name), self, goals)
+        raise TacticFailure("Undefined tactic {0!s}", self, goals, self)
+
+    def run(self, goals, context):
+        """Apply the tactic to a list of goals, and return a
+        Success containing the new goals or a Failure. The failure
+        message is only built if it is asked for. Budget failures
+        are still raised.
+        
+        Arguments:
+        - `goals`: a list of instances of the Goal class
+        - `context`: a global context
+        """
+        try:
+            return Success(self.solve(goals, context))
+        except BudgetFailure:
+            raise
+        except TacticFailure as excep:
+            return Failure(excep)
 
     def __str__(self):
         return self.name
@@ -123,6 +281,7 @@ class tac_from_fun(Tactic):
         if len(goals) == 0:
             return []
         else:
+            check_budget(self, goals)
             return self.fun(goals[0], context, self) + goals[1:]
 
 
@@ -137,6 +296,7 @@ class par_tac_from_fun(Tactic):
     def solve(self, goals, context):
         new_goals = []
         for g in goals:
+            check_budget(self, goals)
             new_goals += self.fun(g, context, self)
         return new_goals
 
@@ -153,16 +313,14 @@ def triv_fun(goal, context, _):
         else:
             lhs = expr.arg_i(prop, 1)
             rhs = expr.arg_i(prop, 2)
-        if lhs.equals(rhs):
+        if lhs.equals(rhs) or ac.ac_equal(lhs, rhs):
             return []
         elif lhs.is_const() and lhs.name == 'true':
             return triv_fun(Goal(hyps, prop.rhs), context, _)
 
-    for h in hyps.types:
-        if h.equals(prop):
-            return []
-        if h.is_const() and h.name == 'false':
-            return []
+    hyp_index = tele_index(hyps)
+    if hyp_index.has_false or hyp_index.mem(prop):
+        return []
     if context.mem_rec(prop, 'hyps'):
         return []
     return [goal]
@@ -186,29 +344,6 @@ def is_in(el, list):
     return False
 
 
-def reach(typs, typ2, subs):
-    """Determine whether typ2 is reachable
-    from typs using subs as nodes
-    
-    Arguments:
-    - `typs`: An expression list
-    - `typ2`: An expresion
-    - `subs`: A list of expressions of the form A <= B
-    """
-    reached = typs[:]
-    for e in subs:
-        if is_in(e.lhs, reached) and (not is_in(e.rhs, reached)):
-            reached += [e.rhs]
-        else:
-            pass
-    if is_in(typ2, reached):
-        return True
-    elif len(reached) > len(typs):
-        return reach(reached, typ2, subs)
-    else:
-        return False
-
-
 def decide_sub(sub, subs):
     """Decide a subtype entailment given a list of hypotheses.
     
@@ -216,7 +351,7 @@ def decide_sub(sub, subs):
     - `sub`: a term of the form T <= U
     - `subs`: a list of terms of the form T <= U
     """
-    return reach([sub.lhs], sub.rhs, subs)
+    return SubLattice(subs).leq(sub.lhs, sub.rhs)
 
 
 def sub_fun(goal, context, tac):
@@ -225,19 +360,39 @@ def sub_fun(goal, context, tac):
     """
     prop = goal.prop
     if prop.is_sub():
-        context_subs = context.to_list_rec('sub')
-        if decide_sub(prop, context_subs):
+        if context.sub_lattice().leq(prop.lhs, prop.rhs):
             return []
         else:
-            mess = "Cannot decide {0!s}".format(prop)
-            raise TacticFailure(mess, tac, goal)
+            raise TacticFailure("Cannot decide {0!s}", tac, goal, prop)
     else:
-        mess = "{0!s} is not a of the form A <= B".format(prop)
-        raise TacticFailure(mess, tac, goal)
+        raise TacticFailure("{0!s} is not a of the form A <= B",
+                            tac, goal, prop)
 
 sub_tac = tac_from_fun('sub_tac', sub_fun)
 
 
+def cc_fun(goal, context, tac):
+    """Solve a goal of the form a == b by congruence closure, from
+    the equations in the hypotheses of the goal and of the context.
+    """
+    prop = goal.prop
+    if expr.is_eq(prop):
+        lhs, rhs = expr.arg_i(prop, 1), expr.arg_i(prop, 2)
+    else:
+        raise TacticFailure("{0!s} is not an equality", tac, goal, prop)
+    closure = cc.CongruenceClosure()
+    for l, r in cc.equations(tele_index(goal.tele)) + \
+            cc.equations(context.index_rec('hyps')):
+        closure.merge(l, r)
+    if closure.equal(lhs, rhs):
+        return []
+    else:
+        mess = "{0!s} does not follow from the equations"
+        raise TacticFailure(mess, tac, goal, prop)
+
+congruence = tac_from_fun('congruence', cc_fun)
+
+
 class simpl(Tactic):
     """Simplify the current goal using the given
     simplification function
@@ -258,7 +413,10 @@ class simpl(Tactic):
         else:
             goal, tail = (goals[0], goals[1:])
             prop = goal.prop
-            simp_goal = Goal(goal.tele, self.conv(prop))
+            try:
+                simp_goal = Goal(goal.tele, self.conv(prop))
+            except budget.BudgetExceeded as excep:
+                raise BudgetFailure(excep.mess, self, goals)
             return [simp_goal] + tail
 
 
@@ -322,14 +480,13 @@ class Destruct(Tactic):
                      (lhs.is_snd() and rhs.is_snd()):
                     return eq_goal(tele, lhs.expr, rhs.expr) + tail
                 else:
-                    mess = "{0!s} and {1!s} are not of the same form"\
-                           .format(prop.lhs, prop.rhs)
-                    raise TacticFailure(mess, self, goal)
+                    mess = "{0!s} and {1!s} are not of the same form"
+                    raise TacticFailure(mess, self, goal,
+                                        prop.lhs, prop.rhs)
 
             else:
-                mess = "Goal {0!s} is not of the form A<=B"\
-                       .format(goal)
-                raise TacticFailure(mess, self, goal)
+                mess = "Goal {0!s} is not of the form A<=B"
+                raise TacticFailure(mess, self, goal, goal)
 
 destruct = Destruct()
 
@@ -347,7 +504,7 @@ class unpack(Tactic):
         type
         - `names`: an optional list of names for the projections
         """
-        Tactic.__init__(self, 'unpack({0!s})'.format(hyp_name))
+        Tactic.__init__(self, Lazy('unpack({0!s})', hyp_name))
         self.hyp_name = hyp_name
         self.names = names
         
@@ -361,9 +518,8 @@ class unpack(Tactic):
             try:
                 i = tele.vars.index(self.hyp_name)
             except ValueError:
-                mess = "name {0!s} not found in hypotheses {1!s}".\
-                       format(self.hyp_name, tele)
-                raise TacticFailure(mess, self, goals)
+                mess = "name {0!s} not found in hypotheses {1!s}"
+                raise TacticFailure(mess, self, goals, self.hyp_name, tele)
 
             h = tele.types[i]
             sig_val = expr.unpack_sig(h, self.names)
@@ -390,7 +546,7 @@ class apply_atom(Tactic):
         Arguments:
         - `hyp`: a term of type bool
         """
-        Tactic.__init__(self, 'apply_atom({0!s})'.format(hyp))
+        Tactic.__init__(self, Lazy('apply_atom({0!s})', hyp))
         self.hyp = hyp
 
     def solve(self, goals, context):
@@ -415,14 +571,18 @@ class trytac(Tactic):
         Arguments:
         - `tac`: a tactic
         """
-        Tactic.__init__(self, 'try({0!s})'.format(tac))
+        Tactic.__init__(self, Lazy('try({0!s})', tac))
         self.tac = tac
 
+    def run(self, goals, context):
+        res = self.tac.run(goals, context)
+        if res:
+            return res
+        else:
+            return Success(goals)
+
     def solve(self, goals, context):
-        try:
-            return self.tac.solve(goals, context)
-        except TacticFailure:
-            return goals
+        return self.run(goals, context).get()
 
 
 class trywith(Tactic):
@@ -437,15 +597,19 @@ class trywith(Tactic):
         - `tac1`: a tactic
         - `tac2`: a tactic
         """
-        Tactic.__init__(self, '({0!s} | {1!s})'.format(tac1, tac2))
+        Tactic.__init__(self, Lazy('({0!s} | {1!s})', tac1, tac2))
         self.tac1 = tac1
         self.tac2 = tac2
 
+    def run(self, goals, context):
+        res = self.tac1.run(goals, context)
+        if res:
+            return res
+        else:
+            return self.tac2.run(goals, context)
+
     def solve(self, goals, context):
-        try:
-            return self.tac1.solve(goals, context)
-        except TacticFailure:
-            return self.tac2.solve(goals, context)
+        return self.run(goals, context).get()
 
 
 class comp(Tactic):
@@ -456,10 +620,17 @@ class comp(Tactic):
     def __init__(self, tac1, tac2):
         self.tac1 = tac1
         self.tac2 = tac2
-        Tactic.__init__(self, '({0!s} >> {1!s})'.format(tac1, tac2))
+        Tactic.__init__(self, Lazy('({0!s} >> {1!s})', tac1, tac2))
         
+    def run(self, goals, context):
+        res = self.tac1.run(goals, context)
+        if res:
+            return self.tac2.run(res.goals, context)
+        else:
+            return res
+
     def solve(self, goals, context):
-        return self.tac2.solve(self.tac1.solve(goals, context), context)
+        return self.run(goals, context).get()
 
 
 class repeat(Tactic):
@@ -469,29 +640,33 @@ class repeat(Tactic):
     """
     
     def __init__(self, tac, num=None, fail=None):
-        Tactic.__init__(self, "repeat({0!s})".format(tac))
+        Tactic.__init__(self, Lazy("repeat({0!s})", tac))
         self.tac = tac
         self.fail = fail
         self.num = num
         
-    def solve(self, goals, context):
+    def run(self, goals, context):
         new_goals = goals
-        try:
-            #If a tactic loops, we timeout after
-            #a million tries (to avoid crashing the runtime)
-            if self.num:
-                timeout = self.num
-            else:
-                timeout = 1000000
-            while len(new_goals) != 0 and timeout > 0:
-                new_goals = self.tac.solve(new_goals, context)
-                timeout -= 1
-            return new_goals
-        except TacticFailure:
-            if self.fail:
-                raise
-            else:
-                return new_goals
+        #If a tactic loops, we timeout after
+        #a million tries (to avoid crashing the runtime)
+        if self.num:
+            timeout = self.num
+        else:
+            timeout = 1000000
+        while len(new_goals) != 0 and timeout > 0:
+            check_budget(self, new_goals)
+            res = self.tac.run(new_goals, context)
+            if not res:
+                if self.fail:
+                    return res
+                else:
+                    return Success(new_goals)
+            new_goals = res.goals
+            timeout -= 1
+        return Success(new_goals)
+
+    def solve(self, goals, context):
+        return self.run(goals, context).get()
 
 
 class Idtac(Tactic):
@@ -518,18 +693,20 @@ class now(Tactic):
         Arguments:
         - `tac`: a tactic
         """
-        Tactic.__init__(self, "now({0!s})".format(tac))
+        Tactic.__init__(self, Lazy("now({0!s})", tac))
         self.tac = tac
 
-    def solve(self, goals, context):
-        new_goals = self.tac.solve(goals, context)
-        if len(new_goals) == 0:
-            return []
+    def run(self, goals, context):
+        res = self.tac.run(goals, context)
+        if not res or len(res.goals) == 0:
+            return res
         else:
-            goal_str = map(str, goals)
-            mess = "Tactic {0!s} did not solve {1!s}"\
-            .format(self.tac, goal_str)
-            raise TacticFailure(mess, self, goals)
+            mess = "Tactic {0!s} did not solve {1!s}"
+            return Failure(TacticFailure(mess, self, goals,
+                                         self.tac, Lazy(map, str, goals)))
+
+    def solve(self, goals, context):
+        return self.run(goals, context).get()
 
 
 class unfold(Tactic):
@@ -559,8 +736,10 @@ class unfold(Tactic):
                 prop_sub = conv.unfold(self.names, prop, context)
                 tele_sub = conv.unfold(self.names, tele, context)
             except KeyError, k:
-                mess = "{0!s} is not defined in context {1!s}".format(k, context)
-                raise TacticFailure(mess, self, goal)
+                mess = "{0!s} is not defined in context {1!s}"
+                raise TacticFailure(mess, self, goal, k, context)
+            except budget.BudgetExceeded as excep:
+                raise BudgetFailure(excep.mess, self, goals)
             return [Goal(tele_sub, prop_sub)] + tail
 
 
@@ -586,12 +765,216 @@ class par(Tactic):
     """Apply the tactic tac in parallel to each goal
     """
     def __init__(self, tac):
-        Tactic.__init__(self, 'par({0!s})'.format(tac))
+        Tactic.__init__(self, Lazy('par({0!s})', tac))
         self.tac = tac
         
+    def run(self, goals, context):
+        new_goals = []
+        for g in goals:
+            check_budget(self, goals)
+            res = self.tac.run([g], context)
+            if not res:
+                return res
+            new_goals.append(res.goals)
+        return Success([g for gs in new_goals for g in gs])
+
     def solve(self, goals, context):
-        new_goals = [self.tac.solve([g], context) for g in goals]
+        return self.run(goals, context).get()
+
+
+#the tactic, goals and context of a pool_par worker process
+_pool_state = None
+
+
+def _pool_init(tac, goals, context):
+    global _pool_state
+    _pool_state = (tac, goals, context)
+
+
+def _pool_solve(i):
+    """Solve the goal number i in a worker process. Returns a
+    triple (kind, data, counters), where kind is 'goals' and data
+    the pickled list of new goals, or kind is 'fail' or 'budget' and
+    data the error message, or None if the result can not be sent
+    back.
+    """
+    tac, goals, context = _pool_state
+    sess = session.current()
+    try:
+        new_goals = tac.solve([goals[i]], context)
+        kind, data = 'goals', cPickle.dumps(new_goals,
+                                            cPickle.HIGHEST_PROTOCOL)
+    except BudgetFailure as excep:
+        kind, data = 'budget', str(excep)
+    except TacticFailure as excep:
+        kind, data = 'fail', str(excep)
+    except cPickle.PicklingError:
+        return None
+    counters = (sess.fresh_name._name_index,
+                sess.meta_var_gen._name_index)
+    return (kind, data, counters)
+
+
+class pool_par(par):
+    """Like par, but solves the goals in a pool of worker
+    processes, which receive a copy of the goals, the tactic and
+    the context. The new goals are gathered in order.
+
+    The goals are solved sequentially if there are fewer than two,
+    if they contain meta-variables, whose values would not be
+    returned by the workers, or if a result can not be pickled.
+    The workers are charged against a copy of the active budgets,
+    and their modifications to the context are lost.
+    """
+    
+    def __init__(self, tac, processes=None):
+        """
+        
+        Arguments:
+        - `tac`: a tactic
+        - `processes`: the number of worker processes, by default
+        the number of cpus
+        """
+        par.__init__(self, tac)
+        self.name = Lazy('pool_par({0!s})', tac)
+        self.processes = processes
+
+    def parallel(self, goals):
+        """Returns True if the goals can be solved
+        in worker processes
+        
+        Arguments:
+        - `goals`: a list of goals
+        """
+        if len(goals) < 2:
+            return False
+        #worker processes can not create processes
+        if multiprocessing.current_process().daemon:
+            return False
+        for g in goals:
+            if has_mvar(g.tele) or has_mvar(g.prop):
+                return False
+        return True
+
+    def run(self, goals, context):
+        if not self.parallel(goals):
+            return par.run(self, goals, context)
+        return Tactic.run(self, goals, context)
+
+    def solve(self, goals, context):
+        if not self.parallel(goals):
+            return par.run(self, goals, context).get()
+        try:
+            pool = multiprocessing.Pool(self.processes,
+                                        initializer=_pool_init,
+                                        initargs=(self.tac, goals, context))
+        except OSError:
+            return par.run(self, goals, context).get()
+        for g in goals:
+            check_budget(self, goals)
+        try:
+            results = pool.map(_pool_solve, range(len(goals)))
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+        sess = session.current()
+        new_goals = []
+        for g, res in zip(goals, results):
+            if res is None:
+                new_goals.append(self.tac.solve([g], context))
+                continue
+            kind, data, counters = res
+            #the names given in the workers must stay fresh
+            sess.fresh_name.merge(counters[0])
+            sess.meta_var_gen.merge(counters[1])
+            if kind == 'budget':
+                raise BudgetFailure(data, self, [g])
+            elif kind == 'fail':
+                raise TacticFailure(data, self, [g])
+            new_goals.append(cPickle.loads(data))
         return [g for gs in new_goals for g in gs]
 
 
+def goals_score(goals):
+    """The default score of a list of goals in search:
+    the total size of their propositions.
+    
+    Arguments:
+    - `goals`: a list of goals
+    """
+    return sum(expr.size(g.prop) for g in goals)
+
+
+class search(Tactic):
+    """Best-first search for a proof: each step applies every
+    tactic of a list to the goal list with the lowest score, until
+    one of them solves every goal. The goal lists which were already
+    reached are recorded in a transposition table, and are not explored
+    again.
+
+    The meta-variables assigned by a tactic are only assigned while the
+    goal lists it returned are expanded: the assignments are undone
+    after each tactic, and stored with the goal lists.
+    """
+    
+    def __init__(self, tacs, max_nodes=1000, score=goals_score):
+        """
+        
+        Arguments:
+        - `tacs`: a list of tactics
+        - `max_nodes`: the number of goal lists which may be expanded
+        before failing
+        - `score`: a function from goal lists to numbers, lower is better
+        """
+        Tactic.__init__(self, Lazy('search({0!s})',
+                                   Lazy(lambda: ', '.join(map(str, tacs)))))
+        self.tacs = tacs
+        self.max_nodes = max_nodes
+        self.score = score
+
+    def solve(self, goals, context):
+        if len(goals) == 0:
+            return []
+        trail = expr.mvar_stack
+        base = trail.checkpoint()
+        seen = set([tuple(goal_key(g) for g in goals)])
+        #the entries are (score, order, goals, assignments): ties are
+        #broken in the order the goal lists were reached
+        queue = [(self.score(goals), 0, goals, [])]
+        order = 1
+        nodes = 0
+        try:
+            while queue and nodes < self.max_nodes:
+                _, _, state, assigns = heapq.heappop(queue)
+                nodes += 1
+                check_budget(self, state)
+                trail.undo(base)
+                trail.replay(assigns)
+                for tac in self.tacs:
+                    checkpoint = trail.checkpoint()
+                    res = tac.run(state, context)
+                    if not res:
+                        trail.undo(checkpoint)
+                        continue
+                    if len(res.goals) == 0:
+                        #the assignments of the proof are kept
+                        base = None
+                        return []
+                    new_assigns = assigns + trail.assignments(checkpoint)
+                    trail.undo(checkpoint)
+                    key = tuple(goal_key(g) for g in res.goals)
+                    if key in seen and not new_assigns:
+                        continue
+                    seen.add(key)
+                    heapq.heappush(queue, (self.score(res.goals), order,
+                                           res.goals, new_assigns))
+                    order += 1
+        finally:
+            if base is not None:
+                trail.undo(base)
+        mess = "No proof found after expanding {0!s} goal lists"
+        raise TacticFailure(mess, self, goals, nodes)
+
+
 auto = par(simpl(conv.par_beta) >> intros >> trivial >> trytac(sub_tac))
@@ -63,3 +63,24 @@ class VarGen(object):
                     i += 1
                     fresh = "{0!s}_{1!s}".format(pad, i)
                 return fresh
+
+    def fork(self):
+        """Return a generator with the same counters as self,
+        which can then be used independently.
+        """
+        gen = VarGen()
+        gen.default = self.default
+        gen._name_index = dict(self._name_index)
+        return gen
+
+    def merge(self, name_index):
+        """Advance the counters of self past those of name_index,
+        so that the names given by another generator are not given
+        again.
+        
+        Arguments:
+        - `name_index`: the counters of a generator
+        """
+        for name, i in name_index.iteritems():
+            if self._name_index.get(name, -1) < i:
+                self._name_index[name] = i
@@ -10,13 +10,26 @@
 #
 ###############################################################################
 
+import os
+import atexit
+
 from boole.core.context import Context
+import boole.core.session as session
+import boole.core.solved as solved
+import boole.core.goals as goals
+import elab_cache
 
 
 ###############################################################################
 #
 # Global variables for printing purposes
 #
+# The flags of this module are process-wide: they are shared by all the
+# sessions and threads, and are meant to be set before elaborating. Each
+# setter writes a single variable, so that a thread sees either the old
+# or the new setting. The state which differs between sessions is held
+# by the session (see boole.core.session).
+#
 ###############################################################################
 
 verbose = False
@@ -50,6 +63,83 @@ def set_unicode(setting=True):
     print_unicode = setting
 
 
+theory_cache = os.environ.get('BOOLE_THEORY_CACHE', '0') != '0'
+
+
+def set_theory_cache(setting=True):
+    """Sets the theory cache flag:
+    This flag makes the elaboration of theories, including
+    the prelude, be stored in and loaded from the disk.
+    It is off by default, and can be set with BOOLE_THEORY_CACHE=1.
+    """
+    global theory_cache
+    theory_cache = setting
+
+goal_cache = os.environ.get('BOOLE_GOAL_CACHE', '1') != '0'
+
+
+def set_goal_cache(setting=True):
+    """Sets the goal cache flag:
+    This flag makes elaboration skip the type-checking
+    obligations which were already closed in the current context.
+    """
+    global goal_cache
+    goal_cache = setting
+
+
+def set_goal_cache_file(path):
+    """Store the goal cache of the current session in a file,
+    which is read now and written at exit, so that later runs
+    skip the obligations closed by this one.
+    
+    Arguments:
+    - `path`: the path to the file
+    """
+    cache = solved.SolvedCache(path)
+    solved.set_current(cache)
+    atexit.register(cache.save)
+
+if 'BOOLE_GOAL_CACHE_FILE' in os.environ:
+    set_goal_cache_file(os.environ['BOOLE_GOAL_CACHE_FILE'])
+
+goal_dedup = os.environ.get('BOOLE_GOAL_DEDUP', '0') != '0'
+
+
+def set_goal_dedup(setting=True):
+    """Sets the goal deduplication flag:
+    This flag makes elaboration drop the obligations which are
+    duplicates of other obligations, or follow from them.
+    It is off by default, and can be set with BOOLE_GOAL_DEDUP=1.
+    """
+    global goal_dedup
+    goal_dedup = setting
+
+
+def set_history_limit(limit):
+    """Sets the number of goal states kept for undo by
+    the obligations created later: 0 turns undo off, e.g. for
+    batch runs, and None keeps every state.
+    """
+    goals.set_history_limit(limit)
+
+if 'BOOLE_HISTORY' in os.environ:
+    #BOOLE_HISTORY=none keeps every state
+    if os.environ['BOOLE_HISTORY'].lower() == 'none':
+        set_history_limit(None)
+    else:
+        set_history_limit(int(os.environ['BOOLE_HISTORY']))
+
+
+def set_elab_cache_size(size):
+    """Sets the number of elaborations kept in memory, which are
+    returned again when the same expression is elaborated in an
+    unchanged context: 0 turns the cache off.
+    """
+    elab_cache.set_cache_size(size)
+
+if 'BOOLE_ELAB_CACHE' in os.environ:
+    set_elab_cache_size(int(os.environ['BOOLE_ELAB_CACHE']))
+
 in_sage = False
 
 
@@ -63,16 +153,17 @@ def set_in_sage(setting=True):
 #
 ###############################################################################
 
-_ctxt_var = Context("default_ctxt")
+# the current context is that of the current session
+
+session.default.ctxt = Context("default_ctxt")
 
 
 def current_ctxt():
-    return _ctxt_var
+    return session.current().ctxt
 
 
 def set_current_ctxt(ctxt):
-    global _ctxt_var
-    _ctxt_var = ctxt
+    session.current().ctxt = ctxt
 
 
 def push_ctxt(name=""):
@@ -83,6 +174,18 @@ def push_ctxt(name=""):
     - `name`:
     """
     new_ctxt = Context(name)
-    new_ctxt.parent[_ctxt_var.name] = _ctxt_var
+    new_ctxt.parent[current_ctxt().name] = current_ctxt()
     set_current_ctxt(new_ctxt)
+
+
+def new_session(name):
+    """Create a session whose context is a child of the
+    current context. Activate it with a `with` statement to
+    elaborate in it, possibly concurrently with other sessions.
     
+    Arguments:
+    - `name`: a string
+    """
+    ctxt = Context(name)
+    ctxt.parent[current_ctxt().name] = current_ctxt()
+    return session.Session(name, ctxt=ctxt, parent=session.current())
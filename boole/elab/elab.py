@@ -15,6 +15,7 @@ import boole.core.expr_base as expr_base
 import boole.core.expr as e
 import boole.core.typing as t
 import boole.core.vargen as vargen
+import boole.core.session as session
 import boole.core.context as context
 import boole.core.info as info
 import boole.core.goals as goals
@@ -76,16 +77,43 @@ class SubMvar(e.ExprVisitor):
     Arguments:
     - `undef`: if this flag is set to True,
     fail on unresolved meta-vars.
+    - `trail`: None, or the trail on which the chains of
+    meta-variables are compressed.
+
+    The subterms which contain no meta-variable are returned as is.
+    While constraints are being solved (undef is None), the
+    subterms which contain no assigned meta-variable are returned
+    unchanged without being visited, and a subterm shared in the
+    term is only visited once. The final substitution (undef is True)
+    rebuilds the term.
     """
     
-    def __init__(self, undef=None):
+    def __init__(self, undef=None, trail=None):
         e.ExprVisitor.__init__(self)
         self.undef = undef
+        self.trail = trail
+        if undef is None:
+            self.memo = {}
+        else:
+            self.memo = None
+
+    def unchanged(self, new, old):
+        """Returns True if the subterms are shared and the
+        visited subterms new are the subterms old
+        """
+        if self.memo is None:
+            return False
+        for n, o in zip(new, old):
+            if not (n is o):
+                return False
+        return True
 
 # TODO (JDA): I had to modify the third line below by adding the value.
 # Is this right? What about the instances of Const with true and false below?
     def visit_const(self, expr):
         ty = self.visit(expr.type)
+        if self.unchanged([ty], [expr.type]):
+            return expr
         return e.Const(expr.name, ty, value=expr.value)
 
     def visit_db(self, expr):
@@ -103,156 +131,140 @@ class SubMvar(e.ExprVisitor):
     def visit_bound(self, expr):
         dom = self.visit(expr.dom)
         body = self.visit(expr.body)
+        if self.unchanged([dom, body], [expr.dom, expr.body]):
+            return expr
         return e.Bound(expr.binder, dom, body)
 
     def visit_app(self, expr):
         conv = self.visit(expr.conv)
         fun = self.visit(expr.fun)
         arg = self.visit(expr.arg)
+        if self.unchanged([conv, fun, arg],
+                          [expr.conv, expr.fun, expr.arg]):
+            return expr
         return e.App(conv, fun, arg)
 
     def visit_pair(self, expr):
         fst = self.visit(expr.fst)
         snd = self.visit(expr.snd)
         type = self.visit(expr.type)
+        if self.unchanged([fst, snd, type],
+                          [expr.fst, expr.snd, expr.type]):
+            return expr
         return e.Pair(fst, snd, type)
 
     def visit_fst(self, expr):
-        return e.Fst(self.visit(expr.expr))
+        sub = self.visit(expr.expr)
+        if self.unchanged([sub], [expr.expr]):
+            return expr
+        return e.Fst(sub)
 
     def visit_snd(self, expr):
-        return e.Snd(self.visit(expr.expr))
+        sub = self.visit(expr.expr)
+        if self.unchanged([sub], [expr.expr]):
+            return expr
+        return e.Snd(sub)
 
     def visit_ev(self, expr):
-        return e.Ev(self.visit(expr.tele))
+        tele = self.visit(expr.tele)
+        if self.unchanged([tele], [expr.tele]):
+            return expr
+        return e.Ev(tele)
 
     def visit_sub(self, expr):
         lhs = self.visit(expr.lhs)
         rhs = self.visit(expr.rhs)
+        if self.unchanged([lhs, rhs], [expr.lhs, expr.rhs]):
+            return expr
         return e.Sub(lhs, rhs)
 
     def visit_box(self, expr):
         conv = self.visit(expr.conv)
         expr1 = self.visit(expr.expr)
         type = self.visit(expr.type)
+        if self.unchanged([conv, expr1, type],
+                          [expr.conv, expr.expr, expr.type]):
+            return expr
         return e.Box(conv, expr1, type)
 
     def visit_tele(self, expr):
         types = [self.visit(t) for t in expr.types]
+        if self.unchanged(types, expr.types):
+            return expr
         return e.Tele(expr.vars, types)
 
     def visit_mvar(self, expr):
+        if self.undef is None:
+            #we are in this case if we are still solving
+            #constraints: the abstractions should not be applied
+            #yet, and the chains of meta-variables are skipped.
+            rep = expr.find(self.trail)
+            if rep.has_value():
+                return self.visit(rep._value)
+            else:
+                return rep
         if expr.has_value():
             sub_val = self.visit(expr._value)
-            if self.undef is None:
-                #we are in this case if we are still solving
-                #constraints: the abstractions should not be applied
-                #yet.
-                pass
-            else:
-                for p in expr.pending:
-                    sub_val = p.now(sub_val)
+            for p in expr.pending:
+                sub_val = p.now(sub_val)
             return sub_val
         else:
-            if self.undef is None:
-                return expr
-            else:
-                typ = self.visit(expr.type)
-                mess = "Cannot find a value for {0!s}:{1!s}"\
-                       .format(expr, typ)
-                raise e.ExprError(mess, expr)
+            typ = self.visit(expr.type)
+            mess = "Cannot find a value for {0!s}:{1!s}"\
+                   .format(expr, typ)
+            raise e.ExprError(mess, expr)
 
-    @info.same_info
     def visit(self, expr, *args, **kwargs):
+        if not e.has_mvar(expr):
+            return expr
+        if self.memo is None:
+            return self.visit_info(expr, *args, **kwargs)
+        if not e.has_assigned(expr):
+            return expr
+        key = id(expr)
+        try:
+            return self.memo[key]
+        except KeyError:
+            res = self.visit_info(expr, *args, **kwargs)
+            self.memo[key] = res
+            return res
+
+    @info.same_info
+    def visit_info(self, expr, *args, **kwargs):
         return expr.accept(self, *args, **kwargs)
 
 
-def sub_mvar(expr, undef=None):
+def sub_mvar(expr, undef=None, trail=None):
     """Replace all meta-variables by their
     value in a term.
     
     Arguments:
     - `undef`: if this flag is set to True,
     fail on unresolved meta-vars.
+    - `trail`: None, or the trail on which the chains of
+    meta-variables are compressed.
     """
-    return SubMvar(undef=undef).visit(expr)
-
-
-class MvarIsPresent(e.ExprVisitor):
-    """Determine if a meta-variable name is present in a term.
-    """
-    
-    def __init__(self, name=None):
-        e.ExprVisitor.__init__(self)
-        self.name = name
-        
-    def visit_const(self, expr):
-        pass
-
-    def visit_db(self, expr):
-        pass
-
-    def visit_type(self, expr):
-        pass
-
-    def visit_kind(self, expr):
-        pass
-
-    def visit_bool(self, expr):
-        return expr
-
-    def visit_bound(self, expr):
-        self.visit(expr.dom)
-        self.visit(expr.body)
-
-    def visit_app(self, expr):
-        self.visit(expr.conv)
-        self.visit(expr.fun)
-        self.visit(expr.arg)
-
-    def visit_pair(self, expr):
-        self.visit(expr.fst)
-        self.visit(expr.snd)
-        self.visit(expr.type)
-
-    def visit_fst(self, expr):
-        self.visit(expr.expr)
-
-    def visit_snd(self, expr):
-        self.visit(expr.expr)
-
-    def visit_ev(self, expr):
-        self.visit(expr.tele)
-
-    def visit_sub(self, expr):
-        self.visit(expr.lhs)
-        self.visit(expr.rhs)
-
-    def visit_box(self, expr):
-        self.visit(expr.conv)
-        self.visit(expr.expr)
-        self.visit(expr.type)
-
-    def visit_tele(self, expr):
-        for t in expr.types:
-            self.visit(t)
-
-    def visit_mvar(self, expr):
-        if self.name != None:
-            if expr.name == self.name:
-                return True
-        else:
-            return True
+    return SubMvar(undef=undef, trail=trail).visit(expr)
 
 
 def mvar_is_present(expr, mvar=None):
-    if MvarIsPresent(name=mvar.name).visit(expr):
-        return True
+    """Returns True if the meta-variable (or any meta-variable,
+    if mvar is None) occurs in the expression. The meta-variables
+    of each node are cached, so this is fast on terms which were
+    already checked.
+    
+    Arguments:
+    - `expr`: an expression
+    - `mvar`: a meta-variable
+    """
+    if mvar is None:
+        return e.has_mvar(expr)
     else:
-        return False
+        return e.occurs(mvar, expr)
 
 
-meta_var_gen = vargen.VarGen()
+# the meta-variable name generator of the current session
+meta_var_gen = session.Current('meta_var_gen')
 
 
 ###############################################################################
@@ -0,0 +1,148 @@
+###############################################################################
+#
+# elab_cache.py
+#
+# description: a bounded cache of the results of elaborate. The entries are
+# keyed by the arguments of elaborate and by the uid and version of the
+# current context, so that an entry is only used while the context is
+# unchanged. Only the elaborations without remaining obligations are
+# stored, and the least recently used entry is dropped when the cache is
+# full. As the keys only contain hashes, an entry is only used if the
+# elaborated expression and type are structurally equal to the arguments,
+# with the same constants: the values and information of constants are
+# not part of their hash.
+#
+#
+# Authors:
+# Cody Roux
+#
+###############################################################################
+
+from collections import OrderedDict
+
+import boole.core.session as session
+from boole.core.expr import StructEq
+
+
+#the size of the caches created later
+cache_size = 256
+
+
+def set_cache_size(size):
+    """Set the maximal number of entries of the cache of the
+    current session and of the caches created later: 0 turns
+    the cache off.
+
+    Arguments:
+    - `size`: an integer
+    """
+    global cache_size
+    cache_size = size
+    cache = current()
+    cache.size = size
+    while len(cache.entries) > max(size, 0):
+        cache.entries.popitem(last=False)
+
+
+class SameSource(StructEq):
+    """Compare two expressions structurally, where constants are
+    also compared by value and information.
+    """
+
+    def visit_const(self, expr, other):
+        return StructEq.visit_const(self, expr, other) and \
+               expr.value is other.value and \
+               expr.info.info == other.info.info
+
+
+_same_source = SameSource()
+
+
+def same_source(src, expr):
+    """Returns True if an entry elaborated from src can be
+    used for expr.
+
+    Arguments:
+    - `src`: an expression or None
+    - `expr`: an expression or None
+    """
+    if src is None or expr is None:
+        return src is expr
+    return _same_source.visit(src, expr)
+
+
+class ElabCache(object):
+    """A least recently used cache of the results (val, ty)
+    of elaborations.
+    """
+
+    def __init__(self, size=None):
+        """
+
+        Arguments:
+        - `size`: the maximal number of entries, cache_size
+        by default
+        """
+        if size is None:
+            size = cache_size
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+
+    def key(self, elab_key, ctxt):
+        """Return the key of an elaboration in the context
+
+        Arguments:
+        - `elab_key`: the key of the arguments of elaborate
+        - `ctxt`: a context
+        """
+        return (elab_key, ctxt.uid, ctxt.version)
+
+    def lookup(self, key, expr, type):
+        """Return the pair (val, ty) stored under key, if it
+        was elaborated from the same expression and type, or None.
+
+        Arguments:
+        - `key`: a key returned by key
+        - `expr`: the expression to be elaborated
+        - `type`: its putative type, or None
+        """
+        try:
+            src, result = self.entries.pop(key)
+        except KeyError:
+            return None
+        #the entry becomes the most recently used
+        self.entries[key] = (src, result)
+        if same_source(src[0], expr) and same_source(src[1], type):
+            self.hits += 1
+            return result
+        return None
+
+    def add(self, key, expr, type, val, ty):
+        """Store the result of the elaboration of expr
+
+        Arguments:
+        - `key`: a key returned by key
+        - `expr`, `type`: the arguments of the elaboration
+        - `val`, `ty`: the result of the elaboration
+        """
+        if self.size <= 0:
+            return
+        self.entries.pop(key, None)
+        self.entries[key] = ((expr, type), (val, ty))
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Remove every entry
+        """
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def current():
+    """Return the elaboration cache of the current session
+    """
+    return session.current().get('elab_cache', ElabCache)
@@ -19,12 +19,17 @@ from terms import pi, abst, forall, exists, sig, cast, pair,\
      And, Or, Not, implies, eq, true, false, triv,\
      Bool, Type, Real, Int,\
      power, mod, add, mul, div, minus, uminus, lt, le,\
-     deftype, defvar, defconst, defexpr, defhyp, elab, check,\
+     deftype, defvar, defconst, defvars, defconsts, defexpr, defhyp,\
+     elab, check,\
      defthm, defsub, defclass, definstance, defenum,\
      Add, Mul, Minus, Div, Uminus, Abs, Lt, Le,\
      current_ctxt, get_def
 
 from config import set_verbose, set_implicit
+import theory
+
+# the definitions below are replayed from the theory cache
+theory.begin('boole.elab.prelude', __file__)
 
 
 ###############################################################################
@@ -42,6 +47,10 @@ minus_real = defconst('minus_real', Real >> (Real >> Real), \
 divide_real = defconst('divide_real', Real >> (Real >> Real), \
                        value=v.divide_real_val)
 
+# associative and commutative operations
+add_real.info['ac'] = True
+mul_real.info['ac'] = True
+
 # unary operations on the reals
 
 uminus_real = defconst('uminus_real', Real >> Real, value=v.uminus_real_val)
@@ -64,6 +73,9 @@ minus_int = defconst('minus_int', Int >> (Int >> Int), value=v.minus_int_val)
 divide_int = defconst('divide_int', Int >> (Int >> Int), \
                       value=v.divide_int_val)
 
+add_int.info['ac'] = True
+mul_int.info['ac'] = True
+
 # unary operations on the integers
 
 uminus_int = defconst('uminus_int', Int >> Int, value=v.uminus_int_val)
@@ -106,3 +118,5 @@ definstance('Lt_int', Lt(Int, lt_int), triv())
 
 definstance('Le_real', Le(Real, lt_real), triv())
 definstance('Le_int', Le(Int, le_int), triv())
+
+theory.end()
@@ -24,11 +24,16 @@ import boole.core.typing as typing
 import elab as elab_tools
 from boole.elab.elab import app_expr, mvar_infer, sub_mvar
 import boole.core.tactics as tac
+import boole.core.budget as budgets
+import boole.core.solved as solved
+import boole.core.goals as goals
 import unif as u
 import boole.semantics.value as v
 from boole.semantics.value import Value
 import config as conf
 from config import current_ctxt
+import theory
+import elab_cache
 
 
 ###############################################################################
@@ -412,10 +417,7 @@ def typ_call(type, name_str):
     if len(names) == 1:
         return defvar(names[0], type)
     else:
-        consts = ()
-        for name in names:
-            consts += (defvar(name, type),)
-        return consts
+        return tuple(defvars(names, type))
 
 
 @with_info(st_typ)
@@ -693,12 +695,107 @@ elab_tac = u.unify >> tac.trytac(u.instances)
 type_tac = tac.auto >> tac.trytac(u.instances)
 
 
-def elaborate(expr, type, unfold):
+def elaborate(expr, type, unfold, budget=None):
     """Elaborate an expression and (optionally) its type.
     Returns the elaborated expression and its type, and any
     remaining obligations.
     It also marks the expression and its type as elaborated.
     
+    Arguments:
+    - `expr`: the expression to be elaborated
+    - `type`: it's putative type
+    - `unfold`: a list of defined constant names to unfold when type-checking
+    - `budget`: None, or a Budget bounding the work done by the tactics.
+    Raises BudgetFailure if it is exhausted.
+
+    Inside a theory, the result may be replayed from the theory cache.
+    The results without obligations are also kept in memory, and
+    returned again while the context is unchanged.
+    """
+    key = theory.elab_key(expr, type, unfold)
+    cached = theory.replay(key, expr, type)
+    if cached is not None:
+        return cached
+    cache = elab_cache.current()
+    cache_key = cache.key(key, current_ctxt())
+    result = cache.lookup(cache_key, expr, type)
+    if result is not None:
+        val, ty = result
+        obl = goals.empty_goals('_cached', current_ctxt())
+        theory.record(key, expr, type, val, ty, obl)
+        return (val, ty, obl)
+    if budget is None:
+        val, ty, obl = _elaborate(expr, type, unfold)
+    else:
+        budgets.push(budget)
+        try:
+            val, ty, obl = _elaborate(expr, type, unfold)
+        except budgets.BudgetExceeded as excep:
+            raise tac.BudgetFailure(excep.mess, elab_tac, [])
+        finally:
+            budgets.pop()
+    if obl.is_solved():
+        cache.add(cache_key, expr, type, val, ty)
+    theory.record(key, expr, type, val, ty, obl)
+    return (val, ty, obl)
+
+
+def _prepare(obl, cache):
+    """Set the goal cache of the obligations of an elaboration,
+    and remove the duplicate obligations if goal_dedup is set.
+    
+    Arguments:
+    - `obl`: a Goals object
+    - `cache`: None, or a SolvedCache
+    """
+    obl.cache = cache
+    if conf.goal_dedup:
+        obl.deduplicate()
+
+
+def is_explicit(expr, type):
+    """Returns True if neither the expression nor its
+    type (if any) contain meta-variables, so that they can be
+    type-checked without unification.
+    
+    Arguments:
+    - `expr`: an expression
+    - `type`: None, or an expression
+    """
+    if e.has_mvar(expr):
+        return False
+    return type is None or not e.has_mvar(type)
+
+
+def _check(expr, type, unfold_tac, cache):
+    """Elaborate an expression without meta-variables, with a
+    single inference.
+    
+    Arguments:
+    - `expr`: the expression to be elaborated
+    - `type`: None, or its putative type, without meta-variables
+    - `unfold_tac`: the tactic unfolding the constants to unfold
+    - `cache`: None, or a SolvedCache
+    """
+    if type is None:
+        ty, obl = typing.infer(expr, ctxt=current_ctxt())
+    else:
+        ty, obl = typing.infer(expr, type=type, ctxt=current_ctxt())
+
+    _prepare(obl, cache)
+    obl.solve_with(unfold_tac >> type_tac)
+
+    expr.info['elaborated'] = True
+
+    if type is None and ty.info.name == "default":
+        ty.info.update(st_term)
+
+    return (expr, ty, obl)
+
+
+def _elaborate(expr, type, unfold):
+    """The body of elaborate, run under the active budgets.
+    
     Arguments:
     - `expr`: the expression to be elaborated
     - `type`: it's putative type
@@ -709,12 +806,24 @@ def elaborate(expr, type, unfold):
     else:
         unfold_tac = tac.par(tac.unfold(*unfold))
 
+    if conf.goal_cache:
+        cache = solved.current()
+    else:
+        cache = None
+
     if expr.info.elaborated and type is None:
         ty, obl = typing.infer(expr, ctxt=current_ctxt())
+        _prepare(obl, cache)
         obl.solve_with(unfold_tac >> type_tac)
         return (expr, ty, obl)
 
+    #without meta-variables, there is nothing to unify: the
+    #expression is only type-checked
+    if is_explicit(expr, type):
+        return _check(expr, type, unfold_tac, cache)
+
     _, obl = mvar_infer(expr, ctxt=current_ctxt())
+    _prepare(obl, None)
 
     u.mvar_stack.clear()
     u.mvar_stack.new()
@@ -734,6 +843,7 @@ def elaborate(expr, type, unfold):
             ty = sub_mvar(type, undef=True)
         except e.ExprError:
             _, obl = mvar_infer(type, ctxt=current_ctxt())
+            _prepare(obl, None)
             u.mvar_stack.clear()
             u.mvar_stack.new()
             obl.solve_with(unfold_tac >> elab_tac)
@@ -744,6 +854,7 @@ def elaborate(expr, type, unfold):
     else:
         ty, obl = typing.infer(val, type=ty, ctxt=current_ctxt())
 
+    _prepare(obl, cache)
     obl.solve_with(unfold_tac >> type_tac)
 
     val.info['elaborated'] = True
@@ -774,7 +885,7 @@ def elab(expr):
 
 
 
-def check(expr, type=None, unfold=None):
+def check(expr, type=None, unfold=None, budget=None):
     """Elaborates the expression if necessary, and shows the type. Returns
     the elaborated expression
     
@@ -782,9 +893,10 @@ def check(expr, type=None, unfold=None):
     - `expr`: the expression to be checked
     - `type`: it's putative type
     - `tactic`: a tactic to use in the elaboration
+    - `budget`: None, or a Budget bounding the elaboration
     """
 
-    val, ty, obl = elaborate(expr, type, unfold)
+    val, ty, obl = elaborate(expr, type, unfold, budget=budget)
     if obl.is_solved():
         if conf.verbose:
             print "{0!s} : {1!s}.\n".format(val, ty)
@@ -882,7 +994,65 @@ def defconst(name, type, value=None, unfold=None, **kwargs):
     return c
 
 
-def defexpr(name, expr, type=None, value=None, unfold=None, **kwargs):
+def _decl_consts(names, type, unfold, **kwargs):
+    """Elaborate the type of a list of declarations once, and
+    return the list of constants of that type, marked as checked.
+    
+    Arguments:
+    - `names`: a list of strings
+    - `type`: the type of the constants
+    - `unfold`: list of names to unfold when attempting to prove the TCCs
+    - `**kwargs`: extra values to be passed to the tag of the created constants.
+    """
+    ty, sort, obl = elaborate(type, None, unfold)
+    if not typing.is_sort(sort):
+        mess = "The type of {0!s} is {1!s}\n"\
+               " which should be Type, Kind or Bool"\
+               .format(ty, sort)
+        raise typing.ExprTypeError(mess, ty)
+    consts = []
+    for name in names:
+        c = const(name, ty, **kwargs)
+        c.info['elaborated'] = True
+        c.info['checked'] = True
+        consts.append(c)
+    if obl.is_solved():
+        if conf.verbose:
+            for c in consts:
+                print "{0!s} : {1!s} is assumed.\n".format(c, c.type)
+    else:
+        current_ctxt().goals[obl.name] = obl
+        print "In the declaration:\n{0!s} : {1!s}"\
+              .format(", ".join(names), ty)
+        print "remaining type-checking constraints!"
+        print obl
+    return consts
+
+
+def defvars(names, type, unfold=None, **kwargs):
+    """Define a list of constants of the same type, checking
+    the type once, and return them.
+    
+    Arguments:
+    - `names`: a list of strings
+    - `type`: the type of the constants
+    - `unfold`: list of names to unfold when attempting to prove the TCCs
+    - `**kwargs`: extra values to be passed to the tag of the created constants.
+    """
+    return _decl_consts(names, type, unfold, **kwargs)
+
+
+def defconsts(names, type, unfold=None, **kwargs):
+    """Like defvars, but add the results to
+    current_ctxt in one operation before returning them.
+    """
+    consts = _decl_consts(names, type, unfold, **kwargs)
+    current_ctxt().add_consts(consts)
+    return consts
+
+
+def defexpr(name, expr, type=None, value=None, unfold=None, budget=None,
+            **kwargs):
     """Define an expression with a given type and value.
     Checks that the type of value is correct, and adds the defining
     equation to the context.
@@ -894,8 +1064,9 @@ def defexpr(name, expr, type=None, value=None, unfold=None, **kwargs):
     - `value` : a value, which should agree with that of the
     body of the definition
     - `unfold` : a list of names to unfold in the type-inference process
+    - `budget` : None, or a Budget bounding the elaboration
     """
-    val, ty, obl = elaborate(expr, type, unfold)
+    val, ty, obl = elaborate(expr, type, unfold, budget=budget)
 
     c = const(name, ty, value=value, **kwargs)
     c.info['defined'] = True
@@ -937,12 +1108,13 @@ def defhyp(name, prop):
     return c
 
 
-def defthm(name, prop, unfold=None):
+def defthm(name, prop, unfold=None, budget=None):
     """Declare a theorem and call the default tactic to attempt to
     solve it. Add it as a hypothesis if it is solved.
-    
+    A budget bounds the work spent on the theorem: BudgetFailure is
+    raised if it is exhausted.
     """
-    c = defexpr(name, triv(), prop, unfold=unfold)
+    c = defexpr(name, triv(), prop, unfold=unfold, budget=budget)
     if not c.info['unsolved_tcc']:
         current_ctxt().hyps[name] = c.type
     return c
@@ -1060,12 +1232,14 @@ def defenum(name, elts):
     """
     enumtype = deftype(name)
     enumtype.value = Value(elts, 'enumtype_val')
-    consts = ()
-    for e in elts:
-        c = defconst(e, enumtype)
+    consts = defconsts(elts, enumtype)
+    for e, c in zip(elts, consts):
         c.value = Value(e, 'enumelt_val')
-        consts += (c,)
-    return enumtype, consts
+    return enumtype, tuple(consts)
+
+
+# the definitions below are replayed from the theory cache
+theory.begin('boole.elab.terms', __file__)
 
 
 ###############################################################################
@@ -1079,12 +1253,14 @@ And = defconst('And', Bool >> (Bool >> Bool), value=v.and_val, \
                unicode=color.purple + 'And' + color.reset)
 And.info['__call__'] = iterative_app_call
 And.info['print_iterable_app'] = True
+And.info['ac'] = True
 
 # allow input and output syntax Or(e1, e2, ..., en)
 Or = defconst('Or', Bool >> (Bool >> Bool), value=v.or_val, \
               unicode=color.purple + 'Or' + color.reset)
 Or.info['__call__'] = iterative_app_call
 Or.info['print_iterable_app'] = True
+Or.info['ac'] = True
 
 Not = defconst('Not', Bool >> Bool, value=v.not_val, \
              unicode=color.purple + '¬' + color.reset)
@@ -1153,6 +1329,8 @@ mul = defexpr('*', abst([X, op, mul_ev], op), \
               value=v.mul_val, infix=True, unicode='×')
 mul.info['__call__'] = iterative_app_call
 mul.info['print_iterable_app'] = True
+# associative and commutative when op is
+mul.info['ac_class'] = True
 
 # allow input synatx add(e1, e2, ..., en)
 Add = defclass('Add', [X, op], true)
@@ -1162,6 +1340,7 @@ add = defexpr('+', abst([X, op, add_ev], op), \
               value=v.add_val, infix=True)
 add.info['__call__'] = iterative_app_call
 add.info['print_iterable_app'] = True
+add.info['ac_class'] = True
 
 Minus = defclass('Minus', [X, op], true)
 minus_ev = Const('minus_ev', Minus(X, op))
@@ -1209,3 +1388,5 @@ del x
 del y
 del op
 del uop
+
+theory.end()
@@ -0,0 +1,353 @@
+###############################################################################
+#
+# theory.py
+#
+# description: an on-disk cache for the elaboration of theories.
+# A theory is the sequence of elaborations performed between a call to
+# begin and a call to end, typically by the definitions of a module.
+# The first run records the result of each elaboration, and later runs
+# replay them instead of elaborating again. The cache is keyed by the
+# source of the theory, the sources of Boole and the Boole version.
+#
+#
+# Authors:
+# Cody Roux
+#
+###############################################################################
+
+import os
+import sys
+import glob
+import hashlib
+import cPickle
+from cStringIO import StringIO
+
+import boole
+import boole.core.expr as e
+import boole.core.goals as goals
+import boole.core.session as session
+import color
+import config as conf
+from config import current_ctxt
+
+
+###############################################################################
+#
+# Cache keys
+#
+###############################################################################
+
+_boole_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_sources_digest = None
+
+
+def sources_digest():
+    """Return a digest of the sources of the kernel, the elaborator
+    and the semantics, so that a change to any of them invalidates
+    the cache.
+    """
+    global _sources_digest
+    if _sources_digest is None:
+        digest = hashlib.sha1()
+        for d in ['core', 'elab', 'semantics']:
+            for f in sorted(glob.glob(os.path.join(_boole_dir, d, '*.py'))):
+                with open(f, 'rb') as src:
+                    digest.update(src.read())
+        _sources_digest = digest.hexdigest()
+    return _sources_digest
+
+
+def theory_key(source):
+    """Return the cache key of a theory, elaborated in the current
+    context
+
+    Arguments:
+    - `source`: the path to the source of the theory
+    """
+    digest = hashlib.sha1()
+    with open(source, 'rb') as src:
+        digest.update(src.read())
+    digest.update(sources_digest())
+    digest.update(boole.__version__)
+    digest.update(sys.version)
+    #the theory is only replayed in the context it was recorded in
+    ctxt = current_ctxt()
+    for field in ['decls', 'hyps']:
+        digest.update(str([hash(d) for d in ctxt.values_rec(field)]))
+    #the unicode names of the constants contain the terminal color codes
+    digest.update(repr(sorted(color.color.__dict__.items())))
+    #expression hashes are only stable without hash randomization
+    digest.update(str(hash('Bool')))
+    return digest.hexdigest()
+
+
+def cache_dir():
+    """Return the directory containing the cache files
+    """
+    return os.environ.get('BOOLE_CACHE_DIR',
+                          os.path.join(os.path.expanduser('~'),
+                                       '.cache', 'boole'))
+
+
+def _source_file(source):
+    """Return the python source of a module file
+    """
+    if source.endswith('.pyc') or source.endswith('.pyo'):
+        return source[:-1]
+    return source
+
+
+###############################################################################
+#
+# Pickling of elaborated expressions: constants declared in the current
+# context are stored by name, so that replayed expressions share them.
+#
+###############################################################################
+
+def _persistent_id(obj):
+    if isinstance(obj, e.Const):
+        try:
+            if current_ctxt().get_rec(obj.name, 'decls') is obj:
+                return obj.name
+        except KeyError:
+            pass
+    return None
+
+
+def _persistent_load(name):
+    return current_ctxt().get_rec(name, 'decls')
+
+
+def dump_result(result):
+    """Pickle the result (expr, type, val, ty) of an elaboration
+
+    Arguments:
+    - `result`: a tuple of expressions
+    """
+    out = StringIO()
+    pickler = cPickle.Pickler(out, cPickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = _persistent_id
+    pickler.dump(result)
+    return out.getvalue()
+
+
+def load_result(data):
+    """Unpickle a result of dump_result
+
+    Arguments:
+    - `data`: a string
+    """
+    unpickler = cPickle.Unpickler(StringIO(data))
+    unpickler.persistent_load = _persistent_load
+    return unpickler.load()
+
+
+def _counters():
+    sess = session.current()
+    return (dict(sess.fresh_name._name_index),
+            dict(sess.meta_var_gen._name_index))
+
+
+def _set_counters(counters):
+    sess = session.current()
+    sess.fresh_name._name_index = dict(counters[0])
+    sess.meta_var_gen._name_index = dict(counters[1])
+
+
+###############################################################################
+#
+# Theories
+#
+###############################################################################
+
+class Theory(object):
+    """The record of the elaborations of a theory. Each entry
+    is a pair (key, data), where key identifies the arguments of
+    elaborate, and data is None if the result could not be cached,
+    or a pair (pickled result, name generator counters). The pickled
+    result contains the elaborated expression and type, which are
+    compared to the arguments when replaying, as the key only
+    contains their hashes.
+    """
+
+    def __init__(self, name, source):
+        """
+
+        Arguments:
+        - `name`: the name of the theory
+        - `source`: the path to the source of the theory
+        """
+        self.name = name
+        self.key = theory_key(_source_file(source))
+        self.path = os.path.join(cache_dir(), "{0!s}-{1!s}.cache"\
+                                 .format(name, self.key[:16]))
+        self.entries = []
+        self.pos = 0
+        self.dirty = False
+        try:
+            with open(self.path, 'rb') as f:
+                key, entries = cPickle.load(f)
+            if key == self.key:
+                self.entries = entries
+        except Exception:
+            pass
+
+    def replay(self, key, expr, type):
+        """Return the recorded result (val, ty) of the next
+        elaboration if it is the elaboration of expr with type,
+        or None. On a mismatch, the rest of the record is discarded.
+
+        Arguments:
+        - `key`: the key of the elaboration
+        - `expr`: the expression to elaborate
+        - `type`: its putative type, or None
+        """
+        if self.pos < len(self.entries):
+            rec_key, data = self.entries[self.pos]
+            if rec_key == key and data is not None:
+                try:
+                    result = load_result(data[0])
+                except Exception:
+                    result = None
+                if result is not None and _same_source(result, expr, type):
+                    self.pos += 1
+                    _set_counters(data[1])
+                    return result[2:]
+            elif rec_key == key:
+                return None
+            del self.entries[self.pos:]
+            self.dirty = True
+        return None
+
+    def record(self, key, result):
+        """Record the result of an elaboration which was not
+        replayed.
+
+        Arguments:
+        - `key`: the key of the elaboration
+        - `result`: None, or the tuple (expr, type, val, ty)
+        """
+        if self.pos < len(self.entries):
+            #an uncachable entry, which matched
+            self.pos += 1
+            return
+        data = None
+        if result is not None:
+            try:
+                data = (dump_result(result), _counters())
+            except Exception:
+                data = None
+        self.entries.append((key, data))
+        self.pos += 1
+        self.dirty = True
+
+    def save(self):
+        """Write the record to the cache file, if it changed.
+        """
+        if self.pos < len(self.entries):
+            del self.entries[self.pos:]
+            self.dirty = True
+        if not self.dirty:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            for old in glob.glob(os.path.join(directory,
+                                              self.name + '-*.cache')):
+                os.remove(old)
+            tmp = "{0!s}.{1!s}.tmp".format(self.path, os.getpid())
+            with open(tmp, 'wb') as f:
+                cPickle.dump((self.key, self.entries), f,
+                             cPickle.HIGHEST_PROTOCOL)
+            os.rename(tmp, self.path)
+        except (IOError, OSError):
+            pass
+
+
+def _same_source(result, expr, type):
+    """Returns True if the recorded result is the elaboration
+    of expr with type.
+    """
+    src, src_type = result[0], result[1]
+    if not e.struct_equals(src, expr):
+        return False
+    if src_type is None or type is None:
+        return src_type is None and type is None
+    return e.struct_equals(src_type, type)
+
+
+def _theories():
+    """The stack of theories of the current session
+    """
+    return session.current().get('theories', list)
+
+
+def begin(name, source):
+    """Start recording or replaying a theory. Does nothing
+    if the theory cache is disabled.
+
+    Arguments:
+    - `name`: the name of the theory, e.g. the module name
+    - `source`: the path to the source of the theory, e.g. __file__
+    """
+    if conf.theory_cache:
+        _theories().append(Theory(name, source))
+    else:
+        _theories().append(None)
+
+
+def end():
+    """Stop the current theory and write its cache file.
+    """
+    th = _theories().pop()
+    if th is not None:
+        th.save()
+
+
+def elab_key(expr, type, unfold):
+    """The key identifying a call to elaborate
+    """
+    if type is None:
+        ty_hash = None
+    else:
+        ty_hash = hash(type)
+    if unfold is None:
+        return (hash(expr), ty_hash, None)
+    else:
+        return (hash(expr), ty_hash, tuple(unfold))
+
+
+def replay(key, expr, type):
+    """Return a triple (val, ty, obl) replaying the next elaboration
+    of the current theory, or None.
+
+    Arguments:
+    - `key`: the key returned by elab_key
+    - `expr`: the expression to elaborate
+    - `type`: its putative type, or None
+    """
+    theories = _theories()
+    if theories and theories[-1] is not None:
+        result = theories[-1].replay(key, expr, type)
+        if result is not None:
+            val, ty = result
+            return (val, ty, goals.empty_goals('_cached', current_ctxt()))
+    return None
+
+
+def record(key, expr, type, val, ty, obl):
+    """Record the result of an elaboration in the current theory
+
+    Arguments:
+    - `key`: the key returned by elab_key
+    - `expr`, `type`: the arguments of the elaboration
+    - `val`, `ty`, `obl`: the result of the elaboration
+    """
+    theories = _theories()
+    if theories and theories[-1] is not None:
+        if obl.is_solved():
+            theories[-1].record(key, (expr, type, val, ty))
+        else:
+            theories[-1].record(key, None)
@@ -11,11 +11,17 @@
 #
 ##############################################################################
 
+from collections import OrderedDict
+
 import boole.core.expr as e
+import boole.core.info as info
 from boole.core.goals import *
 from boole.core.tactics import *
 import elab
 import boole.core.conv as conv
+import boole.core.session as session
+from boole.core.index import tele_index
+from boole.core.ac import ACHash
 
 
 ###############################################################################
@@ -58,54 +64,14 @@ class UnsolvabeConstr(Exception):
 
 ###############################################################################
 #
-# A class of Mvar stacks to manage backtracking
+# The meta-variable stack of the current session, which manages
+# backtracking, is defined with the meta-variables in boole.core.expr
 #
 ###############################################################################
 
-class MvarStk(object):
-    """A wrapper for a list of
-    Mvar lists.
-    The list represents a set of instanciations of meta-varaibles,
-    which can be `undone` by freeing the variables involved in the last
-    round of instanciations.
-    """
-    
-    def __init__(self):
-        self.stacks = []
-
-    def __str__(self):
-        return "\n".join(
-            [", ".join(map(str, s)) for s in self.stacks])
+MvarStk = e.MvarStk
 
-    def new(self):
-        """Add a stack to the list
-        """
-        self.stacks.append([])
-
-    def free(self):
-        """Remove the assignment of all meta-variables
-        in the last stack, then remove it.
-        """
-        for exp in self.stacks[-1]:
-            exp.clear()
-        self.stacks = self.stacks[:-1]
-
-    def push(self, mv):
-        """Add a meta-variable to the last
-        stack
-        
-        Arguments:
-        - `mv`: a Mvar
-        """
-        self.stacks[-1].append(mv)
-
-    def clear(self):
-        """Clear the whole stack of stacks.
-        """
-        self.stacks = []
-
-
-mvar_stack = MvarStk()
+mvar_stack = e.mvar_stack
 
 ###############################################################################
 #
@@ -121,8 +87,10 @@ def sub_in_goal(goal):
     Arguments:
     - `goal`:
     """
-    tele = elab.sub_mvar(goal.tele)
-    prop = elab.sub_mvar(goal.prop)
+    tele = elab.sub_mvar(goal.tele, trail=mvar_stack)
+    prop = elab.sub_mvar(goal.prop, trail=mvar_stack)
+    if tele is goal.tele and prop is goal.prop:
+        return goal
     return Goal(tele, prop)
 
 
@@ -201,41 +169,194 @@ def cross(l_goals, r_goals):
 def max_type(types, ctxt):
     """Get the maximum of a list of types. Since it
     can be undecidable to compare types in general, we
-    take T <= U iff it can be proven using
-    destruct >> trivial. Return None if no maximum is found.
+    take T <= U iff it follows from the subtype declarations
+    of the context. Return None if no maximum is found.
     
     Arguments:
     - `types`: a list of types
     - `ctxt`: a goal context
     """
-    for t in types:
-        max_list = [Goal(e.nullctxt(), e.Sub(u, t))\
-                    for u in types]
-        max_goal = Goals('max_goal', ctxt, goals=max_list)
-        max_goal.solve_with(par(trytac(sub_tac)))
-        if max_goal.is_solved():
-            return t
-    return None
+    return ctxt.sub_lattice().max_type(types)
 
 
 def min_type(types, ctxt):
     """Get the minimum of a list of types. Since it
     can be undecidable to compare types in general, we
-    take T <= U iff it can be proven using
-    destruct >> trivial. Return None if no minimum is found.
+    take T <= U iff it follows from the subtype declarations
+    of the context. Return None if no minimum is found.
     
     Arguments:
     - `types`: a list of types
     - `ctxt`: a goal context
     """
-    for t in types:
-        min_list = [Goal(e.nullctxt(), e.Sub(t, u))\
-                    for u in types]
-        min_goal = Goals('min_goal', ctxt, goals=min_list)
-        min_goal.solve_with(trivial)
-        if min_goal.is_solved():
-            return t
-    return None
+    return ctxt.sub_lattice().min_type(types)
+
+
+def ineq_graph(ineqs):
+    """Build the graph of a list of constraints A <= B where A
+    and B are either meta-variables without a value or expressions
+    without meta-variables. Return the triple (mvars, edges, bounds)
+    where mvars is the list of meta-variables, edges sends the name
+    of a meta-variable to the meta-variables above it, and bounds
+    sends it to the pair of lists of its lower and upper bounds
+    without meta-variables. Return None if a constraint is not of
+    that form.
+    
+    Arguments:
+    - `ineqs`: a list of goals
+    """
+    mvars = []
+    edges = {}
+    bounds = {}
+
+    def node(expr):
+        if expr.is_mvar():
+            if expr.has_value():
+                return False
+            if not expr.name in edges:
+                mvars.append(expr)
+                edges[expr.name] = []
+                bounds[expr.name] = ([], [])
+            return True
+        elif e.has_mvar(expr):
+            return False
+        else:
+            return None
+
+    for c in ineqs:
+        lhs, rhs = c.prop.lhs, c.prop.rhs
+        l = node(lhs)
+        r = node(rhs)
+        if l is False or r is False:
+            return None
+        if l and r:
+            edges[lhs.name].append(rhs)
+        elif l:
+            bounds[lhs.name][1].append(rhs)
+        elif r:
+            bounds[rhs.name][0].append(lhs)
+        else:
+            return None
+    return (mvars, edges, bounds)
+
+
+def components(mvars, edges):
+    """Return the strongly connected components of the graph of
+    the meta-variables, in topological order.
+    
+    Arguments:
+    - `mvars`: a list of meta-variables
+    - `edges`: a dictionary sending the name of a meta-variable
+    to the meta-variables above it
+    """
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    comps = []
+    for root in mvars:
+        if root.name in index:
+            continue
+        #an iterative version of Tarjan's algorithm
+        work = [(root, 0)]
+        while work:
+            m, i = work.pop()
+            if i == 0:
+                index[m.name] = low[m.name] = len(index)
+                stack.append(m)
+                on_stack.add(m.name)
+            succ = edges[m.name]
+            if i < len(succ):
+                work.append((m, i + 1))
+                n = succ[i]
+                if not n.name in index:
+                    work.append((n, 0))
+                elif n.name in on_stack:
+                    low[m.name] = min(low[m.name], index[n.name])
+                continue
+            if low[m.name] == index[m.name]:
+                comp = []
+                while True:
+                    n = stack.pop()
+                    on_stack.discard(n.name)
+                    comp.append(n)
+                    if n is m:
+                        break
+                comps.append(comp)
+            if work:
+                parent = work[-1][0]
+                low[parent.name] = min(low[parent.name], low[m.name])
+    #Tarjan's algorithm finds the components in reverse
+    #topological order
+    comps.reverse()
+    return comps
+
+
+def solve_ineq_graph(goals):
+    """Try to solve a goal set of subtyping constraints between
+    meta-variables and types without meta-variables, by giving
+    the same value to the meta-variables of a cycle, then giving
+    each meta-variable the maximum of its lower bounds, in
+    topological order, or if it has none the minimum of its upper
+    bounds, in reverse order. Returns True if the values satisfy
+    every constraint, and undoes the assignments otherwise.
+    
+    Arguments:
+    - `goals`: a goal set
+    """
+    graph = ineq_graph(goals.goals)
+    if graph is None:
+        return False
+    mvars, edges, bounds = graph
+    comps = components(mvars, edges)
+    comp_of = {}
+    for i, comp in enumerate(comps):
+        for m in comp:
+            comp_of[m.name] = i
+    lower = [[] for _ in comps]
+    upper = [[] for _ in comps]
+    succs = [[] for _ in comps]
+    for i, comp in enumerate(comps):
+        for m in comp:
+            lbs, ubs = bounds[m.name]
+            lower[i].extend(lbs)
+            upper[i].extend(ubs)
+            for n in edges[m.name]:
+                j = comp_of[n.name]
+                if j != i:
+                    succs[i].append(j)
+    context = goals.context
+    values = [None] * len(comps)
+    checkpoint = mvar_stack.checkpoint()
+    for i in xrange(len(comps)):
+        if lower[i]:
+            values[i] = max_type(lower[i], context)
+            if values[i] is None:
+                mvar_stack.undo(checkpoint)
+                return False
+            for j in succs[i]:
+                lower[j].append(values[i])
+    for i in reversed(xrange(len(comps))):
+        if values[i] is None:
+            ubs = upper[i] + [values[j] for j in succs[i]]
+            if not ubs:
+                mvar_stack.undo(checkpoint)
+                return False
+            values[i] = min_type(ubs, context)
+            if values[i] is None:
+                mvar_stack.undo(checkpoint)
+                return False
+    for i, comp in enumerate(comps):
+        for m in comp:
+            mvar_stack.assign(m, values[i])
+    lattice = context.sub_lattice()
+    for c in goals.goals:
+        lhs = elab.sub_mvar(c.prop.lhs)
+        rhs = elab.sub_mvar(c.prop.rhs)
+        if not lattice.leq(lhs, rhs):
+            mvar_stack.undo(checkpoint)
+            return False
+    return True
 
 
 def solve_ineqs(goals):
@@ -250,6 +371,12 @@ def solve_ineqs(goals):
                           >> par(trytac(sub_tac)))
     if goals.is_solved():
         return goals
+    elif solve_ineq_graph(goals):
+        goals.solve_with(sub_mvar >> trivial)
+        if goals.is_solved():
+            return goals
+        else:
+            return solve_ineqs(goals)
     else:
         ineqs = goals.goals
         c = ineqs[0].prop
@@ -259,8 +386,7 @@ def solve_ineqs(goals):
             #in this case, we have a higher-order unification problem, and
             #we just give up in hopes of finding an instance later (e.g. using
             #a type class)
-            if e.root_app(c.lhs)[0].is_mvar() or \
-                   e.root_app(c.rhs)[0].is_mvar():
+            if e.root(c.lhs).is_mvar() or e.root(c.rhs).is_mvar():
                 return goals
             else:
                 raise UnsolvabeConstr(c)
@@ -274,16 +400,14 @@ def solve_ineqs(goals):
             lt, gt, other = split(m, ineqs)
 
             if len(lt) == 1 and len(gt) == 0:
-                m.set_val(lt[0].prop.lhs)
+                mvar_stack.assign(m, lt[0].prop.lhs)
                 m_elim = other
             elif len(lt) == 0 and len(gt) == 1:
-                m.set_val(gt[0].prop.rhs)
-                mvar_stack.push(m)
+                mvar_stack.assign(m, gt[0].prop.rhs)
                 m_elim = other
             elif len(lt) == 1 and len(gt) == 1 and \
                      (lt[0].prop.lhs is gt[0].prop.rhs):
-                m.set_val(lt[0].prop.lhs)
-                mvar_stack.push(m)
+                mvar_stack.assign(m, lt[0].prop.lhs)
                 m_elim = other
             else:
                 m_elim = cross(lt, gt) + other
@@ -298,22 +422,18 @@ def solve_ineqs(goals):
                 lbs = [ineq.prop.lhs for ineq in lt]
                 glb = max_type(lbs, goals.context)
                 if not (glb is None):
-                    m.set_val(glb)
-                    mvar_stack.push(m)
+                    mvar_stack.assign(m, glb)
                 else:
                     #Try the first possible solution
-                    m.set_val(lbs[0])
-                    mvar_stack.push(m)
+                    mvar_stack.assign(m, lbs[0])
             elif len(gt) != 0:
                 ubs = [ineq.prop.rhs for ineq in gt]
                 lub = min_type(ubs, goals.context)
                 if not (lub is None):
-                    m.set_val(lub)
-                    mvar_stack.push(m)
+                    mvar_stack.assign(m, lub)
                 else:
                     #Try the first possible solution
-                    m.set_val(ubs[0])
-                    mvar_stack.push(m)
+                    mvar_stack.assign(m, ubs[0])
             else:
                 assert(False)
         goals.solve_with(sub_mvar >> trivial)
@@ -334,13 +454,14 @@ class SolveMvars(Tactic):
         Tactic.__init__(self, 'solve_mvars')
 
     def solve(self, goals, context):
+        check_budget(self, goals)
         ineqs, other = get_sub(goals)
         ineq_goals = Goals('sub', context, goals=ineqs)
         try:
             ineq_goals = solve_ineqs(ineq_goals)
         except UnsolvabeConstr as excep:
-            mess = "Unsolvable constraint: {0!s}".format(excep.constr)
-            raise TacticFailure(mess, self, goals)
+            mess = "Unsolvable constraint: {0!s}"
+            raise TacticFailure(mess, self, goals, excep.constr)
         #If there are unsolved ineq_goals, we put them at the end, in
         #the hopes that solving other will instanciate meta-variables
         #and provide a solution to ineq_goals
@@ -380,21 +501,18 @@ class SolveMvar(Tactic):
                     mvar = prop.rhs
                     tm = prop.lhs
                 else:
-                    mess = "No top-level meta-variable in {0!s}"\
-                           .format(goal.prop)
-                    raise TacticFailure(mess, self, goals)
+                    mess = "No top-level meta-variable in {0!s}"
+                    raise TacticFailure(mess, self, goals, goal.prop)
                 
                 if not elab.mvar_is_present(tm, mvar):
-                    mvar.set_val(tm)
-                    mvar_stack.push(mvar)
+                    mvar_stack.assign(mvar, tm)
                     return tail
                 else:
-                    mess = "occurs check: the variable {0!s} occurs in {1!s}"\
-                           .format(mvar, tm)
-                    raise TacticFailure(mess, self, goals)
+                    mess = "occurs check: the variable {0!s} occurs in {1!s}"
+                    raise TacticFailure(mess, self, goals, mvar, tm)
             else:
-                mess = "Goal {0!s} is not a disequality".format(goal)
-                raise TacticFailure(mess, self, goals)
+                mess = "Goal {0!s} is not a disequality"
+                raise TacticFailure(mess, self, goals, goal)
 
 
 solve_mvar = SolveMvar()
@@ -423,21 +541,17 @@ class FastSolveMvar(Tactic):
             prop = goal.prop
             if prop.is_sub():
                 if prop.lhs.is_mvar():
-                    prop.lhs.set_val(prop.rhs)
-                    mvar_stack.push(prop.lhs)
+                    mvar_stack.assign(prop.lhs, prop.rhs)
                     return tail
                 elif prop.rhs.is_mvar():
-                    prop.rhs.set_val(prop.lhs)
-                    mvar_stack.push(prop.rhs)
+                    mvar_stack.assign(prop.rhs, prop.lhs)
                     return tail
                 else:
-                    mess = "{0!s} does not contain a head meta-variable!"\
-                           .format(goal)
-                    raise TacticFailure(mess, self, goals)
+                    mess = "{0!s} does not contain a head meta-variable!"
+                    raise TacticFailure(mess, self, goals, goal)
             else:
-                mess = "{0!s} is not of the form T <= U!"\
-                       .format(goal)
-                raise TacticFailure(mess, self, goals)
+                mess = "{0!s} is not of the form T <= U!"
+                raise TacticFailure(mess, self, goals, goal)
 
 
 fast_solve_mvar = FastSolveMvar()
@@ -454,7 +568,7 @@ class mvar_apply(Tactic):
     """
     
     def __init__(self, hyp):
-        Tactic.__init__(self, 'mvar_apply({0!s})'.format(hyp))
+        Tactic.__init__(self, Lazy('mvar_apply({0!s})', hyp))
         self.hyp = hyp
 
     def solve(self, goals, context):
@@ -479,7 +593,7 @@ class fast_apply(Tactic):
     """
     
     def __init__(self, hyp):
-        Tactic.__init__(self, "fast_apply({0!s})".format(hyp))
+        Tactic.__init__(self, Lazy("fast_apply({0!s})", hyp))
         self.hyp = hyp
 
     def solve(self, goals, context):
@@ -498,8 +612,7 @@ class instance(Tactic):
         Arguments:
         - `inst`: the name of an instance declaration
         """
-        Tactic.__init__(self, 'instance {0!s}'\
-                        .format(inst))
+        Tactic.__init__(self, Lazy('instance {0!s}', inst))
         self.inst = inst
         self.root = e.root_app(e.root_clause(inst))[0]
 
@@ -512,9 +625,129 @@ class instance(Tactic):
             if root.info.is_class and self.root.equals(root):
                 return fast_apply(self.inst).solve(goals, context)
             else:
-                mess = "Expression {0!s} is not an instance of {1!s}"\
-                       .format(root, self.root)
-                raise TacticFailure(mess, self, goals)
+                mess = "Expression {0!s} is not an instance of {1!s}"
+                raise TacticFailure(mess, self, goals, root, self.root)
+
+
+class ShapeHash(ACHash):
+    """Compute a hash of an expression which does not depend on
+    the names of its meta-variables without a value, which are
+    numbered in the order of their first occurrence.
+    """
+
+    def __init__(self):
+        ACHash.__init__(self)
+        self.numbers = {}
+
+    def visit(self, expr):
+        return expr.accept(self)
+
+    def visit_mvar(self, expr):
+        rep = expr.find(mvar_stack)
+        if rep.has_value():
+            return self.visit(rep._value)
+        try:
+            return self.numbers[rep.name]
+        except KeyError:
+            n = hash(("Mvar", len(self.numbers), self.visit(rep.type)))
+            self.numbers[rep.name] = n
+            return n
+
+
+def class_key(goals, context):
+    """The key of a list of goals starting with a class goal in the
+    instance table: two lists with the same key in the same context
+    are the same up to the names of their meta-variables.
+
+    Arguments:
+    - `goals`: a list of goals
+    - `context`: a context
+    """
+    shape = ShapeHash()
+    return (context.uid, context.epoch,
+            tuple((shape.visit(g.tele), shape.visit(g.prop)) for g in goals))
+
+
+class InstanceTable(object):
+    """A least recently used table, which sends the key of a list
+    of goals to the instance which solved the first one. The keys
+    start with the uid and epoch of the context: the entries of a
+    context are dropped when a later epoch of the context is seen,
+    as they can no longer be found.
+    """
+
+    def __init__(self, size=1024):
+        """
+
+        Arguments:
+        - `size`: the maximal number of entries
+        """
+        self.size = size
+        self.entries = OrderedDict()
+        #context uid -> last epoch seen
+        self.epochs = {}
+
+    def get(self, key):
+        """Return the instance stored under key, or None
+
+        Arguments:
+        - `key`: a key returned by class_key
+        """
+        try:
+            inst = self.entries.pop(key)
+        except KeyError:
+            return None
+        #the entry becomes the most recently used
+        self.entries[key] = inst
+        return inst
+
+    def __setitem__(self, key, inst):
+        uid, epoch = key[0], key[1]
+        last = self.epochs.get(uid)
+        if last is not None and last < epoch:
+            for k in [k for k in self.entries if k[0] == uid]:
+                del self.entries[k]
+        if last is None or last < epoch:
+            self.epochs[uid] = epoch
+        self.entries.pop(key, None)
+        self.entries[key] = inst
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Remove every entry
+        """
+        self.entries.clear()
+        self.epochs.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def instance_table():
+    """Return the instance table of the current session
+    """
+    return session.current().get('instance_table', InstanceTable)
+
+
+def distinct_consts(context):
+    """Return a function which returns True if two constants
+    can not be made equal in the context: neither is a definition,
+    and they are not subtypes of each other.
+
+    Arguments:
+    - `context`: a context
+    """
+    def distinct(c1, c2):
+        for c in (c1, c2):
+            try:
+                context.get_rec(c.name, 'defs')
+                return False
+            except KeyError:
+                pass
+        lattice = context.sub_lattice()
+        return not (lattice.leq(c1, c2) and lattice.leq(c2, c1))
+    return distinct
 
 
 #TODO: succeed if only "complicated" goals remain, without
@@ -531,23 +764,44 @@ class Instances(Tactic):
         if len(goals) == 0:
             return []
         else:
-            hyps = goals[0].tele.types
-            hyp_insts = [i for i in hyps if e.root_app(i)[0].info.is_class]
-            ctxt_insts = context.to_list_rec('class_instances')
-            for inst in hyp_insts + ctxt_insts:
+            #only the instances whose head symbol is that of the goal,
+            #and whose arguments have compatible head symbols, may apply
+            goal = sub_in_goal(goals[0])
+            prop = goal.prop
+            distinct = distinct_consts(context)
+            hyps = tele_index(goal.tele).candidates(prop, distinct)
+            hyp_insts = [i for i in hyps if e.root(i).info.is_class]
+            ctxt_insts = context.index_rec('class_instances')\
+                         .candidates(prop, distinct)
+            insts = hyp_insts + ctxt_insts
+            #the instance which solved the same goal is tried first:
+            #the instances before it in the list failed on that goal
+            table = instance_table()
+            key = class_key([goal] + goals[1:], context)
+            known = table.get(key)
+            if known is not None:
+                first = [i for i in insts if i.equals(known)]
+                insts = first + [i for i in insts if not i.equals(known)]
+            for inst in insts:
+                check_budget(self, goals)
+                mvar_stack.new()
                 try:
-                    mvar_stack.new()
-                    return now(sub_mvar\
-                               >> instance(inst)\
-                               >> unify\
-                               >> par(trytac(self))\
-                               >> unify)\
-                           .solve(goals, context)
-                except TacticFailure:
+                    res = now(sub_mvar\
+                              >> instance(inst)\
+                              >> unify\
+                              >> par(trytac(self))\
+                              >> unify)\
+                          .run(goals, context)
+                except BudgetFailure:
                     mvar_stack.free()
-            goal_str = goals[0].prop
-            mess = "No class instances for goal {0!s}".format(goal_str)
-            raise TacticFailure(mess, self, goals)
+                    raise
+                if res:
+                    mvar_stack.commit()
+                    table[key] = inst
+                    return res.goals
+                mvar_stack.free()
+            mess = "No class instances for goal {0!s}"
+            raise TacticFailure(mess, self, goals, goals[0].prop)
 
 instances = Instances()
 
@@ -22,8 +22,8 @@ from os import devnull
 
 coq_path = "/usr/bin/coqtop"
 session_id = uuid4().time_low
-filename = "coq_{0!s}_{1!s}.v".format(current_ctxt.name, session_id)
-out_file = "coq_{0!s}_{1!s}.out".format(current_ctxt.name, session_id)
+filename = "coq_{0!s}_{1!s}.v".format(current_ctxt().name, session_id)
+out_file = "coq_{0!s}_{1!s}.out".format(current_ctxt().name, session_id)
 
 
 ###############################################################################
@@ -9,8 +9,12 @@
 from boole.elab.prelude import *
 import boole.core.typing as ty
 import boole.core.tactics as tac
-import boole.interfaces.ineqs.classes as ineq
-import boole.interfaces.ineqs.test_code as solver
+import boole.core.budget as budget
+from boole.core.lazy import LazyModule
+
+# the heuristic is only imported when the tactic is first used
+ineq = LazyModule('boole.interfaces.ineqs.classes')
+solver = LazyModule('boole.interfaces.ineqs.test_code')
 
 ###############################################################################
 #
@@ -215,7 +219,12 @@ class Real_ineq(tac.Tactic):
             for h in g.tele.types:
                 hyps.append(h)
             pb = translate_goal(hyps, g.prop)
-            if solver.run_heuristic_on_hypotheses(pb):
+            tac.check_budget(self, goals)
+            try:
+                solved = solver.run_heuristic_on_hypotheses(pb)
+            except budget.BudgetExceeded as excep:
+                raise tac.BudgetFailure(excep.mess, self, goals)
+            if solved:
                 return goals[1:]
             else:
                 return goals
@@ -5,6 +5,7 @@ from addition_module import *
 from multiplication_module import *
 from function_module import *
 from random import randint
+import boole.core.budget as budget
 from math import floor, ceil
 import timeit
 start = timeit.default_timer()
@@ -14,6 +15,7 @@ start = timeit.default_timer()
 # If split_cases is true, will look at all unsigned variables and split on them being > or < 0.    
 def run_heuristic_on_heuristic_data(H, split_cases):
     while H.changed:
+        budget.tick()
         try:
             H.changed = False
             learn_add_comparisons(H)
@@ -28,9 +28,11 @@
 from boole.elab.terms import *
 import boole.core.typing as ty
 import boole.core.tactics as tac
-import boole.interfaces.ineq_interface as ineq
+from boole.core.lazy import LazyModule
 from boole.core.expr import open_bound_fresh_consts
 
+ineq = LazyModule('boole.interfaces.ineq_interface')
+
 import pipes
 import tempfile
 
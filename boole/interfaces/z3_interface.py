@@ -14,11 +14,14 @@ from boole.core.expr import open_bound_fresh_consts
 import boole.core.typing as ty
 import boole.core.tactics as tac
 import boole.core.conv as conv
-import boole.interfaces.ineq_interface as ineq
 import boole.semantics.value as value
+import boole.core.budget as budget
+from boole.core.lazy import LazyModule
 from boole.semantics.value import Value, eval_expr
 
-import z3
+# z3 is imported on the first translation
+z3 = LazyModule('z3')
+ineq = LazyModule('boole.interfaces.ineq_interface')
 
 from fractions import Fraction
 
@@ -101,9 +104,9 @@ _built_in_z3_funs = {
 }
 
 _built_in_z3_sorts = {
-    Int.name: z3.IntSort,
-    Real.name: z3.RealSort,
-    Bool.name: z3.BoolSort
+    Int.name: (lambda ctxt: z3.IntSort(ctxt)),
+    Real.name: (lambda ctxt: z3.RealSort(ctxt)),
+    Bool.name: (lambda ctxt: z3.BoolSort(ctxt))
 }
 
 _built_in_z3_sort_values = {
@@ -502,6 +505,11 @@ class Z3_Solver(object):
         return self.solver.add(z3_formula)
         
     def check(self):
+        # bound the call by the deadline of the active budget, if any
+        b = budget.current()
+        if b is not None and b.remaining_time() is not None:
+            b.tick()
+            self.solver.set(timeout=max(int(1000 * b.remaining_time()), 1))
         return self.solver.check()
        
     # returns the z3 model
@@ -0,0 +1,65 @@
+##################################################
+#
+# Tests for ac.py
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+##################################################
+
+from boole.core.expr import *
+from boole.core.ac import *
+from nose.tools import *
+
+
+Real = Const('Real', Type())
+
+x = Const('x', Real)
+
+y = Const('y', Real)
+
+z = Const('z', Real)
+
+bin_ty = Bound(Pi('_'), Real, Bound(Pi('_'), Real, Real))
+
+add_real = Const('add_real', bin_ty)
+add_real.info['ac'] = True
+
+op = Const('op', bin_ty)
+
+
+def app(fun, *args):
+    for arg in args:
+        fun = App(None, fun, arg)
+    return fun
+
+
+def test_ac_equal():
+    lhs = app(add_real, app(add_real, x, y), z)
+    rhs = app(add_real, z, app(add_real, y, x))
+    assert(not lhs.equals(rhs))
+    assert(ac_equal(lhs, rhs))
+    assert(ac_equal(app(op, lhs, x), app(op, rhs, x)))
+    assert(not ac_equal(app(add_real, x, x), app(add_real, x, y)))
+    #op is not commutative
+    assert(not ac_equal(app(op, x, y), app(op, y, x)))
+
+
+def test_ac_canon():
+    lhs = app(add_real, app(add_real, x, y), app(op, z, x))
+    rhs = app(add_real, app(op, z, x), app(add_real, y, x))
+    assert(struct_equals(ac_canon(lhs), ac_canon(rhs)))
+    #the canonical form is cached, and shares the canonical subterms
+    assert(ac_canon(lhs) is ac_canon(lhs))
+    assert(ac_canon(x) is x)
+    #a different expression with the same canonical hash is not equal
+    other = app(add_real, x, z)
+    other._ac_hash = ac_hash(app(add_real, x, y))
+    assert(not ac_equal(other, app(add_real, y, x)))
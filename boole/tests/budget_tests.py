@@ -0,0 +1,92 @@
+##################################################
+#
+# Tests for budget.py
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+##################################################
+
+from boole.core.tactics import *
+from boole.core.expr import *
+from boole.core.goals import *
+from boole.core.budget import Budget, BudgetExceeded
+
+from nose.tools import *
+
+import boole.core.context as context
+import boole.core.budget as budget
+
+
+Real = Const('Real', Type())
+
+x = Const('x', Real)
+
+empty_tel = Tele([], [])
+
+
+class loop(Tactic):
+    """A tactic which never makes progress
+    """
+
+    def __init__(self):
+        Tactic.__init__(self, 'loop')
+
+    def solve(self, goals, context):
+        return goals
+
+
+def test_fuel():
+    b = Budget(fuel=10)
+    for _ in range(10):
+        b.tick()
+    assert_raises(BudgetExceeded, b.tick)
+    assert(b.is_exhausted())
+    #an exhausted budget stays exhausted
+    assert_raises(BudgetExceeded, b.tick)
+
+
+def test_repeat():
+    ctxt = context.Context('test_ctxt')
+    g = Goals('test', ctxt, goals=sub_goal(empty_tel, x, Real),
+              budget=Budget(fuel=100))
+    assert_raises(BudgetFailure, g.solve_with, trytac(repeat(loop())))
+    assert(not g.is_solved())
+    assert(budget.current() is None)
+
+
+def test_deadline():
+    ctxt = context.Context('test_ctxt')
+    g = Goals('test', ctxt, goals=sub_goal(empty_tel, x, Real),
+              budget=Budget(timeout=0))
+    assert_raises(BudgetFailure, g.solve_with, trivial | idtac)
+
+
+class exceed(Tactic):
+    """A tactic which exhausts the budget outside of
+    check_budget
+    """
+
+    def __init__(self):
+        Tactic.__init__(self, 'exceed')
+
+    def solve(self, goals, context):
+        budget.tick(1000)
+        return []
+
+
+def test_solve_with_converts():
+    ctxt = context.Context('test_ctxt')
+    g = Goals('test', ctxt, goals=sub_goal(empty_tel, x, Real),
+              budget=Budget(fuel=10))
+    assert_raises(BudgetFailure, g.solve_with, exceed())
+    assert(not g.is_solved())
+    assert_equal(len(g.history), 0)
+    assert(budget.current() is None)
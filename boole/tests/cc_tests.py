@@ -0,0 +1,87 @@
+##################################################
+#
+# Tests for cc.py
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+##################################################
+
+from boole.core.expr import *
+from boole.core.goals import *
+from boole.core.tactics import congruence, TacticFailure
+from boole.core.cc import *
+from boole.core.ac import ac_hash
+from boole.core.context import Context
+from nose.tools import *
+
+
+Real = Const('Real', Type())
+
+a = Const('a', Real)
+
+b = Const('b', Real)
+
+c = Const('c', Real)
+
+fun_ty = Bound(Pi('_'), Real, Real)
+
+f = Const('f', fun_ty)
+
+g = Const('g', Bound(Pi('_'), Real, fun_ty))
+
+eq_ty = Bound(Pi('X'), Type(), Bound(Pi('_'), DB(0), Bound(Pi('_'), DB(1), Bool())))
+
+
+def app(fun, *args):
+    for arg in args:
+        fun = App(None, fun, arg)
+    return fun
+
+
+def eq(x, y):
+    return app(Const('==', eq_ty), Real, x, y)
+
+
+def test_closure():
+    closure = CongruenceClosure()
+    closure.merge(a, b)
+    assert(closure.equal(app(f, a), app(f, b)))
+    assert(not closure.equal(app(f, a), app(f, c)))
+    closure.merge(app(f, b), c)
+    assert(closure.equal(app(g, app(f, a), a), app(g, c, b)))
+    assert(not closure.equal(a, c))
+
+
+def test_collision():
+    closure = CongruenceClosure()
+    d = Const('d', Real)
+    #d has the canonical hash of a, but is a different term
+    d._ac_hash = ac_hash(a)
+    closure.merge(a, b)
+    assert(not closure.equal(d, b))
+    assert(closure.node(d) != closure.node(a))
+
+
+def test_congruence():
+    ctxt = Context('test_ctxt')
+    ctxt.hyps['h'] = eq(b, c)
+    tele = Tele(['h1', 'h2'], [eq(a, b), eq(app(f, app(f, a)), a)])
+    goal = Goal(tele, eq(app(f, app(f, app(f, c))), app(f, a)))
+    obl = Goals('test', ctxt, goals=[goal])
+    obl.solve_with(congruence)
+    assert(obl.is_solved())
+    goal = Goal(tele, Sub(app(f, a), a))
+    obl = Goals('test', ctxt, goals=[goal])
+    assert_raises(TacticFailure, obl.solve_with, congruence)
+    #subtyping goals are not equalities
+    goal = Goal(tele, Sub(a, b))
+    obl = Goals('test', ctxt, goals=[goal])
+    assert_raises(TacticFailure, obl.solve_with, congruence)
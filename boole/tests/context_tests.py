@@ -0,0 +1,91 @@
+##################################################
+#
+# Tests for context.py
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+##################################################
+
+from boole.core.expr import *
+from boole.core.context import Context
+from nose.tools import *
+
+
+Real = Const('Real', Type())
+
+x = Const('x', Real)
+
+y = Const('y', Real)
+
+
+def test_parent_lookup():
+    root = Context('root')
+    mid = Context('mid')
+    leaf = Context('leaf')
+    mid.parent['root'] = root
+    leaf.parent['mid'] = mid
+    root.decls['x'] = x
+    assert(leaf.get_rec('x', 'decls').equals(x))
+    assert(leaf.mem_rec(x, 'decls'))
+    assert(not leaf.mem_rec(y, 'decls'))
+    version = leaf.version
+    root.decls['y'] = y
+    assert(leaf.version > version)
+    assert(leaf.mem_rec(y, 'decls'))
+    assert_equal(len(leaf.to_list_rec('decls')), 2)
+    mid.decls['x'] = y
+    assert(leaf.get_rec('x', 'decls').equals(y))
+    del root.decls['y']
+    assert_raises(KeyError, leaf.get_rec, 'y', 'decls')
+
+
+def test_snapshot():
+    ctxt = Context('ctxt')
+    ctxt.decls['x'] = x
+    snap = ctxt.snapshot()
+    ctxt.decls['y'] = y
+    branch = ctxt.branch('branch')
+    del ctxt.decls['x']
+    assert(not ctxt.mem(x, 'decls'))
+    assert_equal(branch.to_list('decls'), [x, y])
+    ctxt.restore(snap)
+    assert_equal(ctxt.to_list('decls'), [x])
+    assert(ctxt.mem(x, 'decls') and not ctxt.mem(y, 'decls'))
+
+
+def test_order():
+    ctxt = Context('ctxt')
+    ctxt.decls['x'] = x
+    ctxt.decls['y'] = y
+    assert_equal(list(ctxt.decls), ['x', 'y'])
+    ctxt.decls['x'] = y
+    ctxt.decls['z'] = x
+    assert_equal(ctxt.decls.items(), [('x', y), ('y', y), ('z', x)])
+    del ctxt.decls['y']
+    assert_equal(list(ctxt.decls), ['x', 'z'])
+    #restoring only writes the fields which changed
+    snap = ctxt.snapshot()
+    ctxt.hyps['h'] = x
+    version = ctxt.version
+    ctxt.restore(snap)
+    assert_equal(ctxt.version, version + 1)
+    assert_equal(len(ctxt.hyps), 0)
+
+
+def test_add_consts():
+    ctxt = Context('batch')
+    version, epoch = ctxt.version, ctxt.epoch
+    ctxt.add_consts([x, y])
+    assert_equal(ctxt.version, version + 1)
+    assert_equal(ctxt.epoch, epoch)
+    assert_equal([c.name for c in ctxt.to_list('decls')], ['x', 'y'])
+    ctxt.add_consts([y])
+    assert_equal(ctxt.epoch, epoch + 1)
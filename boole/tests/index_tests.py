@@ -0,0 +1,53 @@
+##################################################
+#
+# Tests for index.py
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+##################################################
+
+from boole.core.expr import *
+from boole.core.index import *
+from nose.tools import *
+
+
+Real = Const('Real', Type())
+
+P = Const('P', Bound(Pi('_'), Real, Bool()))
+
+Q = Const('Q', Bound(Pi('_'), Real, Bool()))
+
+x = Const('x', Real)
+
+y = Const('y', Real)
+
+
+def test_index():
+    hyps = [App(None, P, x), App(None, Q, x),
+            Bound(Forall('z'), Real, App(None, P, DB(0))), App(None, P, y)]
+    idx = HypIndex(hyps)
+    assert(idx.mem(App(None, P, y)))
+    assert(not idx.mem(App(None, Q, y)))
+    assert(not idx.has_false)
+    assert_equal(idx.candidates(App(None, P, y)), [hyps[0], hyps[2], hyps[3]])
+    assert_equal(idx.candidates(App(None, Q, y)), [hyps[1]])
+
+
+def test_arg_heads():
+    hyps = [App(None, P, x), App(None, Q, x),
+            Bound(Forall('z'), Real, App(None, P, DB(0))), App(None, P, y)]
+    idx = HypIndex(hyps)
+    distinct = lambda c1, c2: True
+    assert_equal(idx.candidates(App(None, P, y), distinct),
+                 [hyps[2], hyps[3]])
+    assert_equal(idx.candidates(App(None, P, y), lambda c1, c2: False),
+                 [hyps[0], hyps[2], hyps[3]])
+    assert_equal(arg_heads(hyps[2]), [None])
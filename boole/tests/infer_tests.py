@@ -70,3 +70,216 @@ def test_implicit():
                        sum_vec(cons(a, v1), cons(b, v2)) == cons(a+b, sum_vec(v1, v2))),
                      None, None)\
            [2].is_solved())
+
+
+def test_mvar_find():
+
+    from boole.elab.elab import mk_meta, sub_mvar
+
+    m1 = mk_meta('m1', Real)
+    m2 = mk_meta('m2', Real)
+    m3 = mk_meta('m3', Real)
+    m1.set_val(m2)
+    m2.set_val(m3)
+    assert(m1.find() is m3)
+    assert(m2.find() is m3)
+    t = x + m1
+    assert(sub_mvar(t).arg is m3)
+    m3.set_val(x)
+    assert(m1.find() is m3)
+    assert(sub_mvar(t).arg.equals(x))
+    m2.clear()
+    assert(m1.find() is m2)
+    u = x + i
+    assert(sub_mvar(u) is u)
+
+
+def test_mvar_compress():
+
+    from boole.elab.elab import mk_meta
+    from boole.elab.unif import MvarStk
+
+    m1 = mk_meta('m1', Real)
+    m2 = mk_meta('m2', Real)
+    m3 = mk_meta('m3', Real)
+    trail = MvarStk()
+    trail.assign(m1, m2)
+    cp = trail.checkpoint()
+    trail.assign(m2, m3)
+    assert(m1.find(trail) is m3 and m1._value is m3)
+    #undoing the assignment of m2 also undoes the compression
+    trail.undo(cp)
+    assert(m1._value is m2 and not m2.has_value())
+    assert(m1.find(trail) is m2)
+
+
+def test_mvar_trail():
+
+    from boole.elab.elab import mk_meta
+    from boole.elab.unif import MvarStk
+
+    m1 = mk_meta('m1', Real)
+    m2 = mk_meta('m2', Real)
+    trail = MvarStk()
+    trail.assign(m1, x)
+    cp = trail.checkpoint()
+    trail.new()
+    trail.assign(m2, m1)
+    trail.new()
+    trail.assign(m1, i)
+    assert(m2.find() is m1 and m1._value is i)
+    trail.free()
+    assert(m1._value is x and m2.has_value())
+    trail.undo(cp)
+    assert(not m2.has_value() and m1._value is x)
+    assert(trail.marks == [cp])
+    trail.undo(0)
+    assert(not m1.has_value())
+
+
+def test_mvar_occurs():
+
+    from boole.elab.elab import mk_meta
+    from boole.core.expr import Sub, mvars, occurs, is_ground
+
+    m1 = mk_meta('m1', Real)
+    m2 = mk_meta('m2', Real)
+    t = Sub(x, m1)
+    assert(mvars(t).keys() == [m1.name] and mvars(t)[m1.name] is m1)
+    assert(mvars(t) is t._mvars)
+    assert(not mvars(Sub(x, i)))
+    assert(occurs(m1, t) and not occurs(m2, t))
+    assert(not is_ground(t))
+    m1.set_val(m2)
+    assert(occurs(m2, t) and not is_ground(t))
+    m2.set_val(x)
+    assert(is_ground(t))
+    assert(not occurs(m1, Bool))
+
+
+def test_instance_table():
+
+    from boole.elab.unif import instance_table, instances, InstanceTable
+    from boole.elab import config as conf
+    from boole.core.goals import Goal, Goals
+    from boole.core.expr import nullctxt
+    from boole.core.profiler import Profiler
+
+    ctxt = current_ctxt()
+    conf.push_ctxt('instance_test')
+    try:
+        T = defvar('T_inst', Type)
+        C = defclass('C_inst', [T], true)
+        D = defclass('D_inst', [T], true)
+        #the first instance is tried first, and fails on C(Real)
+        definstance('C_gen', forall(T, implies(D(T), C(T))), triv())
+        definstance('C_real', C(Real), triv())
+        prop = elaborate(C(Real), None, None)[0]
+
+        def tried():
+            goals = Goals('test', current_ctxt(),
+                          goals=[Goal(nullctxt(), prop)])
+            with Profiler() as prof:
+                goals.solve_with(instances)
+            assert(goals.is_solved())
+            return sum(n.calls for _, n in prof.root.walk() \
+                       if n.name.startswith('instance '))
+
+        table = instance_table()
+        table.clear()
+        assert_equal(tried(), 2)
+        assert(len(table) > 0)
+        #the instance which solved the goal is tried first
+        assert_equal(tried(), 1)
+    finally:
+        conf.set_current_ctxt(ctxt)
+    #the table is bounded, and drops the entries of older epochs
+    table = InstanceTable(size=2)
+    for k in range(3):
+        table[(0, 0, k)] = k
+    assert_equal(list(table.entries), [(0, 0, 1), (0, 0, 2)])
+    table[(0, 1, 0)] = 0
+    assert_equal(list(table.entries), [(0, 1, 0)])
+
+
+def test_ineq_graph():
+
+    from boole.core.expr import Sub, nullctxt
+    from boole.core.goals import Goal, Goals
+    from boole.elab.elab import mk_meta
+    from boole.elab.unif import solve_ineq_graph, components
+    from boole.elab.terms import current_ctxt
+
+    a = mk_meta('a', Type)
+    b = mk_meta('b', Type)
+    c = mk_meta('c', Type)
+    cs = [Sub(a, b), Sub(b, a), Sub(Int, a), Sub(b, c), Sub(c, Real)]
+    goals = Goals('ineqs', current_ctxt(),
+                  goals=[Goal(nullctxt(), s) for s in cs])
+    comps = components([c, a, b], {a.name: [b], b.name: [a, c], c.name: []})
+    assert_equal([len(comp) for comp in comps], [2, 1])
+    assert(solve_ineq_graph(goals))
+    assert(a._value.equals(Int) and b._value.equals(Int))
+    assert(c._value.equals(Int))
+
+
+def test_elab_cache():
+
+    from boole.elab import elab_cache
+
+    cache = elab_cache.current()
+    t = x + (i + x)
+    val1, _, obl = elaborate(t, None, None)
+    assert(obl.is_solved())
+    hits = cache.hits
+    val2, _, obl = elaborate(t, None, None)
+    assert(val2 is val1 and obl.is_solved())
+    assert_equal(cache.hits, hits + 1)
+    defconst('elab_cache_c', Real)
+    val3, _, _ = elaborate(t, None, None)
+    assert(not (val3 is val1))
+    size = cache.size
+    elab_cache.set_cache_size(1)
+    assert(len(cache) <= 1)
+    elab_cache.set_cache_size(size)
+
+
+def test_elab_cache_consts():
+
+    from boole.semantics.value import Value
+
+    #declaring a variable does not change the context, and the
+    #constants have the same hash: the value and information must
+    #not be taken from the first one
+    c1 = defvar('elab_cache_v', Real)
+    c2 = defconst('elab_cache_v', Real, value=Value(3, 'v'))
+    assert(c2 is not c1 and c2.value is not None)
+    d1 = defvar('elab_cache_w', Real, unicode='w1')
+    d2 = defvar('elab_cache_w', Real, unicode='w2')
+    assert(d2.info.unicode == 'w2')
+
+
+def test_explicit():
+
+    from boole.elab.terms import is_explicit
+    from boole.core.expr import Sub
+    import boole.core.session as session
+
+    assert(is_explicit(Sub(x, i), None))
+    assert(not is_explicit(x + i, None))
+    gen = session.current().meta_var_gen
+    count = dict(gen._name_index)
+    val, ty, obl = elaborate(Sub(Int, Real), None, None)
+    assert(obl.is_solved() and val.info.elaborated)
+    assert_equal(gen._name_index, count)
+
+
+def test_defvars():
+
+    a, b = Real('batch_a batch_b')
+    assert(a.type.equals(Real) and a.info.checked)
+    c, d = defconsts(['batch_c', 'batch_d'], Int)
+    assert(current_ctxt().get_rec('batch_d', 'decls') is d)
+    assert(elaborate(c + a, None, None)[2].is_solved())
+    Color, (red, blue) = defenum('BatchColor', ['red', 'blue'])
+    assert(blue.type.equals(Color) and blue.value.desc == 'enumelt_val')
@@ -0,0 +1,54 @@
+##################################################
+#
+# Tests for lattice.py
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+##################################################
+
+from boole.core.expr import *
+from boole.core.lattice import *
+from boole.core.context import Context
+from nose.tools import *
+
+
+Nat = Const('Nat', Type())
+
+Int = Const('Int', Type())
+
+Rat = Const('Rat', Type())
+
+Real = Const('Real', Type())
+
+Str = Const('Str', Type())
+
+
+def test_leq():
+    lattice = SubLattice([Sub(Int, Rat), Sub(Nat, Int)])
+    assert(lattice.leq(Nat, Rat))
+    assert(not lattice.leq(Rat, Nat))
+    lattice.add(Sub(Rat, Real))
+    assert(lattice.leq(Nat, Real))
+    assert(lattice.leq(Str, Str))
+    assert(not lattice.leq(Str, Real))
+    assert(lattice.max_type([Int, Real, Nat]) is Real)
+    assert(lattice.min_type([Int, Real, Nat]) is Nat)
+    assert(lattice.max_type([Int, Str]) is None)
+
+
+def test_context():
+    ctxt = Context('ctxt')
+    ctxt.sub['nat_int'] = Sub(Nat, Int)
+    assert(not ctxt.sub_lattice().leq(Nat, Real))
+    ctxt.sub['int_real'] = Sub(Int, Real)
+    assert(ctxt.sub_lattice().leq(Nat, Real))
+    del ctxt.sub['int_real']
+    assert(not ctxt.sub_lattice().leq(Nat, Real))
@@ -0,0 +1,27 @@
+##################################################
+#
+# Tests for lazy.py
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+##################################################
+
+from boole.core.lazy import LazyModule
+from nose.tools import *
+
+
+def test_lazy():
+    frac = LazyModule('fractions')
+    assert(not frac.is_loaded())
+    assert_equal(frac.Fraction(1, 2) * 2, 1)
+    assert(frac.is_loaded())
+    missing = LazyModule('boole.no_such_module')
+    assert_raises(ImportError, getattr, missing, 'x')
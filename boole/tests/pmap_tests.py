@@ -0,0 +1,62 @@
+##################################################
+#
+# Tests for pmap.py
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+##################################################
+
+from boole.core.pmap import *
+from nose.tools import *
+
+import random
+
+
+class Key(object):
+    """A key with few distinct hashes, to exercise collisions
+    """
+
+    def __init__(self, n):
+        self.n = n
+
+    def __eq__(self, other):
+        return self.n == other.n
+
+    def __hash__(self):
+        return self.n % 7
+
+
+def test_assoc_dissoc():
+    rand = random.Random(0)
+    m = empty
+    d = {}
+    for i in range(2000):
+        k = rand.randint(0, 500)
+        if k in d and rand.random() < 0.4:
+            m = m.dissoc(k)
+            del d[k]
+        else:
+            m = m.assoc(k, i)
+            d[k] = i
+    assert_equal(len(m), len(d))
+    assert_equal(dict(m.iteritems()), d)
+    assert(m.get(1000) is None)
+
+
+def test_persistent():
+    m1 = empty.assoc(Key(1), 'a').assoc(Key(8), 'b')
+    m2 = m1.assoc(Key(15), 'c').dissoc(Key(1))
+    assert_equal(m1[Key(1)], 'a')
+    assert(Key(15) not in m1)
+    assert_equal(m2[Key(8)], 'b')
+    assert_equal(m2[Key(15)], 'c')
+    assert(Key(1) not in m2)
+    assert_raises(KeyError, m2.dissoc, Key(1))
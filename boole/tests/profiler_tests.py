@@ -0,0 +1,51 @@
+##################################################
+#
+# Tests for profiler.py
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+##################################################
+
+from boole.core.expr import *
+from boole.core.goals import *
+from boole.core.tactics import *
+from boole.core.profiler import *
+from boole.core.context import Context
+from nose.tools import *
+
+
+p = Const('p', Bool())
+
+q = Const('q', Bool())
+
+empty_tel = Tele([], [])
+
+
+def test_profiler():
+    ctxt = Context('test_ctxt')
+    goals = [Goal(Tele(['h'], [p]), p), Goal(empty_tel, q)]
+    g = Goals('test', ctxt, goals=goals)
+    with Profiler() as prof:
+        g.solve_with(par(trytac(now(trivial))))
+    assert(current() is None)
+    nodes = [(d, n.name) for d, n in prof.root.walk()]
+    assert(nodes == [(0, '<root>'),
+                     (1, 'par(try(now(trivial)))'),
+                     (2, 'try(now(trivial))'),
+                     (3, 'now(trivial)'),
+                     (4, 'trivial')])
+    top = prof.root.order[0]
+    assert(top.calls == 1 and top.goals_in == 2 and top.goals_out == 1)
+    now_node = top.order[0].order[0]
+    assert(now_node.calls == 2 and now_node.failures == 1)
+    assert(len(prof.report().splitlines()) == 5)
+    for l in prof.folded():
+        assert(l.startswith('par('))
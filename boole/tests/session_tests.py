@@ -0,0 +1,85 @@
+##################################################
+#
+# Tests for session.py
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+##################################################
+
+from boole.elab.prelude import *
+from nose.tools import *
+
+import threading
+import cPickle
+
+from boole.elab import config as conf
+import boole.core.session as session
+
+
+def check_in_session(name, type, results):
+    with conf.new_session(name):
+        c = defconst('c', type)
+        t = defexpr('t', c + c)
+        results[name] = (current_ctxt(), t.type)
+
+
+def test_threads():
+    results = {}
+    threads = [threading.Thread(target=check_in_session,
+                                args=('sess_' + str(i), ty, results))
+               for i, ty in enumerate([Int, Real, Int, Real])]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert_equal(len(results), 4)
+    assert(results['sess_0'][1].equals(Int))
+    assert(results['sess_1'][1].equals(Real))
+    assert(results['sess_0'][0] is not results['sess_2'][0])
+    assert_raises(KeyError, current_ctxt().get_rec, 'c', 'decls')
+    assert(session.current() is session.default)
+
+
+def extend_shared(parent, i, errors):
+    try:
+        with conf.new_session('shared_' + str(i)):
+            ctxt = current_ctxt()
+            for j in range(20):
+                c = defconst('c_{0!s}_{1!s}'.format(i, j), Real)
+                ctxt.values_rec('decls')
+                ctxt.sub_lattice()
+                #the infos are pickled with the shared registry
+                cPickle.loads(cPickle.dumps(c.info, 2))
+                if i == 0:
+                    #writing to the shared parent invalidates the views
+                    #of the children of the other threads
+                    parent.hyps['h_{0!s}'.format(j)] = true
+            assert(ctxt.get_rec('c_{0!s}_0'.format(i), 'decls') is not None)
+    except Exception as excep:
+        errors.append(excep)
+
+
+def test_shared_parent():
+    parent = current_ctxt()
+    snap = parent.snapshot()
+    errors = []
+    threads = [threading.Thread(target=extend_shared,
+                                args=(parent, i, errors))
+               for i in range(4)]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert_equal(errors, [])
+        assert(len(parent._children) >= 4)
+    finally:
+        parent.restore(snap)
@@ -0,0 +1,105 @@
+##################################################
+#
+# Tests for solved.py
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+##################################################
+
+import os
+import tempfile
+
+from boole.core.expr import *
+from boole.core.goals import *
+from boole.core.solved import *
+from boole.core.tactics import trivial
+from boole.core.context import Context
+from nose.tools import *
+
+
+Int = Const('Int', Type())
+
+Real = Const('Real', Type())
+
+p = Const('p', Bool())
+
+empty_tel = Tele([], [])
+
+
+class Counter(object):
+
+    def __init__(self, tac):
+        self.name = tac.name
+        self.tac = tac
+        self.calls = 0
+
+    def solve(self, goals, context):
+        self.calls += 1
+        return self.tac.solve(goals, context)
+
+
+def obligations(ctxt, cache):
+    return Goals('test', ctxt, goals=[Goal(empty_tel, p)], cache=cache)
+
+
+def test_solved_cache():
+    ctxt = Context('test_ctxt')
+    ctxt.hyps['p'] = p
+    cache = SolvedCache()
+    tac = Counter(trivial)
+    g = obligations(ctxt, cache)
+    g.solve_with(tac)
+    assert(g.is_solved())
+    #the context grows: the goal is still closed
+    ctxt.decls['Int'] = Int
+    g = obligations(ctxt, cache)
+    g.solve_with(tac)
+    assert(g.is_solved())
+    assert(tac.calls == 1)
+    #the hypothesis is removed: the goal is checked again
+    del ctxt.hyps['p']
+    g = obligations(ctxt, cache)
+    g.solve_with(tac)
+    assert(not g.is_solved())
+    assert(tac.calls == 2)
+
+
+def test_solved_file():
+    path = os.path.join(tempfile.mkdtemp(), 'goals.cache')
+    ctxt = Context('test_ctxt')
+    ctxt.hyps['p'] = p
+    cache = SolvedCache(path)
+    obligations(ctxt, cache).solve_with(trivial)
+    cache.save()
+    tac = Counter(trivial)
+    ctxt = Context('test_ctxt')
+    ctxt.hyps['p'] = p
+    g = obligations(ctxt, SolvedCache(path))
+    g.solve_with(tac)
+    assert(g.is_solved())
+    assert(tac.calls == 0)
+    os.remove(path)
+
+
+def test_solved_collision():
+    ctxt = Context('test_ctxt')
+    ctxt.hyps['p'] = p
+    cache = SolvedCache()
+    tac = Counter(trivial)
+    obligations(ctxt, cache).solve_with(tac)
+    #a different goal stored under the same key is not reused
+    q = Const('q', Bool())
+    key = (ctxt.uid, ctxt.epoch, tac.name, goal_key(Goal(empty_tel, p)))
+    cache.local[key] = [Goal(empty_tel, q)]
+    g = obligations(ctxt, cache)
+    g.solve_with(tac)
+    assert(g.is_solved())
+    assert(tac.calls == 2)
@@ -22,6 +22,7 @@ from nose.tools import *
 
 import boole.core.context as context
 import boole.core.conv as conv
+import boole.core.ac as ac
 
 
 Real = Const('Real', Type())
@@ -127,3 +128,151 @@ def test_unpack():
     assert(g.goals[0]['h'].equals(bin_op_x_y))
     assert(g.goals[0].prop.lhs.is_pair())
 
+
+def test_pool_par():
+    ctxt = context.Context('test_ctxt')
+    goals = [Goal(empty_tel, Bound(Forall('x'), Real, impl(p, impl(p, q)))),
+             Goal(Tele(['h'], [p]), p),
+             Goal(empty_tel, impl(q, p))]
+    g = Goals('test', ctxt, goals = goals)
+    g.solve_with(pool_par(intros >> trytac(trivial), processes=2))
+    assert(len(g.goals) == 2)
+    assert(g.goals[0].prop.equals(q))
+    assert(g.goals[1].prop.equals(p))
+
+def test_undo():
+    ctxt = context.Context('test_ctxt')
+    goals = [Goal(empty_tel, impl(p, q)), Goal(empty_tel, impl(q, p))]
+    g = Goals('test', ctxt, goals = list(goals), history = 2)
+    for i in range(3):
+        g.solve_with(intros)
+    assert(len(g.history) == 2)
+    head, start = g.history[-1][0]
+    assert(len(head) == 1 and start == 1)
+    g.undo()
+    g.undo()
+    assert(g.goals[0].prop.equals(q))
+    assert(g.goals[1] is goals[1])
+    assert_raises(ValueError, g.undo)
+    g = Goals('test', ctxt, goals = list(goals), history = 0)
+    g.solve_with(intros)
+    assert(len(g.history) == 0)
+    #None keeps every state
+    g = Goals('test', ctxt, goals = list(goals), history = None)
+    for i in range(200):
+        g.solve_with(idtac)
+    assert(len(g.history) == 200)
+
+def test_undo_append():
+    ctxt = context.Context('test_ctxt')
+    goals = [Goal(empty_tel, impl(p, q)), Goal(empty_tel, impl(q, p))]
+    g = Goals('test', ctxt, goals = [goals[0]])
+    g.solve_with(intros)
+    g.append(goals[1])
+    assert(len(g.goals) == 2)
+    g.undo()
+    assert(len(g.goals) == 1 and g.goals[0].prop.equals(q))
+    assert(g.steps == 1)
+    g.undo()
+    assert(len(g.goals) == 1 and g.goals[0] is goals[0])
+
+def test_lazy_failure():
+    ctxt = context.Context('test_ctxt')
+    calls = []
+    def show(g):
+        calls.append(g)
+        return str(g)
+    goals = [Goal(empty_tel, p)]
+    res = now(idtac).run(goals, ctxt)
+    assert(not res)
+    res = Tactic(Lazy(show, 'undefined')).run(goals, ctxt)
+    assert(not res and calls == [])
+    assert('undefined' in res.message())
+    assert(calls == ['undefined'])
+    res = trivial.run([Goal(Tele(['h'], [p]), p)], ctxt)
+    assert(res and res.goals == [])
+
+def test_failure_values():
+    ctxt = context.Context('test_ctxt')
+    calls = []
+    class failing(Tactic):
+        def __init__(self):
+            Tactic.__init__(self, 'failing')
+        def solve(self, goals, context):
+            calls.append(goals)
+            raise TacticFailure('failed on {0!s}', self, goals, len(goals))
+    class counted(Tactic):
+        def __init__(self):
+            Tactic.__init__(self, 'counted')
+        def solve(self, goals, context):
+            calls.append(goals)
+            return goals
+    goals = [Goal(empty_tel, p), Goal(empty_tel, q)]
+    #the failure is passed on as a value, and the tactics after it
+    #are not called
+    res = (par(counted() >> failing()) >> counted()).run(goals, ctxt)
+    assert(not res and len(calls) == 2)
+    assert(res.failure.args and str(res.failure.args[0]) == 'failed on 1')
+    res = repeat(failing(), fail=True).run(goals, ctxt)
+    assert(not res)
+    res = (failing() | trytac(failing())).run(goals, ctxt)
+    assert(res and res.goals == goals)
+    assert_raises(TacticFailure, now(idtac).solve, goals, ctxt)
+
+def test_search():
+    ctxt = context.Context('test_ctxt')
+    g = Goals('test', ctxt, goals = [Goal(empty_tel, impl(p, impl(q, p)))])
+    g.solve_with(search([now(trivial), intros]))
+    assert(g.is_solved())
+    g = Goals('test', ctxt, goals = [Goal(empty_tel, impl(p, q))])
+    assert_raises(TacticFailure, g.solve_with, search([now(trivial), intros]))
+
+def test_search_mvars():
+    ctxt = context.Context('test_ctxt')
+    m = Mvar('m_search', Bool())
+    class set_m(Tactic):
+        def __init__(self, val):
+            Tactic.__init__(self, 'set_m')
+            self.val = val
+        def solve(self, goals, context):
+            if not (goals[0].prop is m and not m.has_value()):
+                raise TacticFailure('no meta-variable', self, goals)
+            mvar_stack.assign(m, self.val)
+            return [Goal(goals[0].tele, self.val)] + goals[1:]
+    g = Goals('test', ctxt, goals = [Goal(Tele(['h'], [p]), m)])
+    g.solve_with(search([set_m(q), set_m(p), now(trivial)]))
+    assert(g.is_solved())
+    #the assignment of the failed branch was undone
+    assert(m._value is p)
+    mvar_stack.clear()
+    m.clear()
+
+def test_dedup():
+    ctxt = context.Context('test_ctxt')
+    weak = Goal(Tele(['h'], [q]), p)
+    strong = Goal(empty_tel, p)
+    g = Goals('test', ctxt, goals = [weak, Goal(empty_tel, q), strong],
+              dedup = True)
+    assert(g.goals == [g.goals[0], strong])
+    assert(g.goals[0].prop.equals(q))
+    g.append(Goal(empty_tel, p))
+    g.append(weak)
+    assert(len(g.goals) == 2)
+    g.solve_with(intros)
+    assert(len(g.goals) == 2)
+
+def test_dedup_collision():
+    ctxt = context.Context('test_ctxt')
+    r = Const('r', Bool())
+    #r has the canonical hash of p, but is a different proposition
+    r._ac_hash = ac.ac_hash(p)
+    g = Goals('test', ctxt, goals = [Goal(empty_tel, p), Goal(empty_tel, r)],
+              dedup = True)
+    assert(len(g.goals) == 2)
+    #and so is a hypothesis with the hash of the type of another
+    s = Const('s', Bool())
+    s._hash = hash(p)
+    g = Goals('test', ctxt, goals = [Goal(Tele(['h'], [p]), q),
+                                     Goal(Tele(['h'], [s]), q)],
+              dedup = True)
+    assert(len(g.goals) == 2)
@@ -0,0 +1,78 @@
+##################################################
+#
+# Tests for theory.py
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+#
+##################################################
+
+from boole.elab.prelude import *
+from nose.tools import *
+
+import os
+import shutil
+import tempfile
+
+from boole.elab import config as conf
+from boole.elab import theory
+import boole.core.expr as e
+
+
+def elab_theory():
+    """Elaborate a small theory in a fresh context, and return
+    its definitions and the number of entries found in the cache
+    """
+    ctxt = current_ctxt()
+    conf.push_ctxt('theory_test')
+    try:
+        theory.begin('theory_test', __file__)
+        cached = len(theory._theories()[-1].entries)
+        x = defconst('x', Real)
+        y = defexpr('y', x + 2 * x)
+        theory.end()
+    finally:
+        conf.set_current_ctxt(ctxt)
+    return x, y, cached
+
+
+def test_replay():
+    cache = tempfile.mkdtemp()
+    os.environ['BOOLE_CACHE_DIR'] = cache
+    setting = conf.theory_cache
+    conf.set_theory_cache(True)
+    try:
+        x1, y1, cached1 = elab_theory()
+        x2, y2, cached2 = elab_theory()
+    finally:
+        conf.set_theory_cache(setting)
+        del os.environ['BOOLE_CACHE_DIR']
+        shutil.rmtree(cache)
+    assert_equal(cached1, 0)
+    assert_equal(cached2, 2)
+    assert(x1.equals(x2))
+    assert(y1.type.equals(y2.type))
+
+
+def test_replay_source():
+    cache = tempfile.mkdtemp()
+    os.environ['BOOLE_CACHE_DIR'] = cache
+    try:
+        th = theory.Theory('theory_source_test', __file__)
+        x = e.Const('x', Real)
+        y = e.Const('y', Real)
+        th.record(0, (x, None, x, Real))
+        th.pos = 0
+        #the key matches, but the recorded expression is different
+        assert_equal(th.replay(0, y, None), None)
+        assert_equal(th.entries, [])
+    finally:
+        del os.environ['BOOLE_CACHE_DIR']
+        shutil.rmtree(cache)
@@ -161,11 +161,13 @@ def test1():
     
     p = (Real * Real)('p')
 
-    fa = forall(p, (p[0] + p[1]) == (p[1] + p[0]))
+    # commutativity itself, (p[0] + p[1]) == (p[1] + p[0]), is
+    # closed by trivial
+    fa = forall(p, (p[0] - p[1]) == -(p[1] - p[0]))
 
-    plus_commut_stmt = defexpr('plus_commut_stmt', fa, type=Bool)
+    minus_antisym_stmt = defexpr('minus_antisym_stmt', fa, type=Bool)
     
-    plus_commut = defexpr('plus_commut', triv(), fa)
+    minus_antisym = defexpr('minus_antisym', triv(), fa)
 
     goal = current_ctxt().next_goal()
 